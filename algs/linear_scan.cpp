@@ -1,42 +1,42 @@
 #include "metrics.hpp"
+#include "parallel.hpp"
 #include <numeric>
 #include <random>
 #include <thread>
 #include <vector>
 
 int main(int argc, char** argv) {
-  if (argc < 4) return 2;
-  std::string alg = argv[1];
-  long long n     = std::atoll(argv[2]);
-  uint64_t seed   = std::strtoull(argv[3], nullptr, 10);
+  BenchArgs A;
+  if (!parse_bench_args(argc, argv, A, /*parallel=*/true)) return 2;
 
-  if (n <= 0) return 3;
-  std::mt19937_64 rng(seed);
-  std::vector<int> buffer(static_cast<size_t>(n));
+  if (A.n <= 0) return 3;
+  std::mt19937_64 rng(A.seed);
+  std::vector<int> buffer(static_cast<size_t>(A.n));
   for (auto& v : buffer) v = static_cast<int>(rng());
 
-  BenchResult R{};
-  R.alg = alg;
-  R.n = n;
-  R.seed = seed;
-  R.threads = static_cast<int>(std::thread::hardware_concurrency());
-
-  BenchTimer timer;
-  timer.start();
-
   volatile long long sink = 0;
   constexpr int kPasses = 16; // ensure measurable wall-clock time for metrics
-  for (int pass = 0; pass < kPasses; ++pass) {
-    for (const auto value : buffer) {
-      sink += value ^ pass;
-      sink -= value & pass;
-    }
-  }
+  // One contiguous slice per worker, each with its own accumulator
+  std::vector<long long> partial(static_cast<size_t>(A.threads), 0);
+  // Read-only pass: the input does not need restoring between iterations
+  auto results = run_timed(A, [] {}, [&] {
+    parallel_for(A.threads, A.n, [&](long long begin, long long end, int worker) {
+      volatile long long local = 0;
+      for (int pass = 0; pass < kPasses; ++pass) {
+        for (long long i = begin; i < end; ++i) {
+          const int value = buffer[static_cast<size_t>(i)];
+          local += value ^ pass;
+          local -= value & pass;
+        }
+      }
+      partial[static_cast<size_t>(worker)] = local;
+    });
+    for (const long long p : partial) sink += p;
+  });
 
-  timer.stop(R);
   // Prevent compiler from optimizing out the loop
   if (sink == 42) std::puts("unlikely");
 
-  print_json(R);
+  print_results(A, results);
   return 0;
 }
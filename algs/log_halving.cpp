@@ -5,39 +5,33 @@
 #include <thread>
 
 int main(int argc, char** argv) {
-  if (argc < 4) return 2;
-  std::string alg = argv[1];
-  long long n     = std::atoll(argv[2]);
-  uint64_t seed   = std::strtoull(argv[3], nullptr, 10);
+  BenchArgs A;
+  if (!parse_bench_args(argc, argv, A)) return 2;
 
   // Increase inner work so CPU time clears Windows' coarse 15.6ms tick
   // and avoids 0ms readings in very fast runs.
   constexpr int kInnerWork = 500000;
-  uint64_t value = static_cast<uint64_t>(n > 1 ? n : 2);
-  std::mt19937_64 rng(seed);
-
-  BenchResult R{};
-  R.alg = alg;
-  R.n = n;
-  R.seed = seed;
-  R.threads = static_cast<int>(std::thread::hardware_concurrency());
-
-  BenchTimer timer;
-  timer.start();
+  uint64_t value = 0;
+  std::mt19937_64 rng;
+  auto reset = [&] {
+    value = static_cast<uint64_t>(A.n > 1 ? A.n : 2);
+    rng.seed(A.seed);
+  };
 
   volatile uint64_t checksum = 0;
-  while (value > 1) {
-    for (int i = 0; i < kInnerWork; ++i) {
-      checksum ^= (value ^ rng());
-      checksum += (value | static_cast<uint64_t>(i));
-      checksum = (checksum << 1) | (checksum >> 63);
+  auto results = run_timed(A, reset, [&] {
+    while (value > 1) {
+      for (int i = 0; i < kInnerWork; ++i) {
+        checksum ^= (value ^ rng());
+        checksum += (value | static_cast<uint64_t>(i));
+        checksum = (checksum << 1) | (checksum >> 63);
+      }
+      value >>= 1;
     }
-    value >>= 1;
-  }
+  });
 
-  timer.stop(R);
   if (checksum == 0xdeadbeefULL) std::puts("unlikely");
 
-  print_json(R);
+  print_results(A, results);
   return 0;
 }
@@ -1,80 +1,46 @@
 #include "metrics.hpp"
+#include "sort_engines.hpp"
 #include <random>
 #include <thread>
 #include <algorithm>
 #include <vector>
 
-// Merge sort implementation
+// Parallel variant: the top levels of the recursion split the workers between the two
+// halves (one new thread per split); below that each worker runs the sequential
+// mergeSort. The merges above the split stay sequential, the final one over all n.
 template<typename T>
-void merge(std::vector<T>& arr, long long left, long long mid, long long right) {
-    long long n1 = mid - left + 1;
-    long long n2 = right - mid;
-    
-    std::vector<T> L(n1), R(n2);
-    
-    for (long long i = 0; i < n1; i++)
-        L[i] = arr[left + i];
-    for (long long j = 0; j < n2; j++)
-        R[j] = arr[mid + 1 + j];
-    
-    long long i = 0, j = 0, k = left;
-    
-    while (i < n1 && j < n2) {
-        if (L[i] <= R[j]) {
-            arr[k] = L[i];
-            i++;
-        } else {
-            arr[k] = R[j];
-            j++;
-        }
-        k++;
-    }
-    
-    while (i < n1) {
-        arr[k] = L[i];
-        i++;
-        k++;
-    }
-    
-    while (j < n2) {
-        arr[k] = R[j];
-        j++;
-        k++;
-    }
-}
-
-template<typename T>
-void mergeSort(std::vector<T>& arr, long long left, long long right) {
-    if (left < right) {
-        long long mid = left + (right - left) / 2;
-        mergeSort(arr, left, mid);
-        mergeSort(arr, mid + 1, right);
-        merge(arr, left, mid, right);
+void parallelMergeSort(std::vector<T>& arr, long long left, long long right, int workers) {
+    if (workers <= 1 || left >= right) {
+        mergeSort(arr, left, right);
+        return;
     }
+    long long mid = left + (right - left) / 2;
+    const int half = workers / 2;
+    std::thread worker([&arr, left, mid, half] { parallelMergeSort(arr, left, mid, half); });
+    parallelMergeSort(arr, mid + 1, right, workers - half);
+    worker.join();
+    merge(arr, left, mid, right);
 }
 
 int main(int argc, char** argv) {
-  // args: alg n seed
-  if (argc < 4) return 2;
-  std::string alg = argv[1];
-  long long n     = std::atoll(argv[2]);
-  uint64_t seed   = std::strtoull(argv[3], nullptr, 10);
-
-  std::mt19937_64 rng(seed);
-  std::vector<int> v(n);
-  for (auto& x : v) x = (int)(rng());
-
-  BenchResult R{};
-  R.alg = alg; R.n = n; R.seed = seed;
-  R.threads = (int)std::thread::hardware_concurrency();
-
-  BenchTimer T; T.start();
-
-  if (!v.empty()) {
-    mergeSort(v, 0, static_cast<long long>(v.size()) - 1);
-  }
+  // args: alg n seed [reps [warmups [threads]]]
+  BenchArgs A;
+  if (!parse_bench_args(argc, argv, A, /*parallel=*/true)) return 2;
+
+  std::mt19937_64 rng;
+  std::vector<int> v(A.n);
+  // Regenerate the same input in place before every iteration (untimed, no extra copy)
+  auto reset = [&] {
+    rng.seed(A.seed);
+    for (auto& x : v) x = (int)(rng());
+  };
+
+  auto results = run_timed(A, reset, [&] {
+    if (!v.empty()) {
+      parallelMergeSort(v, 0, static_cast<long long>(v.size()) - 1, A.threads);
+    }
+  });
 
-  T.stop(R);
-  print_json(R);
+  print_results(A, results);
   return 0;
 }
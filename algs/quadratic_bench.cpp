@@ -1,42 +1,40 @@
 #include "metrics.hpp"
+#include "parallel.hpp"
 #include <random>
 #include <thread>
 #include <vector>
 
 int main(int argc, char** argv) {
-  if (argc < 4) return 2;
-  std::string alg = argv[1];
-  long long n     = std::atoll(argv[2]);
-  uint64_t seed   = std::strtoull(argv[3], nullptr, 10);
+  BenchArgs A;
+  if (!parse_bench_args(argc, argv, A, /*parallel=*/true)) return 2;
 
-  if (n <= 0) return 3;
-  const size_t N = static_cast<size_t>(n);
+  if (A.n <= 0) return 3;
+  const size_t N = static_cast<size_t>(A.n);
   std::vector<int> data(N);
-  std::mt19937_64 rng(seed);
+  std::mt19937_64 rng(A.seed);
   for (auto& v : data) v = static_cast<int>(rng());
 
-  BenchResult R{};
-  R.alg = alg;
-  R.n = n;
-  R.seed = seed;
-  R.threads = static_cast<int>(std::thread::hardware_concurrency());
-
-  BenchTimer timer;
-  timer.start();
-
   constexpr int kRepeats = 3; // stretch runtime to avoid 0ms CPU readings
   volatile long long checksum = 0;
-  for (int r = 0; r < kRepeats; ++r) {
-    for (size_t i = 0; i < N; ++i) {
-      for (size_t j = 0; j < N; ++j) {
-        checksum += (data[i] ^ data[j]);
-        checksum -= (data[i] & data[j]);
+  // Rows i are split between workers; every worker still scans all j
+  std::vector<long long> partial(static_cast<size_t>(A.threads), 0);
+  auto results = run_timed(A, [] {}, [&] {
+    parallel_for(A.threads, A.n, [&](long long begin, long long end, int worker) {
+      volatile long long local = 0;
+      for (int r = 0; r < kRepeats; ++r) {
+        for (size_t i = static_cast<size_t>(begin); i < static_cast<size_t>(end); ++i) {
+          for (size_t j = 0; j < N; ++j) {
+            local += (data[i] ^ data[j]);
+            local -= (data[i] & data[j]);
+          }
+        }
       }
-    }
-  }
+      partial[static_cast<size_t>(worker)] = local;
+    });
+    for (const long long p : partial) checksum += p;
+  });
 
-  timer.stop(R);
   if (checksum == 7) std::puts("unlikely");
-  print_json(R);
+  print_results(A, results);
   return 0;
 }
@@ -0,0 +1,34 @@
+#include "metrics.hpp"
+#include "sort_engines.hpp"
+#include <random>
+#include <thread>
+#include <algorithm>
+#include <vector>
+
+int main(int argc, char** argv) {
+  // args: alg n seed [reps [warmups]]
+  // alg selects the engine: mergesort, mergesort_pingpong, quicksort, std_sort, radix_lsd
+  BenchArgs A;
+  if (!parse_bench_args(argc, argv, A)) return 2;
+  const SortEngine* engine = find_sort_engine(A.alg);
+  if (engine == nullptr) {
+    std::cerr << "unknown sort engine: " << A.alg << "\n";
+    return 2;
+  }
+
+  std::mt19937_64 rng;
+  std::vector<int> v(A.n);
+  // Second buffer allocated (and touched) once, before any timed iteration
+  std::vector<int> scratch(engine->scratch ? A.n : 0);
+  auto reset = [&] {
+    rng.seed(A.seed);
+    for (auto& x : v) x = (int)(rng());
+  };
+
+  auto results = run_timed(A, reset, [&] {
+    engine->sort(v, scratch);
+  });
+
+  print_results(A, results);
+  return 0;
+}
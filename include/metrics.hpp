@@ -6,6 +6,7 @@
 #include <cstdlib>
 #include <cstring>
 #include <string>
+#include <thread>
 #include <vector>
 #include <iostream>
 #include <iomanip>
@@ -21,6 +22,35 @@
   #include <unistd.h>
 #endif
 
+#if defined(__linux__) && defined(BENCH_PERF_COUNTERS)
+  #include <linux/perf_event.h>
+  #include <sys/ioctl.h>
+  #include <sys/syscall.h>
+  #define BENCH_HAS_PERF 1
+#else
+  #define BENCH_HAS_PERF 0
+#endif
+
+// Hardware/software counters recorded around the timed window (Linux perf_event).
+// A value of -1 means "not available" (other OS, perf disabled, or the kernel
+// refused that event, e.g. perf_event_paranoid or a VM without a PMU).
+enum PerfCounter {
+  kCycles = 0,
+  kInstructions,
+  kLlcMisses,
+  kBranchMisses,
+  kContextSwitches,
+  kPageFaults,
+  kPerfCounterCount
+};
+
+inline const char* perf_counter_name(int i) {
+  static const char* names[kPerfCounterCount] = {
+    "cycles", "instructions", "llc_misses", "branch_misses", "context_switches", "page_faults"
+  };
+  return names[i];
+}
+
 struct BenchResult {
   std::string alg;      // algorithm label, e.g. "qs"
   long long   n;        // input size
@@ -29,8 +59,104 @@ struct BenchResult {
   double      cpu_user_ms;
   double      cpu_sys_ms;
   double      rss_peak_mib;
-  int         threads;
+  int         threads;  // worker threads used by the timed body
+  int         iter = -1;  // timed iteration index (inner-repetition mode), -1 otherwise
+  long long   perf[kPerfCounterCount] = {-1, -1, -1, -1, -1, -1};
+};
+
+// Command line shared by every benchmark: alg n seed [reps [warmups [threads]]]
+//   reps = 0 (or absent): one timed run, one JSON object (runner scripts)
+//   reps = K > 0: warm-ups and K timed iterations in this process, one JSON array
+//   threads = T (default 1): worker threads; only the parallel variants accept T > 1
+struct BenchArgs {
+  std::string alg;
+  long long   n = 0;
+  uint64_t    seed = 0;
+  int         reps = 0;
+  int         warmups = 0;
+  int         threads = 1;
+};
+
+inline bool parse_bench_args(int argc, char** argv, BenchArgs& A, bool parallel = false) {
+  if (argc < 4) return false;
+  A.alg  = argv[1];
+  A.n    = std::atoll(argv[2]);
+  A.seed = std::strtoull(argv[3], nullptr, 10);
+  if (argc > 4) A.reps = std::atoi(argv[4]);
+  if (argc > 5) A.warmups = std::atoi(argv[5]);
+  if (argc > 6) A.threads = std::atoi(argv[6]);
+  return A.reps >= 0 && A.warmups >= 0 && A.threads >= 1 && (parallel || A.threads == 1);
+}
+
+#if BENCH_HAS_PERF
+// One independent fd per event (no group): an event the kernel refuses only
+// disables that column. Counters are opened before t0 and read after t1, so the
+// syscalls stay outside the timed window.
+struct PerfCounters {
+  int fds[kPerfCounterCount] = {-1, -1, -1, -1, -1, -1};
+
+  PerfCounters() = default;
+  PerfCounters(const PerfCounters&) = delete;
+  PerfCounters& operator=(const PerfCounters&) = delete;
+  ~PerfCounters() { close_all(); }
+
+  static int open_event(uint32_t type, uint64_t config) {
+    perf_event_attr attr{};
+    attr.size = sizeof(attr);
+    attr.type = type;
+    attr.config = config;
+    attr.disabled = 1;
+    attr.exclude_hv = 1;
+    // Also count the worker threads the parallel variants start inside the window
+    attr.inherit = 1;
+    // Hardware events in user mode only (allowed with perf_event_paranoid <= 2);
+    // context switches and page faults happen in the kernel by definition.
+    attr.exclude_kernel = (type == PERF_TYPE_HARDWARE) ? 1 : 0;
+    return (int)syscall(SYS_perf_event_open, &attr, 0, -1, -1, 0);
+  }
+
+  void open() {
+    close_all();
+    fds[kCycles]          = open_event(PERF_TYPE_HARDWARE, PERF_COUNT_HW_CPU_CYCLES);
+    fds[kInstructions]    = open_event(PERF_TYPE_HARDWARE, PERF_COUNT_HW_INSTRUCTIONS);
+    fds[kLlcMisses]       = open_event(PERF_TYPE_HARDWARE, PERF_COUNT_HW_CACHE_MISSES);
+    fds[kBranchMisses]    = open_event(PERF_TYPE_HARDWARE, PERF_COUNT_HW_BRANCH_MISSES);
+    fds[kContextSwitches] = open_event(PERF_TYPE_SOFTWARE, PERF_COUNT_SW_CONTEXT_SWITCHES);
+    fds[kPageFaults]      = open_event(PERF_TYPE_SOFTWARE, PERF_COUNT_SW_PAGE_FAULTS);
+    for (int fd : fds) {
+      if (fd >= 0) ioctl(fd, PERF_EVENT_IOC_RESET, 0);
+    }
+  }
+
+  void enable() {
+    for (int fd : fds) {
+      if (fd >= 0) ioctl(fd, PERF_EVENT_IOC_ENABLE, 0);
+    }
+  }
+
+  void disable() {
+    for (int fd : fds) {
+      if (fd >= 0) ioctl(fd, PERF_EVENT_IOC_DISABLE, 0);
+    }
+  }
+
+  void read_into(long long* out) {
+    for (int i = 0; i < kPerfCounterCount; ++i) {
+      uint64_t value = 0;
+      if (fds[i] >= 0 && ::read(fds[i], &value, sizeof(value)) == (ssize_t)sizeof(value)) {
+        out[i] = (long long)value;
+      }
+    }
+  }
+
+  void close_all() {
+    for (int& fd : fds) {
+      if (fd >= 0) ::close(fd);
+      fd = -1;
+    }
+  }
 };
+#endif
 
 struct BenchTimer {
   #if defined(_WIN32)
@@ -38,9 +164,16 @@ struct BenchTimer {
   #else
     rusage ru0{};
   #endif
+  #if BENCH_HAS_PERF
+    PerfCounters pc;
+  #endif
   std::chrono::high_resolution_clock::time_point t0;
 
   void start() {
+    #if BENCH_HAS_PERF
+      pc.open();
+      pc.enable();
+    #endif
     t0 = std::chrono::high_resolution_clock::now();
     #if defined(_WIN32)
       HANDLE h = GetCurrentProcess();
@@ -52,6 +185,11 @@ struct BenchTimer {
 
   void stop(BenchResult& R) {
     auto t1 = std::chrono::high_resolution_clock::now();
+    #if BENCH_HAS_PERF
+      pc.disable();
+      pc.read_into(R.perf);
+      pc.close_all();
+    #endif
     R.wall_ms = std::chrono::duration<double, std::milli>(t1 - t0).count();
 
     #if defined(_WIN32)
@@ -85,16 +223,75 @@ struct BenchTimer {
   }
 };
 
+// Runs `reset` (untimed: restore the input) and `body` (timed) for the warm-ups and
+// every timed iteration. The input and the process stay alive across iterations.
+template <typename Reset, typename Body>
+std::vector<BenchResult> run_timed(const BenchArgs& A, Reset&& reset, Body&& body) {
+  BenchResult base{};
+  base.alg = A.alg;
+  base.n = A.n;
+  base.seed = A.seed;
+  // Actual worker count, not hardware_concurrency(): cpu_pct_avg divides by it
+  base.threads = A.threads;
+
+  for (int w = 0; w < A.warmups; ++w) {
+    reset();
+    body();
+  }
+
+  const int timed = A.reps > 0 ? A.reps : 1;
+  std::vector<BenchResult> results;
+  results.reserve(timed);
+  for (int i = 0; i < timed; ++i) {
+    reset();
+    BenchResult R = base;
+    if (A.reps > 0) R.iter = i;
+    BenchTimer T;
+    T.start();
+    body();
+    T.stop(R);
+    results.push_back(R);
+  }
+  return results;
+}
+
+inline void write_json(std::ostream& os, const BenchResult& R) {
+  os << "{"
+     << "\"alg\":\"" << R.alg << "\","
+     << "\"n\":" << R.n << ","
+     << "\"seed\":" << R.seed << ",";
+  if (R.iter >= 0) os << "\"iter\":" << R.iter << ",";
+  os << "\"wall_ms\":" << R.wall_ms << ","
+     << "\"cpu_user_ms\":" << R.cpu_user_ms << ","
+     << "\"cpu_sys_ms\":" << R.cpu_sys_ms << ","
+     << "\"rss_peak_mib\":" << R.rss_peak_mib << ","
+     << "\"threads\":" << R.threads;
+  for (int i = 0; i < kPerfCounterCount; ++i) {
+    if (R.perf[i] >= 0) os << ",\"" << perf_counter_name(i) << "\":" << R.perf[i];
+  }
+  os << "}";
+}
+
 inline void print_json(const BenchResult& R) {
   std::cout << std::fixed << std::setprecision(3);
-  std::cout << "{"
-            << "\"alg\":\"" << R.alg << "\","
-            << "\"n\":" << R.n << ","
-            << "\"seed\":" << R.seed << ","
-            << "\"wall_ms\":" << R.wall_ms << ","
-            << "\"cpu_user_ms\":" << R.cpu_user_ms << ","
-            << "\"cpu_sys_ms\":" << R.cpu_sys_ms << ","
-            << "\"rss_peak_mib\":" << R.rss_peak_mib << ","
-            << "\"threads\":" << R.threads
-            << "}\n";
+  write_json(std::cout, R);
+  std::cout << "\n";
+}
+
+inline void print_json(const std::vector<BenchResult>& results) {
+  std::cout << std::fixed << std::setprecision(3) << "[";
+  for (size_t i = 0; i < results.size(); ++i) {
+    if (i) std::cout << ",";
+    write_json(std::cout, results[i]);
+  }
+  std::cout << "]\n";
+}
+
+// Legacy mode keeps the single-object output the runner scripts parse with jq.
+inline void print_results(const BenchArgs& A, const std::vector<BenchResult>& results) {
+  if (A.reps > 0) {
+    print_json(results);
+  } else {
+    print_json(results.front());
+  }
 }
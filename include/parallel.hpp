@@ -0,0 +1,34 @@
+// include/parallel.hpp
+#pragma once
+#include <algorithm>
+#include <thread>
+#include <vector>
+
+// Splits [0, n) into `workers` contiguous chunks and runs body(begin, end, worker)
+// on each one. Worker 0 runs on the calling thread and the rest on std::threads that
+// are joined before returning, so thread start-up stays inside the timed window.
+// With one worker the body runs inline: same code path as the parallel variant.
+template <typename Body>
+void parallel_for(int workers, long long n, Body&& body) {
+  if (workers <= 1 || n <= 1) {
+    body(0LL, n, 0);
+    return;
+  }
+  workers = static_cast<int>(std::min<long long>(workers, n));
+  const long long chunk = n / workers;
+  const long long extra = n % workers;
+  auto bounds = [&](int w) {
+    const long long begin = w * chunk + std::min<long long>(w, extra);
+    return std::make_pair(begin, begin + chunk + (w < extra ? 1 : 0));
+  };
+
+  std::vector<std::thread> pool;
+  pool.reserve(workers - 1);
+  for (int w = 1; w < workers; ++w) {
+    const auto [begin, end] = bounds(w);
+    pool.emplace_back([&body, begin, end, w] { body(begin, end, w); });
+  }
+  const auto [begin, end] = bounds(0);
+  body(begin, end, 0);
+  for (auto& t : pool) t.join();
+}
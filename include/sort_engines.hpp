@@ -0,0 +1,190 @@
+// include/sort_engines.hpp
+#pragma once
+#include <algorithm>
+#include <array>
+#include <cstdint>
+#include <cstring>
+#include <string>
+#include <utility>
+#include <vector>
+
+// Sort engines shared by the sorting benchmarks. They all sort std::vector<int>
+// ascending; the ones that need a second buffer take it as `scratch`, allocated once
+// by the caller outside the timed window, so only the allocating mergesort touches
+// the allocator while the clock runs.
+
+// Allocating merge sort: two fresh vectors per merge (the original benchmark)
+template<typename T>
+void merge(std::vector<T>& arr, long long left, long long mid, long long right) {
+    long long n1 = mid - left + 1;
+    long long n2 = right - mid;
+
+    std::vector<T> L(n1), R(n2);
+
+    for (long long i = 0; i < n1; i++)
+        L[i] = arr[left + i];
+    for (long long j = 0; j < n2; j++)
+        R[j] = arr[mid + 1 + j];
+
+    long long i = 0, j = 0, k = left;
+
+    while (i < n1 && j < n2) {
+        if (L[i] <= R[j]) {
+            arr[k] = L[i];
+            i++;
+        } else {
+            arr[k] = R[j];
+            j++;
+        }
+        k++;
+    }
+
+    while (i < n1) {
+        arr[k] = L[i];
+        i++;
+        k++;
+    }
+
+    while (j < n2) {
+        arr[k] = R[j];
+        j++;
+        k++;
+    }
+}
+
+template<typename T>
+void mergeSort(std::vector<T>& arr, long long left, long long right) {
+    if (left < right) {
+        long long mid = left + (right - left) / 2;
+        mergeSort(arr, left, mid);
+        mergeSort(arr, mid + 1, right);
+        merge(arr, left, mid, right);
+    }
+}
+
+// Ping-pong merge sort: same recursion and comparisons as mergeSort, but the two
+// halves are merged from one buffer into the other, alternating roles at each level
+// (half-open ranges [begin, end)). No allocation at all.
+template<typename T>
+void pingPongMerge(const T* src, T* dst, long long begin, long long mid, long long end) {
+    long long i = begin, j = mid, k = begin;
+    while (i < mid && j < end) dst[k++] = (src[i] <= src[j]) ? src[i++] : src[j++];
+    while (i < mid) dst[k++] = src[i++];
+    while (j < end) dst[k++] = src[j++];
+}
+
+// Sorts the range into `dst`; `src` holds the same elements and is used as scratch
+template<typename T>
+void pingPongSplit(T* src, T* dst, long long begin, long long end) {
+    if (end - begin < 2) return;
+    long long mid = begin + (end - begin) / 2;
+    pingPongSplit(dst, src, begin, mid);
+    pingPongSplit(dst, src, mid, end);
+    pingPongMerge(src, dst, begin, mid, end);
+}
+
+template<typename T>
+void pingPongMergeSort(std::vector<T>& arr, std::vector<T>& scratch) {
+    std::copy(arr.begin(), arr.end(), scratch.begin());
+    pingPongSplit(scratch.data(), arr.data(), 0, static_cast<long long>(arr.size()));
+}
+
+// Quicksort: median-of-three pivot, Hoare partition, insertion sort below a cutoff.
+// Recurses on the smaller side and loops on the larger one (O(log n) stack).
+template<typename T>
+void insertionSort(T* a, long long begin, long long end) {
+    for (long long i = begin + 1; i < end; i++) {
+        T x = a[i];
+        long long j = i;
+        while (j > begin && x < a[j - 1]) {
+            a[j] = a[j - 1];
+            j--;
+        }
+        a[j] = x;
+    }
+}
+
+template<typename T>
+void quickSort(T* a, long long begin, long long end) {
+    constexpr long long kCutoff = 16;
+    while (end - begin > kCutoff) {
+        long long mid = begin + (end - begin) / 2;
+        if (a[mid] < a[begin]) std::swap(a[mid], a[begin]);
+        if (a[end - 1] < a[begin]) std::swap(a[end - 1], a[begin]);
+        if (a[end - 1] < a[mid]) std::swap(a[end - 1], a[mid]);
+        const T pivot = a[mid];
+        long long i = begin - 1, j = end;
+        while (true) {
+            do { i++; } while (a[i] < pivot);
+            do { j--; } while (pivot < a[j]);
+            if (i >= j) break;
+            std::swap(a[i], a[j]);
+        }
+        // [begin, j] <= pivot <= [j + 1, end)
+        if (j + 1 - begin < end - j - 1) {
+            quickSort(a, begin, j + 1);
+            begin = j + 1;
+        } else {
+            quickSort(a, j + 1, end);
+            end = j + 1;
+        }
+    }
+    insertionSort(a, begin, end);
+}
+
+// LSD radix sort for 32-bit ints: four 8-bit digit passes over the key with the sign
+// bit flipped, bouncing between arr and scratch (an even number of passes, so the
+// result ends in arr). The four histograms are counted in a single read of the input.
+inline void radixSortLsd(std::vector<int>& arr, std::vector<int>& scratch) {
+    constexpr int kPasses = 4;
+    const std::size_t n = arr.size();
+    std::array<std::array<std::size_t, 256>, kPasses> counts{};
+    for (int x : arr) {
+        const uint32_t key = static_cast<uint32_t>(x) ^ 0x80000000u;
+        for (int p = 0; p < kPasses; p++) counts[p][(key >> (8 * p)) & 0xFF]++;
+    }
+    int* src = arr.data();
+    int* dst = scratch.data();
+    for (int p = 0; p < kPasses; p++) {
+        std::size_t offset = 0;
+        for (auto& c : counts[p]) {
+            const std::size_t count = c;
+            c = offset;
+            offset += count;
+        }
+        for (std::size_t i = 0; i < n; i++) {
+            const uint32_t key = static_cast<uint32_t>(src[i]) ^ 0x80000000u;
+            dst[counts[p][(key >> (8 * p)) & 0xFF]++] = src[i];
+        }
+        std::swap(src, dst);
+    }
+}
+
+// Engine family selected by the `alg` argument of the sort_engines benchmark
+struct SortEngine {
+  const char* name;
+  bool        scratch;  // needs a second buffer of n elements
+  void (*sort)(std::vector<int>& v, std::vector<int>& scratch);
+};
+
+inline const std::vector<SortEngine>& sort_engines() {
+  static const std::vector<SortEngine> engines = {
+    {"mergesort", false, [](std::vector<int>& v, std::vector<int>&) {
+       if (!v.empty()) mergeSort(v, 0, static_cast<long long>(v.size()) - 1);
+     }},
+    {"mergesort_pingpong", true, [](std::vector<int>& v, std::vector<int>& s) { pingPongMergeSort(v, s); }},
+    {"quicksort", false, [](std::vector<int>& v, std::vector<int>&) {
+       quickSort(v.data(), 0, static_cast<long long>(v.size()));
+     }},
+    {"std_sort", false, [](std::vector<int>& v, std::vector<int>&) { std::sort(v.begin(), v.end()); }},
+    {"radix_lsd", true, radixSortLsd},
+  };
+  return engines;
+}
+
+inline const SortEngine* find_sort_engine(const std::string& name) {
+  for (const auto& engine : sort_engines()) {
+    if (name == engine.name) return &engine;
+  }
+  return nullptr;
+}
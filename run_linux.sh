@@ -22,20 +22,54 @@ mapfile -t DEFAULT_NS < <(jq -r '.ns[]?' "$CFG")
 REPS=$(jq -r '.reps' "$CFG")
 SEED_MASTER=$(jq -r '.seed_master' "$CFG")
 WARMUP_RUNS=5
+# Cooldown adaptatiu: s'espera fins que la temperatura torna a IDLE_TEMP + banda (o fins al maxim)
+COOLDOWN_MAX_S=$(jq -r '.cooldown.max_wait_s // 60' "$CFG")
+COOLDOWN_BAND_C=$(jq -r '.cooldown.band_c // 2' "$CFG")
+COOLDOWN_POLL_S=$(jq -r '.cooldown.poll_s // 1' "$CFG")
+COOLDOWN_ADAPTIVE=$(jq -r 'if .cooldown.adaptive == false then "false" else "true" end' "$CFG")
 
 CSV="$OUTDIR/data_linux.csv"
-echo "pair_id,alg,n,seed,os,run_order,run_id,wall_ms,cpu_user_ms,cpu_sys_ms,cpu_pct_avg,threads,rss_peak_mib,temp_c,compiler,flags,os_name,kernel,timestamp" > "$CSV"
+echo "pair_id,alg,n,seed,os,run_order,run_id,wall_ms,cpu_user_ms,cpu_sys_ms,cpu_pct_avg,threads,rss_peak_mib,temp_c,compiler,flags,os_name,kernel,timestamp,cpu_core,cooldown_s,iter,cycles,instructions,llc_misses,branch_misses,context_switches,page_faults,workers" > "$CSV"
 
 FLAGS="-O3 -march=native -DNDEBUG"
 
-cooldown() { sleep 60; }   # simplified and robust
-
 read_temp() {
   if command -v sensors >/dev/null 2>&1; then
     sensors | awk '/Package id 0:/ {gsub(/[^0-9\.-]/,"",$4); print $4; exit}'
+    return
+  fi
+  local zone
+  for zone in /sys/class/thermal/thermal_zone*; do
+    if [[ -r "$zone/type" && "$(<"$zone/type")" == "x86_pkg_temp" ]]; then
+      awk '{printf "%.1f\n", $1 / 1000}' "$zone/temp"
+      return
+    fi
+  done
+  echo ""
+}
+
+IDLE_TEMP=""
+if [[ "$COOLDOWN_ADAPTIVE" == "true" ]]; then
+  IDLE_TEMP=$(read_temp)
+fi
+
+# Deixa a COOLDOWN_WAITED els segons esperats (es registra a la fila de la mesura seguent)
+cooldown() {
+  local start temp
+  start=$(date +%s.%N)
+  if [[ -z "$IDLE_TEMP" ]]; then
+    sleep "$COOLDOWN_MAX_S"
   else
-    echo ""
+    while true; do
+      temp=$(read_temp)
+      if awk -v t="$temp" -v i="$IDLE_TEMP" -v b="$COOLDOWN_BAND_C" -v s="$start" -v now="$(date +%s.%N)" -v m="$COOLDOWN_MAX_S" \
+          'BEGIN { exit !((t != "" && t <= i + b) || now - s >= m) }'; then
+        break
+      fi
+      sleep "$COOLDOWN_POLL_S"
+    done
   fi
+  COOLDOWN_WAITED=$(awk -v s="$start" -v now="$(date +%s.%N)" 'BEGIN { printf "%.3f", now - s }')
 }
 
 run_once() {
@@ -69,8 +103,11 @@ print(round((cpu/(w*t))*100, 2) if w>0 and t>0 else 0.0)
 PY
 )
   temp=$(read_temp)
+  # Comptadors perf_event (nomes si el binari els ha pogut obrir)
+  local perf
+  perf=$(jq -r '[.cycles, .instructions, .llc_misses, .branch_misses, .context_switches, .page_faults] | map(if . == null then "" else tostring end) | join(",")' <<<"$json")
 
-  echo "${alg}_${n},${alg},${n},${seed},Linux,${order},${runid},${wall},${cpuu},${cpus},${cpu_pct},${thr},${rss},${temp},${GCC_VER},\"${FLAGS}\",\"${OS_NAME}\",${KERNEL},${ts}" >> "$CSV"
+  echo "${alg}_${n},${alg},${n},${seed},Linux,${order},${runid},${wall},${cpuu},${cpus},${cpu_pct},${thr},${rss},${temp},${GCC_VER},\"${FLAGS}\",\"${OS_NAME}\",${KERNEL},${ts},,${COOLDOWN_WAITED},,${perf},1" >> "$CSV"
 }
 
 # Experiment loop
@@ -89,10 +126,10 @@ for entry in "${ALGO_ENTRIES[@]}"; do
     for ((r=1; r<=REPS; ++r)); do
       seed=$((SEED_MASTER + r))
       # Linux ordering within ABBA scheme: A=1, B=4 (coordinate with Windows)
+      cooldown
       run_once "$alg" "$bin" "$n" "$seed" 1 "L${r}A"
       cooldown
       run_once "$alg" "$bin" "$n" "$seed" 4 "L${r}B"
-      cooldown
     done
   done
 done
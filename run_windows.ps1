@@ -25,10 +25,15 @@ $reps       = [int]$cfgObj.reps
 $seedBase   = [uint64]$cfgObj.seed_master
 $WarmupRuns = 5
 
-$CSV = Join-Path $OUTDIR "data_windows.csv"
-"pair_id,alg,n,seed,os,run_order,run_id,wall_ms,cpu_user_ms,cpu_sys_ms,cpu_pct_avg,threads,rss_peak_mib,temp_c,compiler,flags,os_name,kernel,timestamp" | Out-File -Encoding UTF8 $CSV
+# Cooldown adaptatiu: s'espera fins que la temperatura torna a la de repos + banda (o fins al maxim)
+$cooldownCfg      = $cfgObj.cooldown
+$CooldownMaxS     = if ($null -ne $cooldownCfg.max_wait_s) { [double]$cooldownCfg.max_wait_s } else { 10.0 }
+$CooldownBandC    = if ($null -ne $cooldownCfg.band_c) { [double]$cooldownCfg.band_c } else { 2.0 }
+$CooldownPollS    = if ($null -ne $cooldownCfg.poll_s) { [double]$cooldownCfg.poll_s } else { 1.0 }
+$CooldownAdaptive = -not ($cooldownCfg.adaptive -eq $false)
 
-function Cooldown { Start-Sleep -Seconds 10 }
+$CSV = Join-Path $OUTDIR "data_windows.csv"
+"pair_id,alg,n,seed,os,run_order,run_id,wall_ms,cpu_user_ms,cpu_sys_ms,cpu_pct_avg,threads,rss_peak_mib,temp_c,compiler,flags,os_name,kernel,timestamp,cpu_core,cooldown_s,iter,cycles,instructions,llc_misses,branch_misses,context_switches,page_faults,workers" | Out-File -Encoding UTF8 $CSV
 
 function Get-CpuTemperature {
   $sources = @(
@@ -70,6 +75,27 @@ function Get-CpuTemperature {
   return "NA"
 }
 
+$IdleTemp = $null
+if ($CooldownAdaptive) {
+  $t = Get-CpuTemperature
+  if ($t -isnot [string]) { $IdleTemp = [double]$t }
+}
+
+# Torna els segons esperats (es registren a la fila de la mesura seguent)
+function Cooldown {
+  $sw = [System.Diagnostics.Stopwatch]::StartNew()
+  if ($null -eq $IdleTemp) {
+    Start-Sleep -Milliseconds ([int]($CooldownMaxS * 1000))
+  } else {
+    while ($sw.Elapsed.TotalSeconds -lt $CooldownMaxS) {
+      $t = Get-CpuTemperature
+      if ($t -isnot [string] -and [double]$t -le ($IdleTemp + $CooldownBandC)) { break }
+      Start-Sleep -Milliseconds ([int]($CooldownPollS * 1000))
+    }
+  }
+  return $sw.Elapsed.TotalSeconds
+}
+
 function Format-Decimal {
   param(
     [double]$Value,
@@ -91,7 +117,7 @@ function Escape-Csv {
 
 function Run-Once {
   param(
-    [string]$Alg,[string]$Bin,[long]$N,[uint64]$Seed,[int]$Order,[string]$RunId
+    [string]$Alg,[string]$Bin,[long]$N,[uint64]$Seed,[int]$Order,[string]$RunId,[double]$Waited
   )
   $exe = Join-Path $ROOT "build\$Bin.exe"
   $ts  = Get-Date -Format "s"
@@ -164,6 +190,18 @@ function Run-Once {
     (Escape-Csv $OSFull)
     "N/A"
     (Escape-Csv $ts)
+    ""
+    (Format-Decimal $Waited 3)
+    ""
+    # cycles, instructions, llc_misses, branch_misses, context_switches, page_faults (nomes Linux)
+    ""
+    ""
+    ""
+    ""
+    ""
+    ""
+    # workers: fils de treball (aquest script no fa escombrat de fils)
+    "1"
   )
 
   Add-Content -Path $CSV -Value ($fields -join ",")
@@ -177,12 +215,12 @@ foreach ($a in $algos) {
     for ($r=1; $r -le $reps; $r++) {
       $seed = $seedBase + [uint64]$r
       # Windows ordering within ABBA scheme: 2 and 3
-      Run-Once -Alg $alg -Bin $bin -N $n -Seed $seed -Order 2 -RunId $runCounter
+      $waited = Cooldown
+      Run-Once -Alg $alg -Bin $bin -N $n -Seed $seed -Order 2 -RunId $runCounter -Waited $waited
       $runCounter++
-      Cooldown
-      Run-Once -Alg $alg -Bin $bin -N $n -Seed $seed -Order 3 -RunId $runCounter
+      $waited = Cooldown
+      Run-Once -Alg $alg -Bin $bin -N $n -Seed $seed -Order 3 -RunId $runCounter -Waited $waited
       $runCounter++
-      Cooldown
     }
   }
 }
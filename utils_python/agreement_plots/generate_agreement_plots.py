@@ -1,19 +1,31 @@
 from __future__ import annotations
 
 import argparse
+import sys
 from pathlib import Path
-from typing import Iterable
 
 import matplotlib.pyplot as plt
 import numpy as np
 import pandas as pd
 import scipy.stats as stats
 
+if __package__ in (None, ""):
+    sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
+
+from utils_python.common import database, outliers, pairing  # noqa: E402
+from utils_python.common.loader import load_dataframe  # noqa: E402
+from utils_python.common.manifest import OutputManifest, source_digest  # noqa: E402
+from utils_python.common.parallel import run_figure_tasks  # noqa: E402
+
 DEFAULT_INPUT = Path(__file__).resolve().parents[2] / "resultats_tots.csv"
 DEFAULT_OUTPUT_DIR = Path(__file__).resolve().parents[1] / "sortides" / "agreement_plots"
+# Columnes de paired_runs que fa servir l'informe (amb --db)
+DB_PAIRED_COLUMNS = ("pair_id", "alg", "n", "workers", "wall_ms_lin", "wall_ms_win", "Dlog")
+
 
-plt.rcParams["figure.figsize"] = (6, 4)
-plt.rcParams["figure.dpi"] = 150
+def configure_plots() -> None:
+    plt.rcParams["figure.figsize"] = (6, 4)
+    plt.rcParams["figure.dpi"] = 150
 
 
 def parse_args() -> argparse.Namespace:
@@ -27,6 +39,12 @@ def parse_args() -> argparse.Namespace:
         default=DEFAULT_INPUT,
         help="CSV amb totes les execucions (Windows + Linux).",
     )
+    parser.add_argument(
+        "--db",
+        type=Path,
+        default=None,
+        help="Base de dades SQLite (ingest_runs.py --db) en lloc de --input: llegeix la taula paired_runs.",
+    )
     parser.add_argument(
         "--output-dir",
         "-o",
@@ -44,6 +62,33 @@ def parse_args() -> argparse.Namespace:
         default="Windows",
         help="Valor de la columna os que identifica Windows.",
     )
+    parser.add_argument(
+        "--jobs",
+        "-j",
+        type=int,
+        default=1,
+        help="Processos per generar els grafics per algorisme en paral·lel (1 = en serie).",
+    )
+    parser.add_argument(
+        "--force",
+        action="store_true",
+        help="Regenera totes les sortides encara que les dades no hagin canviat (ignora manifest.json).",
+    )
+    parser.add_argument(
+        "--outliers",
+        choices=outliers.OUTLIER_METHODS,
+        default=None,
+        help=(
+            "Exclou els outliers de wall_ms per (os, alg, n) abans de l'analisi: mad "
+            "(|x - mediana| > 3 MAD), iqr (fora de Q1 - 1.5 IQR, Q3 + 1.5 IQR) o both. "
+            "Es treu tota la parella ABBA i es desa outliers_exclosos.csv."
+        ),
+    )
+    parser.add_argument(
+        "--no-cache",
+        action="store_true",
+        help="No llegeix ni escriu la cache columnar (.feather) al costat del CSV.",
+    )
     return parser.parse_args()
 
 
@@ -51,68 +96,16 @@ def sanitize_for_filename(value: str) -> str:
     return value.replace("/", "_").replace("\\", "_").replace(" ", "_")
 
 
-def has_columns(df: pd.DataFrame, required: Iterable[str]) -> bool:
-    missing = [col for col in required if col not in df.columns]
-    if missing:
-        print(f"[error] Falten columnes al CSV: {missing}")
-        return False
-    return True
-
-
-def load_dataframe(csv_path: Path) -> pd.DataFrame:
-    df = pd.read_csv(csv_path, skipinitialspace=True)
-    df.columns = [col.strip() for col in df.columns]
-
-    # Neteja espais a string/object per evitar mismatches (p. ex. "Linux  " vs "Linux")
-    for col in df.columns:
-        if df[col].dtype == object:
-            df[col] = df[col].astype(str).str.strip()
-    return df
-
-
-def maybe_add_abba_leg(df: pd.DataFrame, linux_label: str, windows_label: str) -> pd.DataFrame:
-    if "run_order" not in df.columns:
-        return df
-
-    df = df.copy()
-    df["abba_leg"] = None
-    linux_map = {1: "A", 4: "B"}
-    windows_map = {2: "A", 3: "B"}
-
-    is_linux = df["os"] == linux_label
-    is_windows = df["os"] == windows_label
-
-    df.loc[is_linux, "abba_leg"] = df.loc[is_linux, "run_order"].map(linux_map)
-    df.loc[is_windows, "abba_leg"] = df.loc[is_windows, "run_order"].map(windows_map)
-    return df
-
-
 def prepare_paired_df(df: pd.DataFrame, linux_label: str, windows_label: str) -> pd.DataFrame:
-    required_cols = ("pair_id", "alg", "n", "seed", "os", "wall_ms")
-    if not has_columns(df, required_cols):
-        return pd.DataFrame()
-
-    df = maybe_add_abba_leg(df, linux_label, windows_label)
+    return pairing.prepare_paired_df(df, linux_label, windows_label, ("wall_ms",))
 
-    merge_keys = ["pair_id", "alg", "n", "seed"]
-    if "abba_leg" in df.columns:
-        merge_keys.append("abba_leg")
 
-    base_cols = [*merge_keys, "wall_ms"]
-    lin = df[df["os"] == linux_label][base_cols].rename(columns={"wall_ms": "wall_ms_lin"})
-    win = df[df["os"] == windows_label][base_cols].rename(columns={"wall_ms": "wall_ms_win"})
+def qq_plot_name(alg_label: str) -> str:
+    return f"qqplot_dlog_{sanitize_for_filename(str(alg_label))}.png"
 
-    if "abba_leg" in merge_keys:
-        lin = lin.dropna(subset=["abba_leg"])
-        win = win.dropna(subset=["abba_leg"])
 
-    merged = lin.merge(win, on=merge_keys, suffixes=("_lin", "_win"))
-    if merged.empty:
-        print("[warn] No s'ha trobat cap parell Linux/Windows amb els criteris indicats.")
-        return merged
-
-    merged["Dlog"] = np.log(merged["wall_ms_lin"]) - np.log(merged["wall_ms_win"])
-    return merged
+def bland_altman_name(alg_label: str) -> str:
+    return f"bland_altman_{sanitize_for_filename(str(alg_label))}.png"
 
 
 def save_qq_plot(dlog: pd.Series, alg_label: str, output_dir: Path) -> None:
@@ -122,7 +115,7 @@ def save_qq_plot(dlog: pd.Series, alg_label: str, output_dir: Path) -> None:
     plt.xlabel("Quantils teorics")
     plt.ylabel("Quantils observats")
     plt.tight_layout()
-    path = output_dir / f"qqplot_dlog_{sanitize_for_filename(str(alg_label))}.png"
+    path = output_dir / qq_plot_name(alg_label)
     plt.savefig(path)
     plt.close()
     print(f"[save] {path}")
@@ -144,34 +137,74 @@ def save_bland_altman_plot(x: np.ndarray, y: np.ndarray, alg_label: str, output_
     plt.ylabel("Diferencia temps (Linux - Windows)")
     plt.legend()
     plt.tight_layout()
-    path = output_dir / f"bland_altman_{sanitize_for_filename(str(alg_label))}.png"
+    path = output_dir / bland_altman_name(alg_label)
     plt.savefig(path)
     plt.close()
     print(f"[save] {path}")
 
 
-def main() -> None:
-    args = parse_args()
-
-    if not args.input.exists():
-        raise FileNotFoundError(f"No s'ha trobat el fitxer d'entrada: {args.input}")
-
-    output_dir = args.output_dir
+def run_report(
+    df: pd.DataFrame,
+    output_dir: Path,
+    linux_label: str = "Linux",
+    windows_label: str = "Windows",
+    paired: pd.DataFrame | None = None,
+    jobs: int = 1,
+    incremental: bool = True,
+) -> None:
     output_dir.mkdir(parents=True, exist_ok=True)
+    manifest = OutputManifest(output_dir, {"tool": source_digest(__file__)}, incremental)
 
-    df = load_dataframe(args.input)
-    paired = prepare_paired_df(df, args.linux_label, args.windows_label)
+    # Les figures d'acord es fan amb les execucions d'un fil (vegeu pairing.single_thread)
+    df = pairing.single_thread(df)
+    if paired is None or (not paired.empty and "Dlog" not in paired.columns):
+        paired = prepare_paired_df(df, linux_label, windows_label)
+    paired = pairing.single_thread(paired)
     if paired.empty:
         return
 
-    for alg in paired["alg"].dropna().unique():
-        sub = paired[paired["alg"] == alg]
-        if sub.empty:
-            continue
-        save_qq_plot(sub["Dlog"], str(alg), output_dir)
-        save_bland_altman_plot(
-            sub["wall_ms_lin"].to_numpy(), sub["wall_ms_win"].to_numpy(), str(alg), output_dir
-        )
+    tasks = []
+    names = []
+    for alg, sub in paired.groupby("alg", observed=True, sort=False):
+        alg_label = str(alg)
+        if manifest.stale(qq_plot_name(alg_label), sub["Dlog"], alg_label):
+            tasks.append((save_qq_plot, (sub["Dlog"], alg_label, output_dir)))
+            names.append(qq_plot_name(alg_label))
+        lin, win = sub["wall_ms_lin"].to_numpy(), sub["wall_ms_win"].to_numpy()
+        if manifest.stale(bland_altman_name(alg_label), lin, win, alg_label):
+            tasks.append((save_bland_altman_plot, (lin, win, alg_label, output_dir)))
+            names.append(bland_altman_name(alg_label))
+    run_figure_tasks(tasks, jobs)
+    for name in names:
+        manifest.done(name)
+    manifest.save()
+
+
+def main() -> None:
+    args = parse_args()
+
+    paired = None
+    if args.db is not None:
+        conn = database.connect_db(args.db)
+        database.ensure_paired(conn, args.linux_label, args.windows_label)
+        paired = outliers.read_db_paired(conn, DB_PAIRED_COLUMNS, args.outliers, args.output_dir)
+        df = pd.DataFrame()
+    else:
+        if not args.input.exists():
+            raise FileNotFoundError(f"No s'ha trobat el fitxer d'entrada: {args.input}")
+        df = load_dataframe(args.input, use_cache=not args.no_cache)
+        df, _ = outliers.apply_outlier_stage(df, args.outliers, args.output_dir)
+
+    configure_plots()
+    run_report(
+        df,
+        args.output_dir,
+        args.linux_label,
+        args.windows_label,
+        paired=paired,
+        jobs=args.jobs,
+        incremental=not args.force,
+    )
 
 
 if __name__ == "__main__":
@@ -1,15 +1,25 @@
 from __future__ import annotations
 
 import argparse
+import sys
 from pathlib import Path
-from typing import Iterable, List
+from typing import List
 
 import numpy as np
 import pandas as pd
 from scipy import stats
 
+if __package__ in (None, ""):
+    sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
+
+from utils_python.common import database, outliers, pairing, resampling, stratified  # noqa: E402
+from utils_python.common.loader import load_dataframe  # noqa: E402
+from utils_python.common.manifest import OutputManifest, source_digest  # noqa: E402
+
 DEFAULT_INPUT = Path(__file__).resolve().parents[2] / "resultats_tots.csv"
 DEFAULT_OUTPUT_DIR = Path(__file__).resolve().parents[1] / "sortides" / "agreement_stats"
+# Columnes de paired_runs que fa servir l'informe (amb --db)
+DB_PAIRED_COLUMNS = ("pair_id", "alg", "n", "workers", "Dlog")
 
 
 def parse_args() -> argparse.Namespace:
@@ -23,6 +33,12 @@ def parse_args() -> argparse.Namespace:
         default=DEFAULT_INPUT,
         help="CSV amb totes les execucions (Windows + Linux).",
     )
+    parser.add_argument(
+        "--db",
+        type=Path,
+        default=None,
+        help="Base de dades SQLite (ingest_runs.py --db) en lloc de --input: llegeix la taula paired_runs.",
+    )
     parser.add_argument(
         "--output-dir",
         "-o",
@@ -40,6 +56,59 @@ def parse_args() -> argparse.Namespace:
         default="Windows",
         help="Valor de la columna os que identifica Windows.",
     )
+    parser.add_argument(
+        "--resamples",
+        type=int,
+        default=resampling.DEFAULT_RESAMPLES,
+        help="Remostres del bootstrap BCa i del test de permutacio per canvi de signe (0 = no es calculen).",
+    )
+    parser.add_argument(
+        "--seed",
+        type=int,
+        default=resampling.DEFAULT_SEED,
+        help="Llavor del bootstrap i de les permutacions.",
+    )
+    parser.add_argument(
+        "--jobs",
+        "-j",
+        type=int,
+        default=1,
+        help="Processos per remostrejar els algorismes en paral·lel (1 = en serie).",
+    )
+    parser.add_argument(
+        "--force",
+        action="store_true",
+        help="Regenera totes les sortides encara que les dades no hagin canviat (ignora manifest.json).",
+    )
+    parser.add_argument(
+        "--per-n",
+        action="store_true",
+        help=(
+            "Desa tambe la inferencia per cada cel·la (alg, n) (dlog_inference_per_n.csv), "
+            "amb els p-valors corregits per comparacions multiples."
+        ),
+    )
+    parser.add_argument(
+        "--correction",
+        choices=stratified.CORRECTIONS,
+        default=stratified.DEFAULT_CORRECTION,
+        help="Correccio dels p-valors entre cel·les amb --per-n: holm (FWER) o bh (Benjamini-Hochberg, FDR).",
+    )
+    parser.add_argument(
+        "--outliers",
+        choices=outliers.OUTLIER_METHODS,
+        default=None,
+        help=(
+            "Exclou els outliers de wall_ms per (os, alg, n) abans de l'analisi: mad "
+            "(|x - mediana| > 3 MAD), iqr (fora de Q1 - 1.5 IQR, Q3 + 1.5 IQR) o both. "
+            "Es treu tota la parella ABBA i es desa outliers_exclosos.csv."
+        ),
+    )
+    parser.add_argument(
+        "--no-cache",
+        action="store_true",
+        help="No llegeix ni escriu la cache columnar (.feather) al costat del CSV.",
+    )
     return parser.parse_args()
 
 
@@ -47,68 +116,8 @@ def sanitize_for_string(value: str) -> str:
     return value.replace("\n", " ").strip()
 
 
-def has_columns(df: pd.DataFrame, required: Iterable[str]) -> bool:
-    missing = [col for col in required if col not in df.columns]
-    if missing:
-        print(f"[error] Falten columnes al CSV: {missing}")
-        return False
-    return True
-
-
-def load_dataframe(csv_path: Path) -> pd.DataFrame:
-    df = pd.read_csv(csv_path, skipinitialspace=True)
-    df.columns = [col.strip() for col in df.columns]
-
-    # Neteja espais a string/object per evitar mismatches (p. ex. "Linux  " vs "Linux")
-    for col in df.columns:
-        if df[col].dtype == object:
-            df[col] = df[col].astype(str).str.strip()
-    return df
-
-
-def maybe_add_abba_leg(df: pd.DataFrame, linux_label: str, windows_label: str) -> pd.DataFrame:
-    if "run_order" not in df.columns:
-        return df
-
-    df = df.copy()
-    df["abba_leg"] = None
-    linux_map = {1: "A", 4: "B"}
-    windows_map = {2: "A", 3: "B"}
-
-    is_linux = df["os"] == linux_label
-    is_windows = df["os"] == windows_label
-
-    df.loc[is_linux, "abba_leg"] = df.loc[is_linux, "run_order"].map(linux_map)
-    df.loc[is_windows, "abba_leg"] = df.loc[is_windows, "run_order"].map(windows_map)
-    return df
-
-
 def prepare_paired_df(df: pd.DataFrame, linux_label: str, windows_label: str) -> pd.DataFrame:
-    required_cols = ("pair_id", "alg", "n", "seed", "os", "wall_ms")
-    if not has_columns(df, required_cols):
-        return pd.DataFrame()
-
-    df = maybe_add_abba_leg(df, linux_label, windows_label)
-
-    merge_keys = ["pair_id", "alg", "n", "seed"]
-    if "abba_leg" in df.columns:
-        merge_keys.append("abba_leg")
-
-    base_cols = [*merge_keys, "wall_ms"]
-    lin = df[df["os"] == linux_label][base_cols].rename(columns={"wall_ms": "wall_ms_lin"})
-    win = df[df["os"] == windows_label][base_cols].rename(columns={"wall_ms": "wall_ms_win"})
-
-    if "abba_leg" in merge_keys:
-        lin = lin.dropna(subset=["abba_leg"])
-        win = win.dropna(subset=["abba_leg"])
-
-    merged = lin.merge(win, on=merge_keys, suffixes=("_lin", "_win"))
-    if merged.empty:
-        print("[warn] No s'ha trobat cap parell Linux/Windows amb els criteris indicats.")
-        return merged
-
-    merged["Dlog"] = np.log(merged["wall_ms_lin"]) - np.log(merged["wall_ms_win"])
-    return merged
+    return pairing.prepare_paired_df(df, linux_label, windows_label, ("wall_ms",))
 
 
 def compute_dlog_stats(dlog: np.ndarray) -> dict | None:
@@ -151,38 +160,116 @@ def build_results(paired: pd.DataFrame) -> pd.DataFrame:
     if global_stats:
         rows.append({"alg": "ALL", **global_stats})
 
-    # Per algorisme
-    for alg in paired["alg"].dropna().unique():
-        sub = paired[paired["alg"] == alg]
-        stats_dict = compute_dlog_stats(sub["Dlog"].to_numpy())
+    # Per algorisme (un sol groupby en lloc de filtrar el frame per cada algorisme)
+    for alg, sub in paired.groupby("alg", observed=True, sort=False)["Dlog"]:
+        stats_dict = compute_dlog_stats(sub.to_numpy())
         if stats_dict:
             rows.append({"alg": sanitize_for_string(str(alg)), **stats_dict})
 
     return pd.DataFrame(rows)
 
 
-def main() -> None:
-    args = parse_args()
+def build_results_per_n(paired: pd.DataFrame, correction: str = stratified.DEFAULT_CORRECTION) -> pd.DataFrame:
+    results = stratified.cell_stats(paired, ["Dlog"], correction=correction)
+    results = results.drop(columns="metric").rename(columns=stratified.summary_columns("dlog"))
+    results["alg"] = results["alg"].astype(str).map(sanitize_for_string)
+    results["ratio"] = np.exp(results["mean_dlog"])
+    results["ratio_ci_low"] = np.exp(results["ci95_low"])
+    results["ratio_ci_high"] = np.exp(results["ci95_high"])
+    return results
 
-    if not args.input.exists():
-        raise FileNotFoundError(f"No s'ha trobat el fitxer d'entrada: {args.input}")
 
-    output_dir = args.output_dir
+def add_resampling_columns(
+    results: pd.DataFrame, paired: pd.DataFrame, resamples: int, seed: int, jobs: int = 1
+) -> pd.DataFrame:
+    # IC BCa i test de permutacio: no suposen normalitat de Dlog (vegeu els QQ-plots)
+    groups = resampling.groups_by_alg(paired, "Dlog", sanitize_for_string)
+    extra = pd.DataFrame.from_dict(
+        resampling.resample_groups(groups, resamples, seed, jobs), orient="index"
+    )
+    results = results.join(extra, on="alg")
+    results["ratio_bca_ci_low"] = np.exp(results["bca_ci95_low"])
+    results["ratio_bca_ci_high"] = np.exp(results["bca_ci95_high"])
+    return results
+
+
+def run_report(
+    df: pd.DataFrame,
+    output_dir: Path,
+    linux_label: str = "Linux",
+    windows_label: str = "Windows",
+    paired: pd.DataFrame | None = None,
+    incremental: bool = True,
+    resamples: int = resampling.DEFAULT_RESAMPLES,
+    seed: int = resampling.DEFAULT_SEED,
+    jobs: int = 1,
+    per_n: bool = False,
+    correction: str = stratified.DEFAULT_CORRECTION,
+) -> None:
     output_dir.mkdir(parents=True, exist_ok=True)
+    manifest = OutputManifest(output_dir, {"tool": source_digest(__file__)}, incremental)
 
-    df = load_dataframe(args.input)
-    paired = prepare_paired_df(df, args.linux_label, args.windows_label)
+    # Dlog nomes sobre execucions d'un fil: amb un escombrat, cada T donaria una altra parella
+    df = pairing.single_thread(df)
+    if paired is None or (not paired.empty and "Dlog" not in paired.columns):
+        paired = prepare_paired_df(df, linux_label, windows_label)
+    paired = pairing.single_thread(paired)
     if paired.empty:
         return
 
+    if per_n and manifest.stale("dlog_inference_per_n.csv", paired[["alg", "n", "Dlog"]], {"correction": correction}):
+        per_n_csv = output_dir / "dlog_inference_per_n.csv"
+        build_results_per_n(paired, correction).to_csv(per_n_csv, index=False)
+        print(f"[save] {per_n_csv}")
+        manifest.done("dlog_inference_per_n.csv")
+
+    params = {"resamples": resamples, "seed": seed}
+    if not manifest.stale("dlog_inference.csv", paired[["alg", "Dlog"]], params):
+        manifest.save()
+        return
+
     results_df = build_results(paired)
     if results_df.empty:
         print("[warn] No s'ha pogut calcular cap estadistic (potser n<2).")
         return
+    if resamples > 0:
+        results_df = add_resampling_columns(results_df, paired, resamples, seed, jobs)
 
     out_csv = output_dir / "dlog_inference.csv"
     results_df.to_csv(out_csv, index=False)
     print(f"[save] {out_csv}")
+    manifest.done("dlog_inference.csv")
+    manifest.save()
+
+
+def main() -> None:
+    args = parse_args()
+
+    paired = None
+    if args.db is not None:
+        conn = database.connect_db(args.db)
+        database.ensure_paired(conn, args.linux_label, args.windows_label)
+        paired = outliers.read_db_paired(conn, DB_PAIRED_COLUMNS, args.outliers, args.output_dir)
+        df = pd.DataFrame()
+    else:
+        if not args.input.exists():
+            raise FileNotFoundError(f"No s'ha trobat el fitxer d'entrada: {args.input}")
+        df = load_dataframe(args.input, use_cache=not args.no_cache)
+        df, _ = outliers.apply_outlier_stage(df, args.outliers, args.output_dir)
+
+    run_report(
+        df,
+        args.output_dir,
+        args.linux_label,
+        args.windows_label,
+        paired=paired,
+        incremental=not args.force,
+        resamples=args.resamples,
+        seed=args.seed,
+        jobs=args.jobs,
+        per_n=args.per_n,
+        correction=args.correction,
+    )
 
 
 if __name__ == "__main__":
@@ -1,8 +1,9 @@
 from __future__ import annotations
 
 import argparse
+import sys
 from pathlib import Path
-from typing import Iterable, List, Tuple
+from typing import List, Tuple
 
 import matplotlib.pyplot as plt
 import numpy as np
@@ -10,12 +11,23 @@ import pandas as pd
 import seaborn as sns
 from scipy.stats import t
 
+if __package__ in (None, ""):
+    sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
+
+from utils_python.common import database, outliers, pairing, resampling, sketch, stratified  # noqa: E402
+from utils_python.common.loader import load_dataframe  # noqa: E402
+from utils_python.common.manifest import OutputManifest, source_digest  # noqa: E402
+
 DEFAULT_INPUT = Path(__file__).resolve().parents[2] / "resultats_tots.csv"
 DEFAULT_OUTPUT_DIR = Path(__file__).resolve().parents[1] / "sortides" / "dcpu_stats"
+# Columnes de paired_runs que fa servir l'informe (amb --db)
+DB_PAIRED_COLUMNS = (*pairing.PAIR_KEYS, "workers", "abba_leg", "cpu_pct_avg_lin", "cpu_pct_avg_win", "Dcpu")
+
 
-plt.rcParams["figure.figsize"] = (6, 4)
-plt.rcParams["figure.dpi"] = 150
-sns.set_theme(style="whitegrid")
+def configure_plots() -> None:
+    plt.rcParams["figure.figsize"] = (6, 4)
+    plt.rcParams["figure.dpi"] = 150
+    sns.set_theme(style="whitegrid")
 
 
 def parse_args() -> argparse.Namespace:
@@ -29,6 +41,12 @@ def parse_args() -> argparse.Namespace:
         default=DEFAULT_INPUT,
         help="CSV amb totes les execucions (Windows + Linux).",
     )
+    parser.add_argument(
+        "--db",
+        type=Path,
+        default=None,
+        help="Base de dades SQLite (ingest_runs.py --db) en lloc de --input: llegeix la taula paired_runs.",
+    )
     parser.add_argument(
         "--output-dir",
         "-o",
@@ -51,71 +69,69 @@ def parse_args() -> argparse.Namespace:
         action="store_true",
         help="Si s'indica, desa també el detall per parella amb Dcpu.",
     )
+    parser.add_argument(
+        "--resamples",
+        type=int,
+        default=resampling.DEFAULT_RESAMPLES,
+        help="Remostres del bootstrap BCa i del test de permutacio per canvi de signe (0 = no es calculen).",
+    )
+    parser.add_argument(
+        "--seed",
+        type=int,
+        default=resampling.DEFAULT_SEED,
+        help="Llavor del bootstrap i de les permutacions.",
+    )
+    parser.add_argument(
+        "--jobs",
+        "-j",
+        type=int,
+        default=1,
+        help="Processos per remostrejar els algorismes en paral·lel (1 = en serie).",
+    )
+    parser.add_argument(
+        "--force",
+        action="store_true",
+        help="Regenera totes les sortides encara que les dades no hagin canviat (ignora manifest.json).",
+    )
+    parser.add_argument(
+        "--exact",
+        action="store_true",
+        help="Dibuixa els boxplots amb totes les dades (seaborn) en lloc dels sketches de quantils.",
+    )
+    parser.add_argument(
+        "--per-n",
+        action="store_true",
+        help=(
+            "Desa tambe la inferencia per cada cel·la (alg, n) (dcpu_inference_per_n.csv), "
+            "amb els p-valors corregits per comparacions multiples."
+        ),
+    )
+    parser.add_argument(
+        "--correction",
+        choices=stratified.CORRECTIONS,
+        default=stratified.DEFAULT_CORRECTION,
+        help="Correccio dels p-valors entre cel·les amb --per-n: holm (FWER) o bh (Benjamini-Hochberg, FDR).",
+    )
+    parser.add_argument(
+        "--outliers",
+        choices=outliers.OUTLIER_METHODS,
+        default=None,
+        help=(
+            "Exclou els outliers de wall_ms per (os, alg, n) abans de l'analisi: mad "
+            "(|x - mediana| > 3 MAD), iqr (fora de Q1 - 1.5 IQR, Q3 + 1.5 IQR) o both. "
+            "Es treu tota la parella ABBA i es desa outliers_exclosos.csv."
+        ),
+    )
+    parser.add_argument(
+        "--no-cache",
+        action="store_true",
+        help="No llegeix ni escriu la cache columnar (.feather) al costat del CSV.",
+    )
     return parser.parse_args()
 
 
-def has_columns(df: pd.DataFrame, required: Iterable[str]) -> bool:
-    missing = [col for col in required if col not in df.columns]
-    if missing:
-        print(f"[error] Falten columnes al CSV: {missing}")
-        return False
-    return True
-
-
-def load_dataframe(csv_path: Path) -> pd.DataFrame:
-    df = pd.read_csv(csv_path, skipinitialspace=True)
-    df.columns = [col.strip() for col in df.columns]
-
-    # Neteja espais a string/object per evitar mismatches (p. ex. "Linux  " vs "Linux")
-    for col in df.columns:
-        if df[col].dtype == object:
-            df[col] = df[col].astype(str).str.strip()
-    return df
-
-
-def maybe_add_abba_leg(df: pd.DataFrame, linux_label: str, windows_label: str) -> pd.DataFrame:
-    if "run_order" not in df.columns:
-        return df
-
-    df = df.copy()
-    df["abba_leg"] = None
-    linux_map = {1: "A", 4: "B"}
-    windows_map = {2: "A", 3: "B"}
-
-    is_linux = df["os"] == linux_label
-    is_windows = df["os"] == windows_label
-
-    df.loc[is_linux, "abba_leg"] = df.loc[is_linux, "run_order"].map(linux_map)
-    df.loc[is_windows, "abba_leg"] = df.loc[is_windows, "run_order"].map(windows_map)
-    return df
-
-
 def prepare_paired_df(df: pd.DataFrame, linux_label: str, windows_label: str) -> pd.DataFrame:
-    required_cols = ("pair_id", "alg", "n", "seed", "os", "cpu_pct_avg")
-    if not has_columns(df, required_cols):
-        return pd.DataFrame()
-
-    df = maybe_add_abba_leg(df, linux_label, windows_label)
-
-    merge_keys = ["pair_id", "alg", "n", "seed"]
-    if "abba_leg" in df.columns:
-        merge_keys.append("abba_leg")
-
-    base_cols = [*merge_keys, "cpu_pct_avg"]
-    lin = df[df["os"] == linux_label][base_cols].rename(columns={"cpu_pct_avg": "cpu_pct_avg_lin"})
-    win = df[df["os"] == windows_label][base_cols].rename(columns={"cpu_pct_avg": "cpu_pct_avg_win"})
-
-    if "abba_leg" in merge_keys:
-        lin = lin.dropna(subset=["abba_leg"])
-        win = win.dropna(subset=["abba_leg"])
-
-    merged = lin.merge(win, on=merge_keys, suffixes=("_lin", "_win"))
-    if merged.empty:
-        print("[warn] No s'ha trobat cap parell Linux/Windows amb els criteris indicats.")
-        return merged
-
-    merged["Dcpu"] = merged["cpu_pct_avg_lin"] - merged["cpu_pct_avg_win"]
-    return merged
+    return pairing.prepare_paired_df(df, linux_label, windows_label, ("cpu_pct_avg",))
 
 
 def compute_ic95(series: pd.Series) -> Tuple[float, float] | None:
@@ -151,60 +167,127 @@ def summarize_dcpu(paired: pd.DataFrame) -> pd.DataFrame:
         )
 
     add_row("ALL", paired)
-    for alg in paired["alg"].dropna().unique():
-        add_row(str(alg).strip(), paired[paired["alg"] == alg])
+    for alg, subset in paired.groupby("alg", observed=True, sort=False):
+        add_row(str(alg).strip(), subset)
 
     return pd.DataFrame(rows)
 
 
-def save_boxplot(paired: pd.DataFrame, output_dir: Path) -> Path:
+def summarize_dcpu_per_n(paired: pd.DataFrame, correction: str = stratified.DEFAULT_CORRECTION) -> pd.DataFrame:
+    summary = stratified.cell_stats(paired, ["Dcpu"], correction=correction)
+    summary = summary.drop(columns="metric").rename(columns=stratified.summary_columns("dcpu"))
+    summary["alg"] = summary["alg"].astype(str).str.strip()
+    return summary
+
+
+def add_resampling_columns(
+    summary: pd.DataFrame, paired: pd.DataFrame, resamples: int, seed: int, jobs: int = 1
+) -> pd.DataFrame:
+    groups = resampling.groups_by_alg(paired, "Dcpu")
+    extra = pd.DataFrame.from_dict(
+        resampling.resample_groups(groups, resamples, seed, jobs), orient="index"
+    )
+    return summary.join(extra, on="alg")
+
+
+def draw_sketched_boxplot(df: pd.DataFrame, by: str, column: str, path: Path) -> None:
+    # Quartils d'un sketch per grup i nomes els outliers reals com a punts; el sketch
+    # es desa al costat de la figura
+    groups = {
+        str(label): values.to_numpy()
+        for label, values in df.groupby(by, observed=True, sort=True)[column]
+    }
+    sketches, stats = sketch.sketch_groups(groups)
+    colors = sns.color_palette(n_colors=len(stats), desat=0.75)
+    sketch.draw_boxplot(plt.gca(), stats, colors)
+    sketch.save_sketches(sketch.sketch_path(path), sketches)
+
+
+def save_boxplot(paired: pd.DataFrame, output_dir: Path, exact: bool = False) -> Path:
+    path = output_dir / "boxplot_dcpu_per_alg.png"
     plt.figure()
-    sns.boxplot(data=paired, x="alg", y="Dcpu")
+    if exact:
+        sns.boxplot(data=paired, x="alg", y="Dcpu")
+        sketch.sketch_path(path).unlink(missing_ok=True)
+    else:
+        draw_sketched_boxplot(paired, "alg", "Dcpu", path)
     plt.axhline(0, color="red", linestyle="--")
     plt.title("Diferencia de CPU (Linux - Windows)")
     plt.xlabel("Algorisme")
     plt.ylabel("Diferencia %CPU")
     plt.tight_layout()
-    path = output_dir / "boxplot_dcpu_per_alg.png"
     plt.savefig(path)
     plt.close()
     print(f"[save] {path}")
     return path
 
 
-def maybe_save_paired(paired: pd.DataFrame, output_dir: Path, enabled: bool) -> None:
-    if not enabled:
-        return
-    paired_path = output_dir / "dcpu_paired.csv"
+def paired_columns(paired: pd.DataFrame) -> List[str]:
     cols = ["pair_id", "alg", "n", "seed"]
     if "abba_leg" in paired.columns:
         cols.append("abba_leg")
     cols += ["cpu_pct_avg_lin", "cpu_pct_avg_win", "Dcpu"]
-    paired.to_csv(paired_path, index=False, columns=cols)
-    print(f"[save] {paired_path}")
+    return cols
 
 
-def main() -> None:
-    args = parse_args()
+def maybe_save_paired(paired: pd.DataFrame, output_dir: Path, enabled: bool) -> None:
+    if not enabled:
+        return
+    paired_path = output_dir / "dcpu_paired.csv"
+    paired.to_csv(paired_path, index=False, columns=paired_columns(paired))
+    print(f"[save] {paired_path}")
 
-    if not args.input.exists():
-        raise FileNotFoundError(f"No s'ha trobat el fitxer d'entrada: {args.input}")
 
-    output_dir = args.output_dir
+def run_report(
+    df: pd.DataFrame,
+    output_dir: Path,
+    linux_label: str = "Linux",
+    windows_label: str = "Windows",
+    save_paired: bool = False,
+    paired: pd.DataFrame | None = None,
+    incremental: bool = True,
+    resamples: int = resampling.DEFAULT_RESAMPLES,
+    seed: int = resampling.DEFAULT_SEED,
+    jobs: int = 1,
+    exact: bool = False,
+    per_n: bool = False,
+    correction: str = stratified.DEFAULT_CORRECTION,
+) -> None:
     output_dir.mkdir(parents=True, exist_ok=True)
+    manifest = OutputManifest(output_dir, {"tool": source_digest(__file__)}, incremental)
 
-    df = load_dataframe(args.input)
-    paired = prepare_paired_df(df, args.linux_label, args.windows_label)
+    # El %CPU depen del nombre de fils: nomes les execucions d'un fil
+    df = pairing.single_thread(df)
+    if paired is None or (not paired.empty and "Dcpu" not in paired.columns):
+        paired = prepare_paired_df(df, linux_label, windows_label)
+    paired = pairing.single_thread(paired)
     if paired.empty:
         return
 
+    dcpu = paired[["alg", "Dcpu"]]
     summary = summarize_dcpu(paired)
-    summary_csv = output_dir / "dcpu_inference.csv"
-    summary.to_csv(summary_csv, index=False)
-    print(f"[save] {summary_csv}")
-
-    save_boxplot(paired, output_dir)
-    maybe_save_paired(paired, output_dir, args.save_paired)
+    if manifest.stale("dcpu_inference.csv", dcpu, {"resamples": resamples, "seed": seed}):
+        if resamples > 0:
+            summary = add_resampling_columns(summary, paired, resamples, seed, jobs)
+        summary_csv = output_dir / "dcpu_inference.csv"
+        summary.to_csv(summary_csv, index=False)
+        print(f"[save] {summary_csv}")
+        manifest.done("dcpu_inference.csv")
+
+    if per_n and manifest.stale("dcpu_inference_per_n.csv", paired[["alg", "n", "Dcpu"]], {"correction": correction}):
+        per_n_csv = output_dir / "dcpu_inference_per_n.csv"
+        summarize_dcpu_per_n(paired, correction).to_csv(per_n_csv, index=False)
+        print(f"[save] {per_n_csv}")
+        manifest.done("dcpu_inference_per_n.csv")
+
+    if manifest.stale("boxplot_dcpu_per_alg.png", dcpu, {"exact": exact}):
+        save_boxplot(paired, output_dir, exact)
+        manifest.done("boxplot_dcpu_per_alg.png")
+
+    if save_paired and manifest.stale("dcpu_paired.csv", paired[paired_columns(paired)]):
+        maybe_save_paired(paired, output_dir, save_paired)
+        manifest.done("dcpu_paired.csv")
+    manifest.save()
 
     for _, row in summary.iterrows():
         if np.isnan(row["ci95_low"]) or np.isnan(row["ci95_high"]):
@@ -212,5 +295,38 @@ def main() -> None:
         print(f"[ic95] {row['alg']}: ({row['ci95_low']:.3f}, {row['ci95_high']:.3f})")
 
 
+def main() -> None:
+    args = parse_args()
+
+    paired = None
+    if args.db is not None:
+        conn = database.connect_db(args.db)
+        database.ensure_paired(conn, args.linux_label, args.windows_label)
+        paired = outliers.read_db_paired(conn, DB_PAIRED_COLUMNS, args.outliers, args.output_dir)
+        df = pd.DataFrame()
+    else:
+        if not args.input.exists():
+            raise FileNotFoundError(f"No s'ha trobat el fitxer d'entrada: {args.input}")
+        df = load_dataframe(args.input, use_cache=not args.no_cache)
+        df, _ = outliers.apply_outlier_stage(df, args.outliers, args.output_dir)
+
+    configure_plots()
+    run_report(
+        df,
+        args.output_dir,
+        args.linux_label,
+        args.windows_label,
+        args.save_paired,
+        paired=paired,
+        incremental=not args.force,
+        resamples=args.resamples,
+        seed=args.seed,
+        jobs=args.jobs,
+        exact=args.exact,
+        per_n=args.per_n,
+        correction=args.correction,
+    )
+
+
 if __name__ == "__main__":
     main()
@@ -0,0 +1,372 @@
+from __future__ import annotations
+
+import argparse
+import sys
+from pathlib import Path
+
+import matplotlib
+
+matplotlib.use("Agg")
+
+import matplotlib.pyplot as plt  # noqa: E402
+
+if __package__ in (None, ""):
+    sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from utils_python.agreement_plots import generate_agreement_plots, infer_dlog_stats  # noqa: E402
+from utils_python.agreement_stats import infer_dcpu_stats  # noqa: E402
+from utils_python.basic_reports import run_analysis  # noqa: E402
+from utils_python.common import database, outliers, pairing, resampling, stratified  # noqa: E402
+from utils_python.complexity import fit_complexity  # noqa: E402
+from utils_python.crossover import fit_crossover  # noqa: E402
+from utils_python.common.loader import file_digest, load_dataframe  # noqa: E402
+from utils_python.common.manifest import OutputManifest, source_digest  # noqa: E402
+from utils_python.rss_stats import infer_drss_stats  # noqa: E402
+from utils_python.throughput import plot_throughput  # noqa: E402
+
+DEFAULT_INPUT = Path(__file__).resolve().parents[1] / "resultats_tots.csv"
+DEFAULT_OUTPUT_ROOT = Path(__file__).resolve().parent / "sortides"
+PACKAGE_DIR = Path(__file__).resolve().parent
+# Subcarpetes de --output-root, una per eina (cadascuna amb el seu manifest.json)
+TOOL_DIRS = (
+    "basic_reports",
+    "agreement_plots",
+    "agreement_stats",
+    "dcpu_stats",
+    "rss_stats",
+    "complexity",
+    "crossover",
+    "throughput",
+)
+# Opcions que no canvien cap sortida
+UNTRACKED_ARGS = ("force", "jobs", "output_root", "no_cache")
+# Amb --db es llegeixen nomes aquestes columnes de runs (les de run_analysis i les claus
+# d'execucio que fan servir collapse_iterations i l'ajust de complexitat)
+DB_RUN_COLUMNS = (
+    *run_analysis.REPORT_COLUMNS,
+    "seed",
+    "run_order",
+    "run_id",
+    "iter",
+)
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        description=(
+            "Genera totes les taules i figures en un sol proces: carrega el CSV un cop, "
+            "calcula l'aparellament Linux/Windows un cop i crida cada eina com a llibreria."
+        )
+    )
+    parser.add_argument(
+        "--input",
+        "-i",
+        type=Path,
+        default=DEFAULT_INPUT,
+        help="CSV amb totes les execucions (Windows + Linux) o carpeta del magatzem Parquet (ingest_runs.py).",
+    )
+    parser.add_argument(
+        "--db",
+        type=Path,
+        default=None,
+        help=(
+            "Base de dades SQLite (ingest_runs.py --db) en lloc de --input: l'aparellament "
+            "surt de la taula paired_runs i les taules basiques s'agreguen a SQL."
+        ),
+    )
+    parser.add_argument(
+        "--alg",
+        nargs="+",
+        default=None,
+        metavar="ALG",
+        help="Amb un magatzem Parquet o --db, llegeix nomes les files d'aquests algorismes.",
+    )
+    parser.add_argument(
+        "--output-root",
+        "-o",
+        type=Path,
+        default=DEFAULT_OUTPUT_ROOT,
+        help="Carpeta arrel; cada eina escriu a la seva subcarpeta (basic_reports, dcpu_stats, crossover, ...).",
+    )
+    parser.add_argument(
+        "--config",
+        "-c",
+        type=Path,
+        default=fit_complexity.DEFAULT_CONFIG,
+        help="config.json amb la complexitat declarada de cada algorisme (per a l'ajust de complexitat).",
+    )
+    parser.add_argument(
+        "--cache-json",
+        type=Path,
+        default=None,
+        help=(
+            "cache.json de la campanya (orquestrador amb --cache-sweep) amb les fronteres L1/L2/L3 "
+            "per a les figures de throughput; per defecte, config.json o les caches d'aquesta maquina."
+        ),
+    )
+    parser.add_argument(
+        "--linux-label",
+        default="Linux",
+        help="Valor de la columna os que identifica Linux.",
+    )
+    parser.add_argument(
+        "--windows-label",
+        default="Windows",
+        help="Valor de la columna os que identifica Windows.",
+    )
+    parser.add_argument(
+        "--skip-per-alg-boxplots",
+        action="store_true",
+        help="Omet els boxplots per algorisme dels resums basics.",
+    )
+    parser.add_argument(
+        "--xlog",
+        action="store_true",
+        help="Fa servir escala log a l'eix n del grafic temps vs n.",
+    )
+    parser.add_argument(
+        "--save-paired",
+        action="store_true",
+        help="Desa tambe el detall per parella (dcpu_paired.csv i drss_paired.csv).",
+    )
+    parser.add_argument(
+        "--jobs",
+        "-j",
+        type=int,
+        default=1,
+        help="Processos per generar les figures per algorisme en paral·lel (1 = en serie).",
+    )
+    parser.add_argument(
+        "--resamples",
+        type=int,
+        default=resampling.DEFAULT_RESAMPLES,
+        help="Remostres del bootstrap BCa i del test de permutacio (Dlog, Dcpu, Drss; 0 = no es calculen).",
+    )
+    parser.add_argument(
+        "--seed",
+        type=int,
+        default=resampling.DEFAULT_SEED,
+        help="Llavor del bootstrap i de les permutacions.",
+    )
+    parser.add_argument(
+        "--per-n",
+        action="store_true",
+        help="Desa tambe la inferencia de Dlog, Dcpu i Drss per cada cel·la (alg, n) (*_per_n.csv).",
+    )
+    parser.add_argument(
+        "--correction",
+        choices=stratified.CORRECTIONS,
+        default=stratified.DEFAULT_CORRECTION,
+        help="Correccio dels p-valors entre cel·les (--per-n i model de crossover): holm (FWER) o bh (Benjamini-Hochberg, FDR).",
+    )
+    parser.add_argument(
+        "--timelines",
+        nargs="+",
+        type=Path,
+        default=[],
+        metavar="DIR",
+        help="Carpetes amb linies de temps RSS/CPU (.rsstl) per a l'informe de memoria.",
+    )
+    parser.add_argument(
+        "--exact",
+        action="store_true",
+        help="Dibuixa els boxplots amb totes les dades en lloc dels sketches de quantils.",
+    )
+    parser.add_argument(
+        "--force",
+        action="store_true",
+        help="Regenera totes les sortides encara que les dades no hagin canviat (ignora manifest.json).",
+    )
+    parser.add_argument(
+        "--outliers",
+        choices=outliers.OUTLIER_METHODS,
+        default=None,
+        help=(
+            "Exclou els outliers de wall_ms per (os, alg, n) abans de l'analisi: mad "
+            "(|x - mediana| > 3 MAD), iqr (fora de Q1 - 1.5 IQR, Q3 + 1.5 IQR) o both. "
+            "Es fa un sol cop per totes les eines; es treu tota la parella ABBA i es desa outliers_exclosos.csv a --output-root."
+        ),
+    )
+    parser.add_argument(
+        "--no-cache",
+        action="store_true",
+        help="No llegeix ni escriu la cache columnar (.feather) al costat del CSV.",
+    )
+    return parser.parse_args()
+
+
+def run_params(args: argparse.Namespace) -> dict:
+    """Parametres de tota l'execucio: opcions, codi de les eines, config.json i caches."""
+    sources = {
+        str(path.relative_to(PACKAGE_DIR)): source_digest(path)
+        for path in sorted(PACKAGE_DIR.rglob("*.py"))
+        if "sortides" not in path.parts
+    }
+    options = {key: str(value) for key, value in vars(args).items() if key not in UNTRACKED_ARGS}
+    return {
+        "options": options,
+        "sources": sources,
+        "config": file_digest(args.config) if args.config.exists() else None,
+        "levels": plot_throughput.load_levels(args.cache_json, args.config),
+    }
+
+
+def main() -> None:
+    args = parse_args()
+
+    db = None
+    gate = None
+    data_key = None
+    if args.db is not None:
+        db = database.connect_db(args.db)
+        if not args.outliers and not args.timelines:
+            # Amb --db l'estat surt de les campanyes ingerides: si no han canviat (ni el
+            # codi ni les opcions), no cal llegir cap fila
+            data_key = run_analysis.db_data_key(db, args.alg)
+            gate = OutputManifest(args.output_root, run_params(args), not args.force, data_key)
+            if gate.up_to_date():
+                print(f"[skip] Base de dades sense canvis: sortides al dia a {args.output_root}")
+                return
+        df = database.read_runs(db, DB_RUN_COLUMNS, algs=args.alg)
+    else:
+        if not args.input.exists():
+            raise FileNotFoundError(f"No s'ha trobat el fitxer d'entrada: {args.input}")
+        df = load_dataframe(args.input, use_cache=not args.no_cache, algs=args.alg)
+    if df.empty:
+        print("[warn] El DataFrame es buit, no hi ha res a processar.")
+        return
+
+    root = args.output_root
+    # Una sola deteccio d'outliers per totes les eines; l'informe va a l'arrel de --output-root
+    df, report = outliers.apply_outlier_stage(df, args.outliers, root)
+    df = pairing.maybe_add_abba_leg(df, args.linux_label, args.windows_label)
+    if db is not None:
+        database.ensure_paired(db, args.linux_label, args.windows_label)
+        paired = outliers.drop_pairs(database.read_paired(db, algs=args.alg, single_thread=True), report)
+    else:
+        paired = pairing.prepare_paired_df(df, args.linux_label, args.windows_label)
+
+    incremental = not args.force
+    # Cada eina te el seu estil; rc_context evita que s'encomani a la seguent.
+    # Les opcions es passen per nom: els run_report creixen amb cada eina nova.
+    with plt.rc_context():
+        run_analysis.configure_plots()
+        run_analysis.run_report(
+            df,
+            root / "basic_reports",
+            skip_per_alg=args.skip_per_alg_boxplots,
+            xlog=args.xlog,
+            jobs=args.jobs,
+            incremental=incremental,
+            # Sense outliers les taules s'agreguen a SQL; amb --outliers, del frame net
+            db=None if args.outliers else db,
+            algs=args.alg,
+            exact=args.exact,
+            data_key=data_key,
+        )
+
+    with plt.rc_context():
+        generate_agreement_plots.configure_plots()
+        generate_agreement_plots.run_report(
+            df,
+            root / "agreement_plots",
+            linux_label=args.linux_label,
+            windows_label=args.windows_label,
+            paired=paired,
+            jobs=args.jobs,
+            incremental=incremental,
+        )
+
+    infer_dlog_stats.run_report(
+        df,
+        root / "agreement_stats",
+        linux_label=args.linux_label,
+        windows_label=args.windows_label,
+        paired=paired,
+        incremental=incremental,
+        resamples=args.resamples,
+        seed=args.seed,
+        jobs=args.jobs,
+        per_n=args.per_n,
+        correction=args.correction,
+    )
+
+    with plt.rc_context():
+        infer_dcpu_stats.configure_plots()
+        infer_dcpu_stats.run_report(
+            df,
+            root / "dcpu_stats",
+            linux_label=args.linux_label,
+            windows_label=args.windows_label,
+            save_paired=args.save_paired,
+            paired=paired,
+            incremental=incremental,
+            resamples=args.resamples,
+            seed=args.seed,
+            jobs=args.jobs,
+            exact=args.exact,
+            per_n=args.per_n,
+            correction=args.correction,
+        )
+
+    with plt.rc_context():
+        infer_drss_stats.configure_plots()
+        infer_drss_stats.run_report(
+            df,
+            root / "rss_stats",
+            linux_label=args.linux_label,
+            windows_label=args.windows_label,
+            save_paired=args.save_paired,
+            paired=paired,
+            incremental=incremental,
+            timeline_dirs=args.timelines,
+            resamples=args.resamples,
+            seed=args.seed,
+            jobs=args.jobs,
+            exact=args.exact,
+            per_n=args.per_n,
+            correction=args.correction,
+        )
+
+    with plt.rc_context():
+        fit_complexity.configure_plots()
+        fit_complexity.run_report(
+            df,
+            root / "complexity",
+            declared=fit_complexity.load_declared(args.config),
+            linux_label=args.linux_label,
+            windows_label=args.windows_label,
+            resamples=args.resamples,
+            seed=args.seed,
+            incremental=incremental,
+        )
+
+    fit_crossover.run_report(
+        df,
+        root / "crossover",
+        linux_label=args.linux_label,
+        windows_label=args.windows_label,
+        correction=args.correction,
+        incremental=incremental,
+    )
+
+    with plt.rc_context():
+        plot_throughput.configure_plots()
+        plot_throughput.run_report(
+            df,
+            root / "throughput",
+            declared=fit_complexity.load_declared(args.config),
+            levels=plot_throughput.load_levels(args.cache_json, args.config),
+            incremental=incremental,
+        )
+
+    if gate is not None:
+        for sub in TOOL_DIRS:
+            name = f"{sub}/manifest.json"
+            if (root / name).exists() and gate.stale(name):
+                gate.done(name)
+        gate.save()
+
+
+if __name__ == "__main__":
+    main()
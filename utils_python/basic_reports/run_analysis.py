@@ -1,17 +1,31 @@
 from __future__ import annotations
 
 import argparse
+import sqlite3
+import sys
 from pathlib import Path
-from typing import Iterable
+from typing import Dict, Iterable, Optional, Sequence
 
 import matplotlib.pyplot as plt
+import numpy as np
 import pandas as pd
 
+if __package__ in (None, ""):
+    sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
+
+from utils_python.common import database, outliers, pairing, sketch, streaming  # noqa: E402
+from utils_python.common.loader import METRIC_DTYPE, file_digest, load_dataframe, metric_float64  # noqa: E402
+from utils_python.common.manifest import ALWAYS_REGENERATE, OutputManifest, source_digest  # noqa: E402
+from utils_python.common.parallel import run_figure_tasks  # noqa: E402
+from utils_python.common.store import read_log  # noqa: E402
+
 DEFAULT_OUTPUT_DIR = Path(__file__).resolve().parents[1] / "sortides" / "basic_reports"
 
-# Configuracio basica de grafics
-plt.rcParams["figure.figsize"] = (6, 4)
-plt.rcParams["figure.dpi"] = 150
+
+def configure_plots() -> None:
+    # Configuracio basica de grafics
+    plt.rcParams["figure.figsize"] = (6, 4)
+    plt.rcParams["figure.dpi"] = 150
 
 
 def parse_args() -> argparse.Namespace:
@@ -24,6 +38,23 @@ def parse_args() -> argparse.Namespace:
         default="resultats_tots.csv",
         help="CSV amb totes les execucions (Windows + Linux).",
     )
+    parser.add_argument(
+        "--db",
+        type=Path,
+        default=None,
+        help=(
+            "Base de dades SQLite (ingest_runs.py --db) en lloc de --input: les taules "
+            "s'agreguen a SQL i nomes es llegeixen les columnes necessaries."
+        ),
+    )
+    parser.add_argument(
+        "--tables-only",
+        action="store_true",
+        help=(
+            "Amb --db, nomes les taules 1-3 i temps_mig, agregades a SQL sense llegir cap fila "
+            "de runs (sense figures)."
+        ),
+    )
     parser.add_argument(
         "--output-dir",
         "-o",
@@ -41,9 +72,151 @@ def parse_args() -> argparse.Namespace:
         action="store_true",
         help="Fa servir escala log a l'eix n del grafic temps vs n.",
     )
+    parser.add_argument(
+        "--jobs",
+        "-j",
+        type=int,
+        default=1,
+        help="Processos per generar les figures per algorisme en paral·lel (1 = en serie).",
+    )
+    parser.add_argument(
+        "--force",
+        action="store_true",
+        help="Regenera totes les sortides encara que les dades no hagin canviat (ignora manifest.json).",
+    )
+    parser.add_argument(
+        "--exact",
+        action="store_true",
+        help=(
+            "Dibuixa els boxplots amb totes les dades (matplotlib) en lloc dels sketches "
+            "de quantils; mes lent i amb mes memoria amb milions de punts."
+        ),
+    )
+    parser.add_argument(
+        "--chunk-rows",
+        type=int,
+        default=0,
+        help=(
+            "Llegeix l'entrada a trossos d'aquestes files i calcula nomes les taules 1-3 "
+            "i temps_mig amb memoria constant (0 = carrega tot el CSV, per defecte)."
+        ),
+    )
+    parser.add_argument(
+        "--outliers",
+        choices=outliers.OUTLIER_METHODS,
+        default=None,
+        help=(
+            "Exclou els outliers de wall_ms per (os, alg, n) abans de l'analisi: mad "
+            "(|x - mediana| > 3 MAD), iqr (fora de Q1 - 1.5 IQR, Q3 + 1.5 IQR) o both. "
+            "Es treu tota la parella ABBA i es desa outliers_exclosos.csv."
+        ),
+    )
+    parser.add_argument(
+        "--no-cache",
+        action="store_true",
+        help="No llegeix ni escriu la cache columnar (.feather) al costat del CSV.",
+    )
     return parser.parse_args()
 
 
+# Columnes que fan servir les taules i figures (les que es llegeixen de --db)
+REPORT_COLUMNS = (
+    "os",
+    "alg",
+    "n",
+    "wall_ms",
+    "cpu_user_ms",
+    "cpu_sys_ms",
+    "cpu_total_ms",
+    "cpu_pct_avg",
+    "rss_peak_mib",
+    "cpu_core",
+    "pair_id",
+    "workers",
+    "cycles",
+    "instructions",
+    "llc_misses",
+    "branch_misses",
+    "context_switches",
+    "page_faults",
+)
+
+
+# Agregats de les taules 1-3 i de temps_mig: {columna de sortida: (columna, funcio)}
+TIME_AGGREGATES = {
+    "wall_mean_ms": ("wall_ms", "mean"),
+    "wall_sd_ms": ("wall_ms", "std"),
+    "wall_min_ms": ("wall_ms", "min"),
+    "wall_max_ms": ("wall_ms", "max"),
+    "n_obs": ("wall_ms", "count"),
+}
+CPU_AGGREGATES = {
+    "cpu_total_mean_ms": ("cpu_total_ms", "mean"),
+    "cpu_total_sd_ms": ("cpu_total_ms", "std"),
+    "cpu_pct_mean": ("cpu_pct_avg", "mean"),
+    "cpu_pct_sd": ("cpu_pct_avg", "std"),
+}
+MEM_AGGREGATES = {
+    "rss_mean_mib": ("rss_peak_mib", "mean"),
+    "rss_sd_mib": ("rss_peak_mib", "std"),
+    "rss_min_mib": ("rss_peak_mib", "min"),
+    "rss_max_mib": ("rss_peak_mib", "max"),
+}
+MEAN_TIME_AGGREGATES = {"wall_ms": ("wall_ms", "mean")}
+
+# Boxplots globals per sistema operatiu: {fitxer: (columna, eix y, titol)}
+GLOBAL_BOXPLOTS = {
+    "figura1_boxplot_wall_global.png": (
+        "wall_ms",
+        "Temps d'execucio (ms)",
+        "Temps d'execucio per sistema operatiu (tots els algorismes)",
+    ),
+    "figura7_boxplot_cpu_pct_global.png": (
+        "cpu_pct_avg",
+        "% CPU (sobre tots els fils)",
+        "Percentatge de CPU per sistema operatiu (tots els algorismes)",
+    ),
+    "figura8_boxplot_rss_global.png": (
+        "rss_peak_mib",
+        "Pic de memoria RSS (MiB)",
+        "Pic de memoria per sistema operatiu (tots els algorismes)",
+    ),
+}
+ALG_WALL_YLABEL = "Temps d'execucio (ms)"
+# Clau dels sketches (alg, os) dels boxplots per algorisme a --chunk-rows
+ALG_WALL_BOXPLOTS = "boxplot_wall_<alg>.png"
+
+# Taules que es poden calcular a trossos (--chunk-rows): {fitxer: (claus, agregats)}
+STREAMING_TABLES = {
+    "taula1_temps_per_os_alg.csv": (("os", "alg"), TIME_AGGREGATES),
+    "temps_mig_per_os_alg_n.csv": (("os", "alg", "n"), MEAN_TIME_AGGREGATES),
+    "taula2_cpu_per_os_alg.csv": (("os", "alg"), CPU_AGGREGATES),
+    "taula3_mem_per_os_alg.csv": (("os", "alg"), MEM_AGGREGATES),
+}
+
+
+def group_stats(
+    df: pd.DataFrame,
+    aggregates: Dict[str, tuple],
+    group_by: Sequence[str] = ("os", "alg"),
+    db: Optional[sqlite3.Connection] = None,
+    algs: Optional[Sequence[str]] = None,
+) -> pd.DataFrame:
+    # Amb --db l'agregacio es fa a SQLite i no recorre el frame
+    if db is not None:
+        return database.grouped_stats(db, aggregates, group_by, algs, single_thread=True)
+    # S'acumula en float64 sobre el valor del CSV i es torna a float32, com SQLite i
+    # --chunk-rows: les tres vies donen la mateixa taula (el groupby sobre float32 perd
+    # l'ultim digit)
+    columns = list(dict.fromkeys(col for col, _ in aggregates.values()))
+    wide = df[list(group_by)].assign(**{col: metric_float64(df[col]) for col in columns})
+    stats = wide.groupby(list(group_by), observed=True).agg(**aggregates).reset_index()
+    for name, (column, func) in aggregates.items():
+        if func != "count" and df[column].dtype == METRIC_DTYPE:
+            stats[name] = stats[name].astype(METRIC_DTYPE)
+    return stats
+
+
 def sanitize_for_filename(value: str) -> str:
     return value.replace("/", "_").replace("\\", "_").replace(" ", "_")
 
@@ -56,88 +229,172 @@ def has_columns(df: pd.DataFrame, required: Iterable[str], label: str) -> bool:
     return True
 
 
-def load_dataframe(csv_path: Path) -> pd.DataFrame:
-    df = pd.read_csv(csv_path, skipinitialspace=True)
-    df.columns = [col.strip() for col in df.columns]
+def alg_wall_boxplot_name(alg: str) -> str:
+    return f"boxplot_wall_{sanitize_for_filename(str(alg))}.png"
 
-    if {"cpu_user_ms", "cpu_sys_ms"}.issubset(df.columns):
-        df["cpu_total_ms"] = df["cpu_user_ms"] + df["cpu_sys_ms"]
 
-    for cat_col in ("os", "alg"):
-        if cat_col in df.columns:
-            df[cat_col] = df[cat_col].astype("category")
+def alg_wall_title(alg: str) -> str:
+    return f"Temps d'execucio per sistema operatiu - {alg}"
 
-    return df
 
+def os_groups(df: pd.DataFrame, column: str) -> Dict[str, np.ndarray]:
+    return {
+        str(os_name): values.to_numpy()
+        for os_name, values in df.groupby("os", observed=True, sort=True)[column]
+    }
 
-def generate_time_outputs(df: pd.DataFrame, output_dir: Path, skip_per_alg: bool) -> None:
-    if not has_columns(df, ("os", "alg", "wall_ms"), "Taula 1 / Figura 1"):
-        return
 
-    time_stats = (
-        df.groupby(["os", "alg"])["wall_ms"]
-        .agg(["mean", "std", "min", "max", "count"])
-        .reset_index()
-        .rename(
-            columns={
-                "mean": "wall_mean_ms",
-                "std": "wall_sd_ms",
-                "min": "wall_min_ms",
-                "max": "wall_max_ms",
-                "count": "n_obs",
-            }
-        )
-    )
+def save_sketched_boxplot(
+    stats: Sequence[dict], sketches: Dict[str, sketch.QuantileSketch], ylabel: str, title: str, path: Path
+) -> None:
+    # Quartils del sketch, bigotis i outliers exactes; matplotlib no rep totes les dades
+    plt.figure()
+    sketch.draw_boxplot(plt.gca(), stats)
+    plt.grid(True)
+    plt.xlabel("Sistema operatiu")
+    plt.ylabel(ylabel)
+    plt.title(title)
+    plt.tight_layout()
+    plt.savefig(path)
+    plt.close()
+    sketch.save_sketches(sketch.sketch_path(path), sketches)
+    print(f"[save] {path}")
 
-    time_csv = output_dir / "taula1_temps_per_os_alg.csv"
-    time_stats.to_csv(time_csv, index=False)
-    print(f"[save] {time_csv}")
+
+def save_alg_wall_boxplot(sub: pd.DataFrame, alg: str, output_dir: Path, exact: bool = False) -> None:
+    per_alg_path = output_dir / alg_wall_boxplot_name(alg)
+    if not exact:
+        sketches, stats = sketch.sketch_groups(os_groups(sub, "wall_ms"))
+        save_sketched_boxplot(stats, sketches, ALG_WALL_YLABEL, alg_wall_title(alg), per_alg_path)
+        return
 
     plt.figure()
-    df.boxplot(column="wall_ms", by="os")
+    sub.boxplot(column="wall_ms", by="os")
     plt.xlabel("Sistema operatiu")
-    plt.ylabel("Temps d'execucio (ms)")
-    plt.title("Temps d'execucio per sistema operatiu (tots els algorismes)")
+    plt.ylabel(ALG_WALL_YLABEL)
+    plt.title(alg_wall_title(alg))
     plt.suptitle("")
     plt.tight_layout()
-    wall_global = output_dir / "figura1_boxplot_wall_global.png"
-    plt.savefig(wall_global)
+    plt.savefig(per_alg_path)
     plt.close()
-    print(f"[save] {wall_global}")
+    sketch.sketch_path(per_alg_path).unlink(missing_ok=True)
+    print(f"[save] {per_alg_path}")
+
+
+def generate_time_outputs(
+    df: pd.DataFrame,
+    output_dir: Path,
+    skip_per_alg: bool,
+    jobs: int = 1,
+    manifest: OutputManifest = ALWAYS_REGENERATE,
+    db: Optional[sqlite3.Connection] = None,
+    algs: Optional[Sequence[str]] = None,
+    exact: bool = False,
+) -> None:
+    if not has_columns(df, ("os", "alg", "wall_ms"), "Taula 1 / Figura 1"):
+        return
+
+    if manifest.stale("taula1_temps_per_os_alg.csv", df[["os", "alg", "wall_ms"]]):
+        save_time_table(df, output_dir, db, algs)
+        manifest.done("taula1_temps_per_os_alg.csv")
+
+    save_global_boxplot(df, "figura1_boxplot_wall_global.png", output_dir, manifest, exact)
 
     if skip_per_alg:
         return
 
-    for alg in df["alg"].dropna().unique():
-        sub = df[df["alg"] == alg]
-        if sub.empty:
-            continue
+    # Cada tasca rep nomes la seva porcio (os, wall_ms), no tot el frame
+    tasks = []
+    names = []
+    for alg, sub in df.groupby("alg", observed=True, sort=False):
+        sub = sub[["os", "wall_ms"]]
+        name = alg_wall_boxplot_name(alg)
+        if manifest.stale(name, sub, str(alg), {"exact": exact}):
+            tasks.append((save_alg_wall_boxplot, (sub, alg, output_dir, exact)))
+            names.append(name)
+    run_figure_tasks(tasks, jobs)
+    for name in names:
+        manifest.done(name)
+
+
+def save_global_boxplot(
+    df: pd.DataFrame,
+    name: str,
+    output_dir: Path,
+    manifest: OutputManifest = ALWAYS_REGENERATE,
+    exact: bool = False,
+) -> None:
+    column, ylabel, title = GLOBAL_BOXPLOTS[name]
+    if not manifest.stale(name, df[["os", column]], {"exact": exact}):
+        return
+    path = output_dir / name
+    if not exact:
+        sketches, stats = sketch.sketch_groups(os_groups(df, column))
+        save_sketched_boxplot(stats, sketches, ylabel, title, path)
+        manifest.done(name)
+        return
+
+    plt.figure()
+    df.boxplot(column=column, by="os")
+    plt.xlabel("Sistema operatiu")
+    plt.ylabel(ylabel)
+    plt.title(title)
+    plt.suptitle("")
+    plt.tight_layout()
+    plt.savefig(path)
+    plt.close()
+    sketch.sketch_path(path).unlink(missing_ok=True)
+    print(f"[save] {path}")
+    manifest.done(name)
+
+
+def save_time_table(
+    df: pd.DataFrame,
+    output_dir: Path,
+    db: Optional[sqlite3.Connection] = None,
+    algs: Optional[Sequence[str]] = None,
+) -> None:
+    time_stats = group_stats(
+        df,
+        TIME_AGGREGATES,
+        db=db,
+        algs=algs,
+    )
+
+    time_csv = output_dir / "taula1_temps_per_os_alg.csv"
+    time_stats.to_csv(time_csv, index=False)
+    print(f"[save] {time_csv}")
 
-        alg_label = sanitize_for_filename(str(alg))
-        plt.figure()
-        sub.boxplot(column="wall_ms", by="os")
-        plt.xlabel("Sistema operatiu")
-        plt.ylabel("Temps d'execucio (ms)")
-        plt.title(f"Temps d'execucio per sistema operatiu - {alg}")
-        plt.suptitle("")
-        plt.tight_layout()
-        per_alg_path = output_dir / f"boxplot_wall_{alg_label}.png"
-        plt.savefig(per_alg_path)
-        plt.close()
-        print(f"[save] {per_alg_path}")
-
-
-def plot_time_vs_n(df: pd.DataFrame, output_dir: Path, log_scale: bool) -> None:
+
+def plot_time_vs_n(
+    df: pd.DataFrame,
+    output_dir: Path,
+    log_scale: bool,
+    manifest: OutputManifest = ALWAYS_REGENERATE,
+    db: Optional[sqlite3.Connection] = None,
+    algs: Optional[Sequence[str]] = None,
+) -> None:
     if not has_columns(df, ("os", "alg", "n", "wall_ms"), "Figura 6"):
         return
 
-    mean_time_n = df.groupby(["os", "alg", "n"])["wall_ms"].mean().reset_index()
-    mean_csv = output_dir / "temps_mig_per_os_alg_n.csv"
-    mean_time_n.to_csv(mean_csv, index=False)
-    print(f"[save] {mean_csv}")
+    inputs = df[["os", "alg", "n", "wall_ms"]]
+    csv_stale = manifest.stale("temps_mig_per_os_alg_n.csv", inputs)
+    fig_stale = manifest.stale("figura6_temps_vs_n_per_os.png", inputs, log_scale)
+    if not (csv_stale or fig_stale):
+        return
+
+    mean_time_n = group_stats(df, MEAN_TIME_AGGREGATES, ("os", "alg", "n"), db, algs)
+    if csv_stale:
+        mean_csv = output_dir / "temps_mig_per_os_alg_n.csv"
+        mean_time_n.to_csv(mean_csv, index=False)
+        print(f"[save] {mean_csv}")
+        manifest.done("temps_mig_per_os_alg_n.csv")
+
+    if not fig_stale:
+        return
 
     plt.figure()
-    for os_name, sub in mean_time_n.groupby("os"):
+    for os_name, sub in mean_time_n.groupby("os", observed=True):
         plt.plot(sub["n"], sub["wall_ms"], marker="o", linestyle="-", label=os_name)
 
     plt.xlabel("Mida de l'input (n)")
@@ -151,93 +408,581 @@ def plot_time_vs_n(df: pd.DataFrame, output_dir: Path, log_scale: bool) -> None:
     plt.savefig(fig_path)
     plt.close()
     print(f"[save] {fig_path}")
+    manifest.done("figura6_temps_vs_n_per_os.png")
 
 
-def generate_cpu_outputs(df: pd.DataFrame, output_dir: Path) -> None:
+def generate_cpu_outputs(
+    df: pd.DataFrame,
+    output_dir: Path,
+    manifest: OutputManifest = ALWAYS_REGENERATE,
+    db: Optional[sqlite3.Connection] = None,
+    algs: Optional[Sequence[str]] = None,
+    exact: bool = False,
+) -> None:
     if "cpu_total_ms" not in df.columns and {"cpu_user_ms", "cpu_sys_ms"}.issubset(df.columns):
-        df["cpu_total_ms"] = df["cpu_user_ms"] + df["cpu_sys_ms"]
+        # assign: a analyze_all el frame es compartit amb les eines seguents
+        df = df.assign(cpu_total_ms=df["cpu_user_ms"] + df["cpu_sys_ms"])
 
     if not has_columns(df, ("os", "alg", "cpu_total_ms", "cpu_pct_avg"), "Taula 2 / Figura 7"):
         return
 
-    cpu_stats = (
-        df.groupby(["os", "alg"])
-        .agg(
-            cpu_total_mean_ms=("cpu_total_ms", "mean"),
-            cpu_total_sd_ms=("cpu_total_ms", "std"),
-            cpu_pct_mean=("cpu_pct_avg", "mean"),
-            cpu_pct_sd=("cpu_pct_avg", "std"),
-        )
-        .reset_index()
+    if manifest.stale("taula2_cpu_per_os_alg.csv", df[["os", "alg", "cpu_total_ms", "cpu_pct_avg"]]):
+        save_cpu_table(df, output_dir, db, algs)
+        manifest.done("taula2_cpu_per_os_alg.csv")
+
+    save_global_boxplot(df, "figura7_boxplot_cpu_pct_global.png", output_dir, manifest, exact)
+
+
+def save_cpu_table(
+    df: pd.DataFrame,
+    output_dir: Path,
+    db: Optional[sqlite3.Connection] = None,
+    algs: Optional[Sequence[str]] = None,
+) -> None:
+    cpu_stats = group_stats(
+        df,
+        CPU_AGGREGATES,
+        db=db,
+        algs=algs,
     )
 
     cpu_csv = output_dir / "taula2_cpu_per_os_alg.csv"
     cpu_stats.to_csv(cpu_csv, index=False)
     print(f"[save] {cpu_csv}")
 
-    plt.figure()
-    df.boxplot(column="cpu_pct_avg", by="os")
-    plt.xlabel("Sistema operatiu")
-    plt.ylabel("% CPU (sobre tots els fils)")
-    plt.title("Percentatge de CPU per sistema operatiu (tots els algorismes)")
-    plt.suptitle("")
-    plt.tight_layout()
-    cpu_fig = output_dir / "figura7_boxplot_cpu_pct_global.png"
-    plt.savefig(cpu_fig)
-    plt.close()
-    print(f"[save] {cpu_fig}")
-
 
-def generate_mem_outputs(df: pd.DataFrame, output_dir: Path) -> None:
+def generate_mem_outputs(
+    df: pd.DataFrame,
+    output_dir: Path,
+    manifest: OutputManifest = ALWAYS_REGENERATE,
+    db: Optional[sqlite3.Connection] = None,
+    algs: Optional[Sequence[str]] = None,
+    exact: bool = False,
+) -> None:
     if not has_columns(df, ("os", "alg", "rss_peak_mib"), "Taula 3 / Figura 8"):
         return
 
-    mem_stats = (
-        df.groupby(["os", "alg"])
-        .agg(
-            rss_mean_mib=("rss_peak_mib", "mean"),
-            rss_sd_mib=("rss_peak_mib", "std"),
-            rss_min_mib=("rss_peak_mib", "min"),
-            rss_max_mib=("rss_peak_mib", "max"),
-        )
-        .reset_index()
+    if manifest.stale("taula3_mem_per_os_alg.csv", df[["os", "alg", "rss_peak_mib"]]):
+        save_mem_table(df, output_dir, db, algs)
+        manifest.done("taula3_mem_per_os_alg.csv")
+
+    save_global_boxplot(df, "figura8_boxplot_rss_global.png", output_dir, manifest, exact)
+
+
+def save_mem_table(
+    df: pd.DataFrame,
+    output_dir: Path,
+    db: Optional[sqlite3.Connection] = None,
+    algs: Optional[Sequence[str]] = None,
+) -> None:
+    mem_stats = group_stats(
+        df,
+        MEM_AGGREGATES,
+        db=db,
+        algs=algs,
     )
 
     mem_csv = output_dir / "taula3_mem_per_os_alg.csv"
     mem_stats.to_csv(mem_csv, index=False)
     print(f"[save] {mem_csv}")
 
-    plt.figure()
-    df.boxplot(column="rss_peak_mib", by="os")
-    plt.xlabel("Sistema operatiu")
-    plt.ylabel("Pic de memoria RSS (MiB)")
-    plt.title("Pic de memoria per sistema operatiu (tots els algorismes)")
-    plt.suptitle("")
-    plt.tight_layout()
-    mem_fig = output_dir / "figura8_boxplot_rss_global.png"
-    plt.savefig(mem_fig)
-    plt.close()
-    print(f"[save] {mem_fig}")
+
+def generate_core_outputs(
+    df: pd.DataFrame, output_dir: Path, manifest: OutputManifest = ALWAYS_REGENERATE
+) -> None:
+    required = ("os", "alg", "n", "cpu_core", "wall_ms")
+    if not has_columns(df, required, "Temps per nucli"):
+        return
+    if df["cpu_core"].nunique() < 2:
+        # Campanya en serie (o sense fixar nucli): no hi ha res a comparar
+        return
+
+    name = "temps_per_nucli.csv"
+    if manifest.stale(name, df[list(required)]):
+        save_core_table(df, output_dir / name)
+        manifest.done(name)
+
+
+def save_core_table(df: pd.DataFrame, path: Path) -> None:
+    # Mediana de wall_ms de cada nucli relativa a la de totes les execucions del mateix
+    # (os, alg, n): si l'execucio simultania desplaça el temps, surt lluny de 1.
+    sub = df.dropna(subset=["cpu_core"])
+    core_stats = (
+        sub.groupby(["os", "alg", "n", "cpu_core"], observed=True)["wall_ms"]
+        .agg(wall_median_ms="median", wall_mean_ms="mean", n_obs="count")
+        .reset_index()
+    )
+    overall = (
+        sub.groupby(["os", "alg", "n"], observed=True)["wall_ms"]
+        .median()
+        .rename("wall_median_all_ms")
+        .reset_index()
+    )
+    core_stats = core_stats.merge(overall, on=["os", "alg", "n"])
+    core_stats["wall_ratio_vs_all"] = core_stats["wall_median_ms"] / core_stats["wall_median_all_ms"]
+
+    core_stats.to_csv(path, index=False)
+    print(f"[save] {path}")
+
+
+PERF_COUNTERS = ("cycles", "instructions", "llc_misses", "branch_misses", "context_switches", "page_faults")
+
+
+def generate_counter_outputs(
+    df: pd.DataFrame, output_dir: Path, manifest: OutputManifest = ALWAYS_REGENERATE
+) -> None:
+    required = ("os", "alg", "n", *PERF_COUNTERS)
+    if not has_columns(df, required, "Taules de comptadors (IPC, misses per element)"):
+        return
+    counters = df[list(required)]
+    if counters[list(PERF_COUNTERS)].isna().all().all():
+        print("[omit] Taules de comptadors: cap execucio amb comptadors perf_event")
+        return
+
+    if manifest.stale("ipc_per_os_alg_n.csv", counters):
+        save_ipc_table(counters, output_dir / "ipc_per_os_alg_n.csv")
+        manifest.done("ipc_per_os_alg_n.csv")
+
+    if manifest.stale("misses_per_element_per_os_alg_n.csv", counters):
+        save_misses_table(counters, output_dir / "misses_per_element_per_os_alg_n.csv")
+        manifest.done("misses_per_element_per_os_alg_n.csv")
+
+
+def _as_float(df: pd.DataFrame, columns: Iterable[str]) -> pd.DataFrame:
+    # Els comptadors arriben com a Int64 amb <NA>; es passen a float (NaN) per dividir
+    return df.assign(**{col: df[col].astype("float64") for col in columns})
+
+
+def save_ipc_table(df: pd.DataFrame, path: Path) -> None:
+    sub = _as_float(df, ("cycles", "instructions"))
+    sub = sub.assign(ipc=sub["instructions"] / sub["cycles"].where(sub["cycles"] > 0))
+    ipc_stats = (
+        sub.dropna(subset=["ipc"])
+        .groupby(["os", "alg", "n"], observed=True)
+        .agg(
+            ipc_mean=("ipc", "mean"),
+            ipc_sd=("ipc", "std"),
+            ipc_median=("ipc", "median"),
+            cycles_mean=("cycles", "mean"),
+            instructions_mean=("instructions", "mean"),
+            n_obs=("ipc", "count"),
+        )
+        .reset_index()
+    )
+
+    ipc_stats.to_csv(path, index=False)
+    print(f"[save] {path}")
+
+
+def save_misses_table(df: pd.DataFrame, path: Path) -> None:
+    sub = _as_float(df, PERF_COUNTERS)
+    per_elem = {f"{col}_per_elem": sub[col] / sub["n"] for col in PERF_COUNTERS if col != "instructions"}
+    sub = sub[["os", "alg", "n"]].assign(**per_elem)
+
+    columns = [
+        "cycles_per_elem",
+        "llc_misses_per_elem",
+        "branch_misses_per_elem",
+        "page_faults_per_elem",
+        "context_switches_per_elem",
+    ]
+    misses_stats = (
+        sub.groupby(["os", "alg", "n"], observed=True)[columns]
+        .mean()
+        .reset_index()
+    )
+    misses_stats["n_obs"] = sub.groupby(["os", "alg", "n"], observed=True).size().to_numpy()
+
+    misses_stats.to_csv(path, index=False)
+    print(f"[save] {path}")
+
+
+SPEEDUP_KEYS = ["os", "alg", "n"]
+
+
+def generate_speedup_outputs(
+    df: pd.DataFrame, output_dir: Path, manifest: OutputManifest = ALWAYS_REGENERATE
+) -> None:
+    required = ("os", "pair_id", "alg", "n", "wall_ms")
+    if not has_columns(df, required, "Speedup i eficiencia"):
+        return
+    # Els fils de treball son la columna workers (o el sufix _t{T} del pair_id als CSV antics);
+    # la columna threads d'aquests CSV guarda els threads hardware i falsejaria T(1)
+    inputs = df[list(required)].assign(threads=pairing.worker_threads(df))
+    if inputs["threads"].nunique() < 2:
+        # Campanya sense escombrat de fils: res a comparar
+        return
+
+    speedup = speedup_table(inputs)
+    if speedup.empty:
+        print("[omit] Speedup: cap (os, alg, n) amb execucions a 1 fil i amb mes fils")
+        return
+    fits = scaling_fits(speedup)
+    speedup = add_fitted_speedup(speedup, fits)
+
+    if manifest.stale("speedup_per_os_alg_n.csv", inputs):
+        path = output_dir / "speedup_per_os_alg_n.csv"
+        speedup.to_csv(path, index=False)
+        print(f"[save] {path}")
+        manifest.done("speedup_per_os_alg_n.csv")
+
+    if manifest.stale("speedup_fits_per_os_alg_n.csv", inputs):
+        path = output_dir / "speedup_fits_per_os_alg_n.csv"
+        fits.to_csv(path, index=False)
+        print(f"[save] {path}")
+        manifest.done("speedup_fits_per_os_alg_n.csv")
+
+    for os_name in sorted(speedup["os"].astype(str).unique()):
+        name = f"speedup_{sanitize_for_filename(os_name)}.png"
+        if manifest.stale(name, inputs[inputs["os"] == os_name]):
+            save_speedup_figure(speedup, fits, os_name, output_dir / name)
+            manifest.done(name)
+
+
+def speedup_table(df: pd.DataFrame) -> pd.DataFrame:
+    """Mediana de wall_ms per (os, alg, n, fils), speedup T(1)/T(p), eficiencia S/p i Karp-Flatt.
+
+    Nomes queden les cel·les (os, alg, n) amb execucions a 1 fil i a algun altre nombre de fils.
+    """
+    cells = (
+        df[[*SPEEDUP_KEYS, "threads", "wall_ms"]]
+        .astype({"wall_ms": "float64", "threads": "int64"})
+        .groupby([*SPEEDUP_KEYS, "threads"], observed=True)["wall_ms"]
+        .agg(wall_median_ms="median", n_obs="count")
+        .reset_index()
+    )
+    base = cells.loc[cells["threads"] == 1, [*SPEEDUP_KEYS, "wall_median_ms"]]
+    cells = cells.merge(base.rename(columns={"wall_median_ms": "wall_median_1_ms"}), on=SPEEDUP_KEYS)
+    cells = cells[cells.groupby(SPEEDUP_KEYS, observed=True)["threads"].transform("size") > 1]
+
+    p = cells["threads"].to_numpy(np.float64)
+    speedup = (cells["wall_median_1_ms"] / cells["wall_median_ms"]).to_numpy()
+    with np.errstate(divide="ignore", invalid="ignore"):
+        # Fraccio serial experimental (Karp-Flatt): constant si el limit es la part serial,
+        # creixent amb p si ho es el cost de coordinar els fils
+        karp_flatt = np.where(p > 1, (1 / speedup - 1 / p) / (1 - 1 / p), np.nan)
+    return cells.assign(speedup=speedup, efficiency=speedup / p, karp_flatt=karp_flatt).reset_index(drop=True)
+
+
+def _group_r2(y: np.ndarray, fitted: np.ndarray, codes: np.ndarray) -> np.ndarray:
+    count = np.bincount(codes)
+    mean = np.bincount(codes, weights=y) / count
+    ss_res = np.bincount(codes, weights=(y - fitted) ** 2)
+    ss_tot = np.bincount(codes, weights=(y - mean[codes]) ** 2)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return np.where(ss_tot > 0, 1 - ss_res / ss_tot, np.nan)
+
+
+def scaling_fits(speedup: pd.DataFrame) -> pd.DataFrame:
+    """Ajust d'Amdahl i de Gustafson per (os, alg, n), en forma tancada (un parametre cadascun).
+
+    Amdahl: T(p)/T(1) = (1 - f) + f/p, lineal en f; s'ajusta sobre el temps relatiu.
+    Gustafson: S(p) = p - s (p - 1), lineal en la fraccio serial s; s'ajusta sobre el speedup.
+    Les fraccions es limiten a [0, 1] (un speedup superlineal donaria f > 1).
+    """
+    codes = speedup.groupby(SPEEDUP_KEYS, observed=True, sort=True).ngroup().to_numpy()
+    p = speedup["threads"].to_numpy(np.float64)
+    s = speedup["speedup"].to_numpy()
+    # Sumes per grup amb bincount: minims quadrats d'un parametre sense interceptor
+    x = 1 - 1 / p
+    f = np.clip(np.bincount(codes, weights=x * (1 - 1 / s)) / np.bincount(codes, weights=x * x), 0.0, 1.0)
+    g = p - 1
+    serial = np.clip(np.bincount(codes, weights=g * (p - s)) / np.bincount(codes, weights=g * g), 0.0, 1.0)
+
+    fits = (
+        speedup.groupby(SPEEDUP_KEYS, observed=True, sort=True)
+        .agg(points=("threads", "size"), max_threads=("threads", "max"), max_speedup=("speedup", "max"))
+        .reset_index()
+    )
+    with np.errstate(divide="ignore"):
+        fits["amdahl_parallel_fraction"] = f
+        fits["amdahl_speedup_limit"] = 1 / (1 - f)
+    fits["amdahl_r2"] = _group_r2(1 / s, 1 - f[codes] * x, codes)
+    fits["gustafson_serial_fraction"] = serial
+    fits["gustafson_r2"] = _group_r2(s, p - serial[codes] * g, codes)
+    return fits
+
+
+def add_fitted_speedup(speedup: pd.DataFrame, fits: pd.DataFrame) -> pd.DataFrame:
+    fractions = fits[[*SPEEDUP_KEYS, "amdahl_parallel_fraction", "gustafson_serial_fraction"]]
+    merged = speedup.merge(fractions, on=SPEEDUP_KEYS, how="left")
+    p = merged["threads"].to_numpy(np.float64)
+    f = merged.pop("amdahl_parallel_fraction").to_numpy()
+    serial = merged.pop("gustafson_serial_fraction").to_numpy()
+    return merged.assign(amdahl_speedup=1 / ((1 - f) + f / p), gustafson_speedup=p - serial * (p - 1))
+
+
+def save_speedup_figure(speedup: pd.DataFrame, fits: pd.DataFrame, os_name: str, path: Path) -> None:
+    sub = speedup[speedup["os"] == os_name]
+    fractions = fits[fits["os"] == os_name].set_index(["alg", "n"])["amdahl_parallel_fraction"]
+    grid = np.linspace(1, float(sub["threads"].max()), 100)
+
+    fig, (ax_speedup, ax_efficiency) = plt.subplots(1, 2, figsize=(11, 4))
+    ax_speedup.plot(grid, grid, color="0.6", linestyle=":", label="Ideal (S = p)")
+    for (alg, n), cell in sub.groupby(["alg", "n"], observed=True):
+        label = f"{alg} (n={n})"
+        points = ax_speedup.plot(cell["threads"], cell["speedup"], marker="o", label=label)
+        color = points[0].get_color()
+        f = fractions.loc[(alg, n)]
+        ax_speedup.plot(grid, 1 / ((1 - f) + f / grid), color=color, linestyle="--", linewidth=0.8)
+        ax_efficiency.plot(cell["threads"], cell["efficiency"], marker="o", color=color, label=label)
+    ax_efficiency.axhline(1.0, color="0.6", linestyle=":")
+
+    ax_speedup.set_xlabel("Fils (p)")
+    ax_speedup.set_ylabel("Speedup T(1) / T(p)")
+    ax_speedup.set_title("Speedup (discontinua: ajust d'Amdahl)")
+    ax_speedup.legend(fontsize=7)
+    ax_efficiency.set_xlabel("Fils (p)")
+    ax_efficiency.set_ylabel("Eficiencia S(p) / p")
+    ax_efficiency.set_title("Eficiencia paral·lela")
+    fig.suptitle(f"Escalat amb el nombre de fils - {os_name}")
+    fig.tight_layout()
+    fig.savefig(path)
+    plt.close(fig)
+    print(f"[save] {path}")
+
+
+def run_report(
+    df: pd.DataFrame,
+    output_dir: Path,
+    skip_per_alg: bool = False,
+    xlog: bool = False,
+    jobs: int = 1,
+    incremental: bool = True,
+    db: Optional[sqlite3.Connection] = None,
+    algs: Optional[Sequence[str]] = None,
+    exact: bool = False,
+    data_key: Optional[str] = None,
+) -> None:
+    """Taules i figures basiques. Amb `db` (i el filtre `algs` amb que s'ha llegit `df`),
+    les taules 1-3 i temps_mig s'agreguen directament a SQLite. Els boxplots es
+    dibuixen a partir de sketches de quantils tret que `exact` sigui cert. Amb
+    `data_key` (db_data_key) el manifest no hashega `df`."""
+    output_dir.mkdir(parents=True, exist_ok=True)
+    manifest = report_manifest(output_dir, incremental, data_key, skip_per_alg, xlog, exact)
+
+    # Amb un escombrat de fils, tot excepte el speedup es fa sobre les execucions d'un fil
+    single = pairing.single_thread(df)
+    generate_time_outputs(single, output_dir, skip_per_alg, jobs, manifest, db, algs, exact)
+    plot_time_vs_n(single, output_dir, xlog, manifest, db, algs)
+    generate_cpu_outputs(single, output_dir, manifest, db, algs, exact)
+    generate_mem_outputs(single, output_dir, manifest, db, algs, exact)
+    generate_core_outputs(single, output_dir, manifest)
+    generate_counter_outputs(single, output_dir, manifest)
+    generate_speedup_outputs(df, output_dir, manifest)
+    manifest.save()
+
+
+def report_manifest(
+    output_dir: Path,
+    incremental: bool,
+    data_key: Optional[str] = None,
+    skip_per_alg: bool = False,
+    xlog: bool = False,
+    exact: bool = False,
+) -> OutputManifest:
+    # Les opcions formen part dels parametres perque up_to_date() les tingui en compte
+    params = {"tool": source_digest(__file__), "skip_per_alg": skip_per_alg, "xlog": xlog, "exact": exact}
+    return OutputManifest(output_dir, params, incremental, data_key)
+
+
+def db_data_key(db: sqlite3.Connection, algs: Optional[Sequence[str]] = None) -> str:
+    """Clau de les dades de --db: les campanyes ingerides i el filtre d'algorismes."""
+    return f"{database.data_version(db)}:{','.join(sorted(algs or []))}"
+
+
+def run_db_tables(
+    db: sqlite3.Connection,
+    output_dir: Path,
+    algs: Optional[Sequence[str]] = None,
+    incremental: bool = True,
+) -> None:
+    """Taules 1-3 i temps_mig agregades a SQLite sense llegir cap fila de `runs`."""
+    output_dir.mkdir(parents=True, exist_ok=True)
+    manifest = OutputManifest(
+        output_dir, {"tool": source_digest(__file__), "tables_only": True}, incremental, db_data_key(db, algs)
+    )
+    for name, (keys, aggregates) in STREAMING_TABLES.items():
+        if not manifest.stale(name):
+            continue
+        path = output_dir / name
+        database.grouped_stats(db, aggregates, keys, algs, single_thread=True).to_csv(path, index=False)
+        print(f"[save] {path}")
+        manifest.done(name)
+    manifest.save()
+
+
+def run_streaming_report(
+    input_path: Path,
+    output_dir: Path,
+    chunk_rows: int = streaming.DEFAULT_CHUNK_ROWS,
+    incremental: bool = True,
+    skip_per_alg: bool = False,
+    exact: bool = False,
+) -> None:
+    """Taules 1-3, temps_mig i boxplots llegint l'entrada a trossos, sense carregar-la sencera.
+
+    Per grup nomes es guarden count, sum, mitjana/M2 (Welford) i min/max, que es
+    fusionen tros a tros; el resultat es el mateix que el groupby sobre el frame.
+    Els boxplots surten d'un sketch de quantils per grup (primera passada) i d'una
+    segona passada que nomes guarda els bigotis i els outliers.
+    """
+    output_dir.mkdir(parents=True, exist_ok=True)
+    manifest = OutputManifest(output_dir, {"tool": source_digest(__file__)}, incremental)
+
+    if input_path.is_dir():
+        fingerprint = read_log(input_path)
+    else:
+        fingerprint = file_digest(input_path)
+    tables = {
+        name: STREAMING_TABLES[name] for name in STREAMING_TABLES if manifest.stale(name, fingerprint)
+    }
+    figures: Dict[str, tuple] = {}
+    if exact:
+        print("[omit] Boxplots: --exact necessita totes les dades a memoria (sense --chunk-rows)")
+    else:
+        figures = {
+            name: (("os",), column)
+            for name, (column, _, _) in GLOBAL_BOXPLOTS.items()
+            if manifest.stale(name, fingerprint, {"exact": exact})
+        }
+        if not skip_per_alg:
+            figures[ALG_WALL_BOXPLOTS] = (("alg", "os"), "wall_ms")
+
+    columns = set()
+    for keys, aggregates in tables.values():
+        columns.update((*keys, *(column for column, _ in aggregates.values())))
+    for keys, column in figures.values():
+        columns.update((*keys, column))
+    if not columns:
+        manifest.save()
+        return
+    # Per quedar-se nomes amb les execucions d'un fil (pairing.single_thread)
+    columns.update(("workers", "pair_id", "alg", "n"))
+
+    moments: Dict[str, Optional[pd.DataFrame]] = {}
+    sketches: Dict[str, Dict[tuple, sketch.QuantileSketch]] = {}
+    for chunk in streaming.iter_chunks(input_path, chunk_rows, sorted(columns)):
+        chunk = pairing.single_thread(chunk)
+        streaming.update_moments(moments, chunk, tables)
+        streaming.update_sketches(sketches, chunk, figures)
+
+    for name, table in streaming.finalize_tables(moments, tables).items():
+        path = output_dir / name
+        table.to_csv(path, index=False)
+        print(f"[save] {path}")
+        manifest.done(name)
+    for name in tables:
+        if moments.get(name) is None:
+            print(f"[omit] {name}: falten columnes a l'entrada")
+
+    # Figures a dibuixar: {fitxer: (titol, eix y, {etiqueta: clau del sketch})}
+    plots: Dict[str, tuple] = {}
+    for name, per_group in sketches.items():
+        if name != ALG_WALL_BOXPLOTS:
+            _, ylabel, title = GLOBAL_BOXPLOTS[name]
+            plots[name] = (name, title, ylabel, {key[0]: key for key in per_group})
+            continue
+        for alg in sorted({key[0] for key in per_group}):
+            alg_name = alg_wall_boxplot_name(alg)
+            if manifest.stale(alg_name, fingerprint, alg, {"exact": exact}):
+                labels = {key[1]: key for key in per_group if key[0] == alg}
+                plots[alg_name] = (name, alg_wall_title(alg), ALG_WALL_YLABEL, labels)
+    if not plots:
+        manifest.save()
+        return
+
+    tails = {
+        name: {key: sketch.Tails(*sketch.fences(sk)) for key, sk in per_group.items()}
+        for name, per_group in sketches.items()
+    }
+    for chunk in streaming.iter_chunks(input_path, chunk_rows, sorted(columns)):
+        streaming.update_tails(tails, pairing.single_thread(chunk), figures)
+
+    for out_name, (name, title, ylabel, labels) in plots.items():
+        group_sketches = {label: sketches[name][labels[label]] for label in sorted(labels)}
+        stats = [
+            sketch.box_stats(sk, tails[name][labels[label]], label) for label, sk in group_sketches.items()
+        ]
+        save_sketched_boxplot(stats, group_sketches, ylabel, title, output_dir / out_name)
+        manifest.done(out_name)
+
+    print("[omit] Figura 6 i taules per nucli/comptadors/speedup: no es generen amb --chunk-rows")
+    manifest.save()
 
 
 def main() -> None:
     args = parse_args()
-    output_dir = args.output_dir
-    output_dir.mkdir(parents=True, exist_ok=True)
 
-    csv_path = Path(args.input)
-    if not csv_path.exists():
-        raise FileNotFoundError(f"No s'ha trobat el fitxer d'entrada: {csv_path}")
+    if args.tables_only and (args.db is None or args.outliers):
+        raise ValueError("--tables-only necessita --db i no es compatible amb --outliers")
+
+    if args.chunk_rows > 0 and args.outliers:
+        raise ValueError("--outliers necessita totes les dades a memoria (sense --chunk-rows)")
+    if args.chunk_rows > 0 and args.db is not None:
+        # Amb --db les taules ja s'agreguen a SQL sense carregar cap fila a pandas
+        print("[warn] --chunk-rows no s'aplica amb --db: les taules s'agreguen a SQLite (vegeu --tables-only)")
+    if args.chunk_rows > 0 and args.db is None:
+        csv_path = Path(args.input)
+        if not csv_path.exists():
+            raise FileNotFoundError(f"No s'ha trobat el fitxer d'entrada: {csv_path}")
+        configure_plots()
+        run_streaming_report(
+            csv_path,
+            args.output_dir,
+            args.chunk_rows,
+            incremental=not args.force,
+            skip_per_alg=args.skip_per_alg_boxplots,
+            exact=args.exact,
+        )
+        return
 
-    df = load_dataframe(csv_path)
+    db = None
+    data_key = None
+    if args.db is not None:
+        db = database.connect_db(args.db)
+        if args.tables_only:
+            run_db_tables(db, args.output_dir, incremental=not args.force)
+            return
+        if not args.outliers:
+            # L'estat de les sortides surt de la base de dades: si no ha canviat, no es llegeix res
+            data_key = db_data_key(db)
+            manifest = report_manifest(
+                args.output_dir, not args.force, data_key, args.skip_per_alg_boxplots, args.xlog, args.exact
+            )
+            if manifest.up_to_date():
+                print(f"[skip] Base de dades sense canvis: sortides al dia a {args.output_dir}")
+                return
+        if args.outliers:
+            df = database.read_runs(db, list(dict.fromkeys((*REPORT_COLUMNS, *outliers.OUTLIER_COLUMNS))))
+        else:
+            df = database.read_runs(db, REPORT_COLUMNS)
+    else:
+        csv_path = Path(args.input)
+        if not csv_path.exists():
+            raise FileNotFoundError(f"No s'ha trobat el fitxer d'entrada: {csv_path}")
+        df = load_dataframe(csv_path, use_cache=not args.no_cache)
+
+    configure_plots()
     if df.empty:
         print("[warn] El DataFrame es buit, no hi ha res a processar.")
         return
-
-    generate_time_outputs(df, output_dir, args.skip_per_alg_boxplots)
-    plot_time_vs_n(df, output_dir, args.xlog)
-    generate_cpu_outputs(df, output_dir)
-    generate_mem_outputs(df, output_dir)
+    if args.outliers:
+        df, _ = outliers.apply_outlier_stage(df, args.outliers, args.output_dir)
+        # Les taules s'agreguen del frame net, no de la taula runs sencera
+        db = None
+
+    run_report(
+        df,
+        args.output_dir,
+        args.skip_per_alg_boxplots,
+        args.xlog,
+        args.jobs,
+        incremental=not args.force,
+        db=db,
+        exact=args.exact,
+        data_key=data_key,
+    )
 
 
 if __name__ == "__main__":
@@ -0,0 +1 @@
+"Peces compartides entre les eines d'analisi (carrega, aparellament, ...)."
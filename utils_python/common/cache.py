@@ -0,0 +1,113 @@
+from __future__ import annotations
+
+import json
+import re
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import numpy as np
+
+CACHE_SYSFS = Path("/sys/devices/system/cpu/cpu0/cache")
+CACHE_FILE = "cache.json"
+# Mida de l'element dels vectors dels algorismes (std::vector<int>)
+ELEMENT_BYTES = {"int": 4}
+DEFAULT_ELEMENT = "int"
+# Nomes te sentit escombrar n per algorismes que recorren un vector de n elements
+DEFAULT_SWEEP_ALGS = ("linear_scan", "mergesort")
+# Per cada frontera: `points` mides log-espaiades entre frontera / span i frontera * span
+DEFAULT_POINTS = 9
+DEFAULT_SPAN = 4.0
+
+_SIZE_UNITS = {"": 1, "K": 1 << 10, "M": 1 << 20, "G": 1 << 30}
+
+
+def parse_size(text: str) -> int:
+    # Format de sysfs: "48K", "2048K", "32M"
+    match = re.fullmatch(r"\s*(\d+)\s*([KMG]?)i?B?\s*", text, flags=re.IGNORECASE)
+    if match is None:
+        raise ValueError(f"Mida de cache desconeguda: {text!r}")
+    return int(match.group(1)) * _SIZE_UNITS[match.group(2).upper()]
+
+
+def read_cache_levels(root: Path = CACHE_SYSFS) -> Dict[str, int]:
+    """Mida en bytes de cada nivell de cache de dades de cpu0: {"L1": ..., "L2": ..., "L3": ...}.
+
+    Les caches d'instruccions es descarten. Sense sysfs (Windows, contenidors) torna {}.
+    """
+    levels: Dict[str, int] = {}
+    for index in sorted(root.glob("index*")):
+        try:
+            if (index / "type").read_text().strip() == "Instruction":
+                continue
+            level = f"L{int((index / 'level').read_text())}"
+            levels[level] = max(levels.get(level, 0), parse_size((index / "size").read_text()))
+        except (OSError, ValueError):
+            continue
+    return dict(sorted(levels.items()))
+
+
+def cache_levels(section: Optional[dict] = None) -> Dict[str, int]:
+    """`cache_sweep.sizes_kib` de config.json si hi es; si no, les mides de sysfs.
+
+    A Windows no hi ha sysfs: cal copiar a config.json les mides de la campanya de
+    Linux (cache.json) perque les dues generin la mateixa graella de n i s'aparellin.
+    """
+    sizes_kib = (section or {}).get("sizes_kib")
+    if sizes_kib:
+        return {str(level): int(kib) * 1024 for level, kib in sorted(sizes_kib.items())}
+    return read_cache_levels()
+
+
+def sweep_ns(
+    levels: Dict[str, int],
+    element_bytes: int = ELEMENT_BYTES[DEFAULT_ELEMENT],
+    points: int = DEFAULT_POINTS,
+    span: float = DEFAULT_SPAN,
+) -> List[int]:
+    """Graella de n log-espaiada al voltant de cada frontera de cache (en elements).
+
+    Amb els valors per defecte, 9 punts per nivell entre 1/4 i 4 vegades la capacitat
+    (pas sqrt(2)); el punt central es exactament la frontera.
+    """
+    grid = []
+    for size in levels.values():
+        boundary = size / element_bytes
+        grid.append(np.geomspace(boundary / span, boundary * span, points))
+    if not grid:
+        return []
+    ns = np.unique(np.rint(np.concatenate(grid)).astype(np.int64))
+    return [int(n) for n in ns if n > 0]
+
+
+def apply_cache_sweep(cfg: dict, levels: Dict[str, int]) -> dict:
+    """Copia de cfg amb les `ns` dels algorismes escombrats substituides per la graella."""
+    section = cfg.get("cache_sweep") or {}
+    element_bytes = ELEMENT_BYTES[section.get("element", DEFAULT_ELEMENT)]
+    ns = sweep_ns(
+        levels,
+        element_bytes,
+        int(section.get("points", DEFAULT_POINTS)),
+        float(section.get("span", DEFAULT_SPAN)),
+    )
+    algs = set(section.get("algos", DEFAULT_SWEEP_ALGS))
+    algos = [dict(entry, ns=ns) if entry["name"] in algs else entry for entry in cfg.get("algos", [])]
+    return {**cfg, "algos": algos}
+
+
+def write_cache_file(path: Path, levels: Dict[str, int], element: str = DEFAULT_ELEMENT) -> Path:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    payload = {"element": element, "element_bytes": ELEMENT_BYTES[element], "levels": levels}
+    path.write_text(json.dumps(payload, indent=2), encoding="utf-8")
+    return path
+
+
+def read_cache_file(path: Path) -> Dict[str, int]:
+    payload = json.loads(Path(path).read_text(encoding="utf-8"))
+    return {str(level): int(size) for level, size in payload.get("levels", {}).items()}
+
+
+def format_size(size: int) -> str:
+    for unit in ("G", "M", "K"):
+        if size >= _SIZE_UNITS[unit] and size % _SIZE_UNITS[unit] == 0:
+            return f"{size // _SIZE_UNITS[unit]} {unit}iB"
+    return f"{size} B"
@@ -0,0 +1,384 @@
+from __future__ import annotations
+
+import hashlib
+import math
+import sqlite3
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Sequence
+
+import pandas as pd
+
+from utils_python.common.loader import (
+    CATEGORICAL_COLUMNS,
+    INTEGER_COLUMNS,
+    METRIC_COLUMNS,
+    METRIC_DTYPE,
+    categorize,
+    metric_float64,
+)
+from utils_python.common.pairing import (
+    LINUX_ABBA_LEGS,
+    PAIR_KEYS,
+    PAIRED_METRICS,
+    WINDOWS_ABBA_LEGS,
+    difference_column,
+)
+from utils_python.common.store import (
+    DEDUP_KEYS,
+    DERIVED_COLUMNS,
+    OPTIONAL_COLUMNS,
+    REQUIRED_COLUMNS,
+    conform,
+)
+
+COLUMNS = (*REQUIRED_COLUMNS, *OPTIONAL_COLUMNS, *DERIVED_COLUMNS)
+RUN_KEYS = ("os", *PAIR_KEYS, "run_order", "run_id")
+# Enters que load_dataframe no declara a INTEGER_COLUMNS (pandas ja els infereix)
+ORDER_COLUMNS = ("run_order", "run_id", "threads")
+DIFFERENCE_COLUMNS = {
+    difference_column(m, kind) for m in PAIRED_METRICS for kind in ("abs", "log")
+}
+# Versio de l'esquema: si canvia, cal tornar a carregar la base de dades
+SCHEMA_VERSION = 2
+
+
+def _sql_type(column: str) -> str:
+    if column in INTEGER_COLUMNS or column in ORDER_COLUMNS:
+        return "INTEGER"
+    if column in METRIC_COLUMNS or column == "cooldown_s":
+        return "REAL"
+    return "TEXT"
+
+
+SCHEMA = f"""
+CREATE TABLE IF NOT EXISTS runs (
+    {", ".join(f"{col} {_sql_type(col)}" for col in COLUMNS)}
+);
+CREATE UNIQUE INDEX IF NOT EXISTS runs_dedup ON runs ({", ".join(DEDUP_KEYS)});
+CREATE INDEX IF NOT EXISTS runs_alg_n_os ON runs (alg, n, os);
+CREATE INDEX IF NOT EXISTS runs_pair_seed ON runs (pair_id, seed);
+CREATE INDEX IF NOT EXISTS runs_timestamp ON runs (timestamp);
+CREATE TABLE IF NOT EXISTS views_meta (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS ingested (
+    campaign_id TEXT PRIMARY KEY,
+    blake2b TEXT NOT NULL,
+    rows INTEGER NOT NULL,
+    added INTEGER NOT NULL,
+    ingested_at TEXT NOT NULL
+);
+PRAGMA user_version = {SCHEMA_VERSION};
+"""
+
+
+def connect_db(path: Path, create: bool = False) -> sqlite3.Connection:
+    path = Path(path)
+    if not create and not path.exists():
+        raise FileNotFoundError(f"No s'ha trobat la base de dades: {path}")
+    conn = sqlite3.connect(path)
+    try:
+        conn.execute("SELECT ln(1), sqrt(1)")
+    except sqlite3.OperationalError:
+        # SQLite compilat sense funcions matematiques (ln per Dlog, sqrt per la desviacio)
+        conn.create_function(
+            "ln", 1, lambda x: math.log(x) if x is not None and x > 0 else None, deterministic=True
+        )
+        conn.create_function(
+            "sqrt", 1, lambda x: math.sqrt(x) if x is not None and x >= 0 else None, deterministic=True
+        )
+    version = conn.execute("PRAGMA user_version").fetchone()[0]
+    if version not in (0, SCHEMA_VERSION):
+        raise ValueError(
+            f"{path} te l'esquema {version} i aquesta versio fa servir el {SCHEMA_VERSION}: "
+            "torna a carregar les campanyes amb ingest_runs.py en una base de dades nova"
+        )
+    conn.executescript(SCHEMA)
+    return conn
+
+
+def read_log(conn: sqlite3.Connection) -> Dict[str, dict]:
+    rows = conn.execute("SELECT campaign_id, blake2b, rows, added, ingested_at FROM ingested")
+    return {
+        campaign_id: {"blake2b": digest, "rows": n_rows, "added": added, "ingested_at": when}
+        for campaign_id, digest, n_rows, added, when in rows
+    }
+
+
+def write_log(conn: sqlite3.Connection, log: Dict[str, dict]) -> None:
+    with conn:
+        conn.executemany(
+            "INSERT OR REPLACE INTO ingested VALUES (?, ?, ?, ?, ?)",
+            [
+                (cid, e["blake2b"], e["rows"], e["added"], e.get("ingested_at", ""))
+                for cid, e in log.items()
+            ],
+        )
+
+
+def _records(df: pd.DataFrame) -> Iterable[tuple]:
+    # Valors de Python (None per als buits) en l'ordre de COLUMNS
+    frame = df.astype(object).where(df.notna(), None)
+    return frame.itertuples(index=False, name=None)
+
+
+def append_campaign(conn: sqlite3.Connection, df: pd.DataFrame) -> int:
+    """Insereix les files d'una campanya; les repetides (DEDUP_KEYS) s'ignoren."""
+    df = conform(df)
+    df = df.reindex(columns=list(COLUMNS))
+    # Els REAL de SQLite son float64: es desa el valor del CSV, no el seu arrodoniment a float32
+    for col in METRIC_COLUMNS:
+        if col in df.columns:
+            df[col] = metric_float64(df[col])
+    placeholders = ", ".join("?" for _ in COLUMNS)
+    with conn:
+        before = conn.total_changes
+        conn.executemany(
+            f"INSERT OR IGNORE INTO runs ({', '.join(COLUMNS)}) VALUES ({placeholders})",
+            _records(df),
+        )
+        return conn.total_changes - before
+
+
+def _abba_leg_sql(linux_label: str, windows_label: str, table: str = "") -> str:
+    prefix = f"{table}." if table else ""
+    cases = [
+        f"WHEN {prefix}os = {_quote(label)} AND {prefix}run_order = {order} THEN '{leg}'"
+        for label, legs in ((linux_label, LINUX_ABBA_LEGS), (windows_label, WINDOWS_ABBA_LEGS))
+        for order, leg in legs.items()
+    ]
+    return f"CASE {' '.join(cases)} END"
+
+
+def _quote(value: str) -> str:
+    return "'" + str(value).replace("'", "''") + "'"
+
+
+def _median_sql(metric: str) -> str:
+    keys = ", ".join(RUN_KEYS)
+    return f"""
+        SELECT {keys}, AVG({metric}) AS {metric} FROM (
+            SELECT {keys}, {metric},
+                   ROW_NUMBER() OVER (PARTITION BY {keys} ORDER BY {metric}) AS rn,
+                   COUNT(*) OVER (PARTITION BY {keys}) AS cnt
+            FROM runs WHERE {metric} IS NOT NULL
+        ) WHERE rn IN ((cnt + 1) / 2, (cnt + 2) / 2)
+        GROUP BY {keys}"""
+
+
+def _run_summary_sql(conn: sqlite3.Connection, linux_label: str, windows_label: str) -> str:
+    """Una fila per execucio; les iteracions internes es redueixen a la mediana (com collapse_iterations)."""
+    metrics = ", ".join(PAIRED_METRICS)
+    keys = ", ".join(RUN_KEYS)
+    has_iter = conn.execute("SELECT EXISTS (SELECT 1 FROM runs WHERE iter IS NOT NULL)").fetchone()[0]
+    if not has_iter:
+        leg = _abba_leg_sql(linux_label, windows_label)
+        return f"SELECT rowid AS run_rowid, {keys}, workers, {leg} AS abba_leg, {metrics} FROM runs"
+
+    first = f"SELECT {keys}, MIN(rowid) AS run_rowid, MIN(workers) AS workers FROM runs GROUP BY {keys}"
+    joins = "".join(
+        f" LEFT JOIN ({_median_sql(m)}) AS m{i} USING ({keys})" for i, m in enumerate(PAIRED_METRICS)
+    )
+    cols = ", ".join(f"m{i}.{m}" for i, m in enumerate(PAIRED_METRICS))
+    return (
+        f"SELECT k.run_rowid, {', '.join(f'k.{c}' for c in RUN_KEYS)}, k.workers, "
+        f"{_abba_leg_sql(linux_label, windows_label, 'k')} AS abba_leg, {cols} "
+        f"FROM ({first}) AS k{joins}"
+    )
+
+
+def refresh_views(
+    conn: sqlite3.Connection, linux_label: str = "Linux", windows_label: str = "Windows"
+) -> None:
+    """Reconstrueix les vistes materialitzades `run_summary` i `paired_runs`.
+
+    `paired_runs` te les mateixes columnes que pairing.prepare_paired_df: claus,
+    `abba_leg`, `<m>_lin`, `<m>_win` i les diferencies (Dlog, Dcpu, Drss, ...).
+    """
+    diffs: List[str] = []
+    for m in PAIRED_METRICS:
+        diffs.append(f"l.{m} - w.{m} AS {difference_column(m, 'abs')}")
+        diffs.append(
+            f"CASE WHEN l.{m} > 0 AND w.{m} > 0 THEN ln(l.{m}) - ln(w.{m}) END "
+            f"AS {difference_column(m, 'log')}"
+        )
+    sides = ", ".join(
+        [f"l.{m} AS {m}_lin" for m in PAIRED_METRICS] + [f"w.{m} AS {m}_win" for m in PAIRED_METRICS]
+    )
+    keys = ", ".join(f"l.{k}" for k in PAIR_KEYS)
+    on = " AND ".join(f"l.{k} = w.{k}" for k in (*PAIR_KEYS, "abba_leg"))
+
+    with conn:
+        conn.execute("DROP TABLE IF EXISTS paired_runs")
+        conn.execute("DROP TABLE IF EXISTS run_summary")
+        conn.execute(f"CREATE TABLE run_summary AS {_run_summary_sql(conn, linux_label, windows_label)}")
+        conn.execute("CREATE INDEX run_summary_pair ON run_summary (pair_id, alg, n, seed, abba_leg)")
+        conn.execute(
+            f"""CREATE TABLE paired_runs AS
+            SELECT {keys}, l.workers, l.abba_leg, {sides}, {", ".join(diffs)}
+            FROM run_summary AS l JOIN run_summary AS w ON {on}
+            WHERE l.os = ? AND w.os = ? AND l.abba_leg IS NOT NULL
+            ORDER BY l.run_rowid""",
+            (linux_label, windows_label),
+        )
+        conn.execute("CREATE INDEX paired_runs_alg_n ON paired_runs (alg, n)")
+        conn.executemany(
+            "INSERT OR REPLACE INTO views_meta VALUES (?, ?)",
+            [("labels", f"{linux_label}\t{windows_label}"), ("data_version", data_version(conn))],
+        )
+
+
+def data_version(conn: sqlite3.Connection) -> str:
+    """Hash de les campanyes carregades (per al manifest de sortides)."""
+    digest = hashlib.blake2b(digest_size=16)
+    for row in conn.execute("SELECT campaign_id, blake2b FROM ingested ORDER BY campaign_id"):
+        digest.update(repr(row).encode())
+    return digest.hexdigest()
+
+
+def ensure_paired(
+    conn: sqlite3.Connection, linux_label: str = "Linux", windows_label: str = "Windows"
+) -> None:
+    """Refresca `paired_runs` nomes si falta, si han canviat les etiquetes o si hi ha dades noves."""
+    meta = dict(conn.execute("SELECT key, value FROM views_meta"))
+    if (
+        has_table(conn, "paired_runs")
+        and meta.get("labels") == f"{linux_label}\t{windows_label}"
+        and meta.get("data_version") == data_version(conn)
+    ):
+        return
+    refresh_views(conn, linux_label, windows_label)
+    print("[cache] paired_runs refrescada")
+
+
+def _where(
+    algs: Optional[Sequence[str]],
+    oses: Optional[Sequence[str]] = None,
+    table: str = "",
+    single_thread: bool = False,
+):
+    prefix = f"{table}." if table else ""
+    clauses, params = [], []
+    for column, values in (("alg", algs), ("os", oses)):
+        if values:
+            clauses.append(f"{prefix}{column} IN ({', '.join('?' for _ in values)})")
+            params.extend(values)
+    if single_thread:
+        # Com pairing.single_thread: la columna workers i, a les files d'abans que existis,
+        # el sufix _t<T> del pair_id
+        legacy = f"CASE WHEN {prefix}pair_id GLOB {prefix}alg || '_' || {prefix}n || '_t[0-9]*' THEN 0 ELSE 1 END"
+        clauses.append(f"COALESCE({prefix}workers, {legacy}) = 1")
+    return (" WHERE " + " AND ".join(clauses)) if clauses else "", params
+
+
+def _typed(df: pd.DataFrame) -> pd.DataFrame:
+    # Mateixos tipus que load_dataframe i prepare_paired_df (diferencies en float64)
+    for col in df.columns:
+        if col in DIFFERENCE_COLUMNS:
+            df[col] = pd.to_numeric(df[col], errors="coerce").astype("float64")
+        elif col in METRIC_COLUMNS or col.endswith(("_lin", "_win")):
+            df[col] = pd.to_numeric(df[col], errors="coerce").astype(METRIC_DTYPE)
+        elif col in INTEGER_COLUMNS or col in ORDER_COLUMNS:
+            values = pd.to_numeric(df[col], errors="coerce")
+            df[col] = values.astype("Int64") if values.isna().any() else values.astype("int64")
+    return categorize(df) if set(CATEGORICAL_COLUMNS) & set(df.columns) else df
+
+
+def read_runs(
+    conn: sqlite3.Connection,
+    columns: Sequence[str],
+    algs: Optional[Sequence[str]] = None,
+    oses: Optional[Sequence[str]] = None,
+) -> pd.DataFrame:
+    """Nomes les columnes i files demanades (el filtre es fa a SQL amb l'index alg/n/os)."""
+    where, params = _where(algs, oses)
+    df = pd.read_sql_query(
+        f"SELECT {', '.join(columns)} FROM runs{where} ORDER BY rowid", conn, params=params
+    )
+    return _typed(df)
+
+
+def read_paired(
+    conn: sqlite3.Connection,
+    columns: Optional[Sequence[str]] = None,
+    algs: Optional[Sequence[str]] = None,
+    single_thread: bool = False,
+) -> pd.DataFrame:
+    """Files de paired_runs; amb `single_thread`, nomes les parelles d'un fil de treball."""
+    where, params = _where(algs, single_thread=single_thread)
+    select = ", ".join(columns) if columns else "*"
+    df = pd.read_sql_query(f"SELECT {select} FROM paired_runs{where}", conn, params=params)
+    return _typed(df)
+
+
+def grouped_stats(
+    conn: sqlite3.Connection,
+    aggregates: Dict[str, tuple],
+    group_by: Sequence[str] = ("os", "alg"),
+    algs: Optional[Sequence[str]] = None,
+    single_thread: bool = False,
+) -> pd.DataFrame:
+    """Agregats calculats a SQLite: {nom: (columna, "mean" | "std" | "min" | "max" | "count")}.
+
+    La desviacio es la mostral (ddof=1), com pandas; SQLite no en te, i es calcula
+    amb les sumes de quadrats respecte la mitjana del grup. Amb `single_thread` nomes
+    compten les execucions d'un fil de treball.
+    """
+    exprs = []
+    for name, (column, func) in aggregates.items():
+        if func == "mean":
+            exprs.append(f"AVG(r.{column}) AS {name}")
+        elif func in ("min", "max"):
+            exprs.append(f"{func.upper()}(r.{column}) AS {name}")
+        elif func == "count":
+            exprs.append(f"COUNT(r.{column}) AS {name}")
+        elif func == "std":
+            exprs.append(
+                f"CASE WHEN COUNT(r.{column}) > 1 THEN sqrt(SUM((r.{column} - g.mean_{column}) * "
+                f"(r.{column} - g.mean_{column})) / (COUNT(r.{column}) - 1)) END AS {name}"
+            )
+        else:
+            raise ValueError(f"Agregat desconegut: {func}")
+
+    keys = ", ".join(group_by)
+    where, params = _where(algs, single_thread=single_thread)
+    needs_mean = sorted({col for col, func in aggregates.values() if func == "std"})
+    join = ""
+    if needs_mean:
+        means = ", ".join(f"AVG({col}) AS mean_{col}" for col in needs_mean)
+        on = " AND ".join(f"r.{k} = g.{k}" for k in group_by)
+        join = f" JOIN (SELECT {keys}, {means} FROM runs{where} GROUP BY {keys}) AS g ON {on}"
+    sql = (
+        f"SELECT {', '.join(f'r.{k}' for k in group_by)}, {', '.join(exprs)} "
+        f"FROM runs AS r{join}{_where(algs, table='r', single_thread=single_thread)[0]} "
+        f"GROUP BY {', '.join(f'r.{k}' for k in group_by)} ORDER BY {', '.join(f'r.{k}' for k in group_by)}"
+    )
+    stats = pd.read_sql_query(sql, conn, params=params * (2 if needs_mean else 1))
+    for name, (column, func) in aggregates.items():
+        # Mateixos tipus que el groupby de pandas sobre les columnes float32
+        if func == "count":
+            stats[name] = stats[name].astype("int64")
+        elif column in METRIC_COLUMNS:
+            stats[name] = stats[name].astype(METRIC_DTYPE)
+    return _typed(stats)
+
+
+def has_table(conn: sqlite3.Connection, name: str) -> bool:
+    row = conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (name,))
+    return row.fetchone() is not None
+
+
+__all__ = [
+    "append_campaign",
+    "connect_db",
+    "data_version",
+    "ensure_paired",
+    "grouped_stats",
+    "has_table",
+    "read_log",
+    "read_paired",
+    "read_runs",
+    "refresh_views",
+    "write_log",
+]
@@ -0,0 +1,250 @@
+from __future__ import annotations
+
+import hashlib
+from pathlib import Path
+from typing import Dict, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+
+try:
+    import pyarrow as pa
+    import pyarrow.feather as feather
+except ImportError:  # pragma: no cover - depen de l'entorn
+    pa = None
+    feather = None
+
+# Columnes amb pocs valors diferents: es guarden com a categories
+CATEGORICAL_COLUMNS = ("os", "alg", "compiler", "os_name")
+INTEGER_COLUMNS = (
+    "n",
+    "seed",
+    "cpu_core",
+    "iter",
+    "workers",
+    # Comptadors perf_event (buits fora de Linux)
+    "cycles",
+    "instructions",
+    "llc_misses",
+    "branch_misses",
+    "context_switches",
+    "page_faults",
+)
+METRIC_COLUMNS = (
+    "wall_ms",
+    "cpu_user_ms",
+    "cpu_sys_ms",
+    "cpu_total_ms",
+    "cpu_pct_avg",
+    "rss_peak_mib",
+    "temp_c",
+)
+METRIC_DTYPE = "float32"
+
+CACHE_SUFFIX = ".feather"
+CACHE_VERSION = "1"
+_HASH_CHUNK_BYTES = 8 * 1024 * 1024
+
+
+def cache_path_for(csv_path: Path) -> Path:
+    return csv_path.with_name(csv_path.name + CACHE_SUFFIX)
+
+
+def file_digest(path: Path) -> str:
+    digest = hashlib.blake2b(digest_size=16)
+    with path.open("rb") as fh:
+        for chunk in iter(lambda: fh.read(_HASH_CHUNK_BYTES), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _strip_values(series: pd.Series) -> pd.Series:
+    # Es fa strip() nomes sobre els valors unics i es reconstrueix amb els codis,
+    # en lloc de recorrer milions de cadenes una a una.
+    codes, uniques = pd.factorize(series, use_na_sentinel=True)
+    stripped = pd.Index(uniques).astype(str).str.strip().to_numpy(dtype=object)
+    values = stripped[codes] if len(stripped) else np.empty(len(codes), dtype=object)
+    values[codes < 0] = np.nan
+    return pd.Series(values, index=series.index, name=series.name)
+
+
+def _as_category(series: pd.Series) -> pd.Series:
+    codes, uniques = pd.factorize(_strip_values(series), sort=True, use_na_sentinel=True)
+    cat = pd.Categorical.from_codes(codes, categories=pd.Index(uniques, dtype=object))
+    return pd.Series(cat, index=series.index, name=series.name)
+
+
+def categorize(df: pd.DataFrame) -> pd.DataFrame:
+    """Torna a convertir en categories les columnes de CATEGORICAL_COLUMNS (p. ex. despres d'un concat)."""
+    for col in CATEGORICAL_COLUMNS:
+        if col in df.columns and not isinstance(df[col].dtype, pd.CategoricalDtype):
+            df[col] = _as_category(df[col])
+        elif col in df.columns:
+            df[col] = df[col].cat.remove_unused_categories()
+    return df
+
+
+def _is_text(series: pd.Series) -> bool:
+    return pd.api.types.is_object_dtype(series) or pd.api.types.is_string_dtype(series)
+
+
+def parse_csv(csv_path: Path) -> pd.DataFrame:
+    # utf-8-sig: Out-File -Encoding UTF8 (run_windows.ps1) escriu BOM
+    df = pd.read_csv(csv_path, skipinitialspace=True, encoding="utf-8-sig")
+    return clean_frame(df)
+
+
+def clean_frame(df: pd.DataFrame) -> pd.DataFrame:
+    """Neteja i tipus de parse_csv sobre un frame llegit del CSV (tambe un tros)."""
+    df.columns = [col.strip() for col in df.columns]
+
+    for col in df.columns:
+        if col in CATEGORICAL_COLUMNS:
+            df[col] = _as_category(df[col])
+        elif _is_text(df[col]):
+            df[col] = _strip_values(df[col])
+
+    for col in INTEGER_COLUMNS:
+        if col in df.columns:
+            values = pd.to_numeric(df[col], errors="coerce")
+            df[col] = values.astype("Int64") if values.isna().any() else values.astype("int64")
+
+    if {"cpu_user_ms", "cpu_sys_ms"}.issubset(df.columns):
+        df["cpu_total_ms"] = pd.to_numeric(df["cpu_user_ms"], errors="coerce") + pd.to_numeric(
+            df["cpu_sys_ms"], errors="coerce"
+        )
+
+    for col in METRIC_COLUMNS:
+        if col in df.columns:
+            df[col] = pd.to_numeric(df[col], errors="coerce").astype(METRIC_DTYPE)
+
+    return df
+
+
+def metric_float64(values: pd.Series) -> pd.Series:
+    """Metrica float32 (METRIC_DTYPE) a float64 amb el valor decimal del CSV.
+
+    Un cast directe arrossega l'error de float32 (4.73 -> 4.7300004959). Es pren el
+    decimal mes curt, de 7 a 9 xifres significatives, que torna al mateix float32: el
+    del CSV, que es va escriure amb menys xifres de les que float32 conserva.
+    """
+    if values.dtype != METRIC_DTYPE:
+        return values.astype("float64")
+    stored = values.to_numpy()
+    wide = stored.astype(np.float64)
+    out = np.full(len(wide), np.nan)
+    pending = np.isfinite(wide)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        magnitude = np.floor(np.log10(np.abs(np.where(wide == 0, 1.0, wide))))
+    for digits in (7, 8, 9):
+        scale = 10.0 ** (digits - 1 - magnitude[pending])
+        rounded = np.round(wide[pending] * scale) / scale
+        exact = rounded.astype(METRIC_DTYPE) == stored[pending]
+        idx = np.flatnonzero(pending)[exact]
+        out[idx] = rounded[exact]
+        pending[idx] = False
+    # Infinits i el que no torni amb 9 xifres: el cast directe
+    out[pending | ~np.isfinite(wide)] = wide[pending | ~np.isfinite(wide)]
+    return pd.Series(out, index=values.index, name=values.name)
+
+
+def _typing_digest() -> str:
+    # Qualsevol canvi en la tipificacio de columnes invalida les caches ja desades
+    tables = (CATEGORICAL_COLUMNS, INTEGER_COLUMNS, METRIC_COLUMNS, (METRIC_DTYPE,))
+    text = "\n".join(",".join(table) for table in tables)
+    return hashlib.blake2b(text.encode(), digest_size=8).hexdigest()
+
+
+def _source_key(csv_path: Path, digest: Optional[str] = None) -> Dict[str, str]:
+    st = csv_path.stat()
+    key = {
+        "version": CACHE_VERSION,
+        "typing": _typing_digest(),
+        "size": str(st.st_size),
+        "mtime_ns": str(st.st_mtime_ns),
+    }
+    if digest is not None:
+        key["blake2b"] = digest
+    return key
+
+
+def _read_cache_key(cache_path: Path) -> Dict[str, str]:
+    with pa.memory_map(str(cache_path), "r") as source:
+        schema = pa.ipc.open_file(source).schema
+    meta = schema.metadata or {}
+    return {
+        k.decode()[len("source."):]: v.decode()
+        for k, v in meta.items()
+        if k.decode().startswith("source.")
+    }
+
+
+def _cache_status(csv_path: Path, cache_path: Path) -> str:
+    """Retorna "fresh", "touched" (mateix contingut, mtime diferent) o "stale"."""
+    try:
+        stored = _read_cache_key(cache_path)
+    except (OSError, pa.ArrowInvalid):
+        return "stale"
+
+    current = _source_key(csv_path)
+    if any(stored.get(k) != current[k] for k in ("version", "typing", "size")):
+        return "stale"
+    if stored.get("mtime_ns") == current["mtime_ns"]:
+        return "fresh"
+    # mtime diferent (p. ex. copia o touch): nomes es reaprofita si el contingut es identic
+    return "touched" if stored.get("blake2b") == file_digest(csv_path) else "stale"
+
+
+def _write_cache(df: pd.DataFrame, csv_path: Path, cache_path: Path) -> None:
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    key = _source_key(csv_path, file_digest(csv_path))
+    meta = dict(table.schema.metadata or {})
+    meta.update({f"source.{k}".encode(): v.encode() for k, v in key.items()})
+    table = table.replace_schema_metadata(meta)
+
+    tmp_path = cache_path.with_name(cache_path.name + ".tmp")
+    # Sense compressio perque es pugui fer memory-map directament
+    feather.write_feather(table, str(tmp_path), compression="uncompressed")
+    tmp_path.replace(cache_path)
+
+
+def _try_write_cache(df: pd.DataFrame, csv_path: Path, cache_path: Path) -> bool:
+    try:
+        _write_cache(df, csv_path, cache_path)
+    except (OSError, pa.ArrowException) as exc:
+        print(f"[warn] No s'ha pogut desar la cache {cache_path}: {exc}")
+        return False
+    return True
+
+
+def load_dataframe(
+    csv_path: Path,
+    use_cache: bool = True,
+    oses: Optional[Sequence[str]] = None,
+    algs: Optional[Sequence[str]] = None,
+) -> pd.DataFrame:
+    """Carrega un CSV de resultats o, si `csv_path` es una carpeta, el magatzem Parquet.
+
+    `oses` i `algs` nomes s'apliquen al magatzem: es llegeixen nomes aquestes particions.
+    """
+    csv_path = Path(csv_path)
+    if csv_path.is_dir():
+        from utils_python.common.store import read_store
+
+        return read_store(csv_path, oses, algs)
+    if not use_cache or feather is None:
+        return parse_csv(csv_path)
+
+    cache_path = cache_path_for(csv_path)
+    status = _cache_status(csv_path, cache_path) if cache_path.exists() else "stale"
+    if status != "stale":
+        df = feather.read_table(str(cache_path), memory_map=True).to_pandas()
+        print(f"[cache] {cache_path}")
+        if status == "touched":
+            _try_write_cache(df, csv_path, cache_path)
+        return df
+
+    df = parse_csv(csv_path)
+    if _try_write_cache(df, csv_path, cache_path):
+        print(f"[cache] desat {cache_path}")
+    return df
@@ -0,0 +1,127 @@
+from __future__ import annotations
+
+import hashlib
+import json
+from pathlib import Path
+from typing import Any, Dict, Mapping, Optional
+
+import numpy as np
+import pandas as pd
+
+MANIFEST_NAME = "manifest.json"
+MANIFEST_VERSION = 1
+
+
+def _update_digest(digest: "hashlib.blake2b", part: Any) -> None:
+    if isinstance(part, pd.DataFrame):
+        digest.update(repr([(str(c), str(t)) for c, t in part.dtypes.items()]).encode())
+        digest.update(pd.util.hash_pandas_object(part, index=False).to_numpy().tobytes())
+    elif isinstance(part, pd.Series):
+        _update_digest(digest, part.to_frame())
+    elif isinstance(part, np.ndarray):
+        digest.update(str(part.dtype).encode())
+        digest.update(np.ascontiguousarray(part).tobytes())
+    else:
+        digest.update(json.dumps(part, sort_keys=True, default=str).encode())
+    digest.update(b"\x1f")
+
+
+def data_digest(*parts: Any) -> str:
+    """Hash estable d'una o mes porcions de dades (DataFrame, Series, arrays o escalars)."""
+    digest = hashlib.blake2b(digest_size=16)
+    for part in parts:
+        _update_digest(digest, part)
+    return digest.hexdigest()
+
+
+def source_digest(path: str | Path) -> str:
+    return hashlib.blake2b(Path(path).read_bytes(), digest_size=16).hexdigest()
+
+
+class OutputManifest:
+    """Registre de les sortides d'una carpeta i del hash de les dades que les han generat.
+
+    `stale()` diu si cal regenerar una sortida; `done()` la marca com a feta i
+    `save()` desa `manifest.json`. Desactivat, sempre regenera i no escriu res.
+
+    Amb `data_key` (p. ex. la `data_version` de la base de dades) les dades no es
+    hashegen: `stale()` fa servir la clau en lloc dels DataFrame, Series i arrays que
+    rep, i `up_to_date()` diu sense llegir cap fila si totes les sortides son al dia.
+    """
+
+    def __init__(
+        self,
+        output_dir: Optional[Path],
+        params: Optional[Mapping[str, Any]] = None,
+        enabled: bool = True,
+        data_key: Optional[str] = None,
+    ) -> None:
+        self.output_dir = output_dir
+        self.enabled = enabled and output_dir is not None
+        self.params_digest = data_digest(dict(params or {}))
+        self.data_key = data_key
+        self.entries: Dict[str, str] = {}
+        self.pending: Dict[str, str] = {}
+        self.skipped = 0
+        self.saved_key: Optional[str] = None
+        if self.enabled:
+            self.entries = self._load()
+
+    @property
+    def path(self) -> Path:
+        return self.output_dir / MANIFEST_NAME
+
+    def _load(self) -> Dict[str, str]:
+        if not self.path.exists():
+            return {}
+        try:
+            data = json.loads(self.path.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            print(f"[warn] Manifest il·legible, es regenera tot: {self.path}")
+            return {}
+        if data.get("version") != MANIFEST_VERSION:
+            return {}
+        self.saved_key = data.get("data_key")
+        return dict(data.get("outputs", {}))
+
+    def up_to_date(self) -> bool:
+        """Cert si hi ha sortides de la mateixa `data_key` i parametres, i totes existeixen."""
+        return (
+            self.enabled
+            and self.data_key is not None
+            and self.saved_key == data_digest(self.params_digest, self.data_key)
+            and bool(self.entries)
+            and all((self.output_dir / name).exists() for name in self.entries)
+        )
+
+    def stale(self, name: str, *inputs: Any) -> bool:
+        if not self.enabled:
+            return True
+        if self.data_key is not None:
+            frames = (pd.DataFrame, pd.Series, np.ndarray)
+            inputs = (self.data_key, *(part for part in inputs if not isinstance(part, frames)))
+        digest = data_digest(self.params_digest, *inputs)
+        if self.entries.get(name) == digest and (self.output_dir / name).exists():
+            self.skipped += 1
+            return False
+        self.pending[name] = digest
+        return True
+
+    def done(self, name: str) -> None:
+        if name in self.pending:
+            self.entries[name] = self.pending.pop(name)
+
+    def save(self) -> None:
+        if not self.enabled:
+            return
+        payload = {"version": MANIFEST_VERSION, "outputs": dict(sorted(self.entries.items()))}
+        if self.data_key is not None:
+            payload["data_key"] = data_digest(self.params_digest, self.data_key)
+        self.output_dir.mkdir(parents=True, exist_ok=True)
+        self.path.write_text(json.dumps(payload, indent=2) + "\n", encoding="utf-8")
+        if self.skipped:
+            print(f"[skip] {self.skipped} sortides sense canvis a {self.output_dir}")
+
+
+# Manifest desactivat: valor per defecte quan una funcio s'usa sense cache de sortides
+ALWAYS_REGENERATE = OutputManifest(None, enabled=False)
@@ -0,0 +1,174 @@
+from __future__ import annotations
+
+from pathlib import Path
+from typing import Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+from utils_python.common.pairing import PAIR_KEYS
+
+# Criteri de la seccio 8 del manual: |x - mediana| > 3 x MAD dins de cada (os, alg, n)
+OUTLIER_KEYS = ("os", "alg", "n")
+# Amb un escombrat de fils (config.json `threads`) cada nombre de fils es un grup a part. Es
+# distingeixen pel pair_id (<alg>_<n>_t<T>) i no per la columna threads, que als CSV antics
+# guarda els threads hardware
+OPTIONAL_OUTLIER_KEYS = ("pair_id",)
+OUTLIER_METHODS = ("mad", "iqr", "both")
+DEFAULT_COLUMN = "wall_ms"
+MAD_THRESHOLD = 3.0
+IQR_FACTOR = 1.5
+REPORT_NAME = "outliers_exclosos.csv"
+# Columnes que calen per detectar outliers i treure parelles senceres (p. ex. per llegir de --db)
+OUTLIER_COLUMNS = tuple(
+    dict.fromkeys(
+        (*OUTLIER_KEYS, *OPTIONAL_OUTLIER_KEYS, *PAIR_KEYS, "run_order", "run_id", "iter", DEFAULT_COLUMN)
+    )
+)
+# Columnes identificadores que es copien a l'informe d'exclusio si hi son
+_REPORT_ID_COLUMNS = ("os", "alg", "n", "threads", "pair_id", "seed", "run_order", "run_id", "abba_leg", "iter")
+
+
+def outlier_scores(
+    df: pd.DataFrame, column: str = DEFAULT_COLUMN, keys: Sequence[str] = OUTLIER_KEYS
+) -> pd.DataFrame:
+    """Mediana, MAD i tanques IQR del grup de cada fila, en un sol groupby sobre codis enters.
+
+    `mad_z` es la distancia a la mediana en unitats de MAD; amb MAD = 0 (grup amb
+    valors repetits) queda NaN i la fila no es marca.
+    """
+    # Un sol pas per numerar els grups (0..k-1); els agregats per grup es reparteixen
+    # a les files indexant amb els codis, sense tornar a agrupar per cada estadistic
+    codes = df.groupby(list(keys), sort=False, observed=True, dropna=False).ngroup().to_numpy()
+    values = df[column].to_numpy(dtype=np.float64)
+    grouped = pd.Series(values).groupby(codes)
+    median = grouped.median().to_numpy()[codes]
+    deviation = np.abs(values - median)
+    mad = pd.Series(deviation).groupby(codes).median().to_numpy()[codes]
+    quartiles = grouped.quantile([0.25, 0.75]).unstack()
+    q1 = quartiles[0.25].to_numpy()[codes]
+    q3 = quartiles[0.75].to_numpy()[codes]
+    iqr = q3 - q1
+    with np.errstate(divide="ignore", invalid="ignore"):
+        mad_z = (values - median) / np.where(mad > 0, mad, np.nan)
+    return pd.DataFrame(
+        {
+            "median": median,
+            "mad": mad,
+            "mad_z": mad_z,
+            "iqr_low": q1 - IQR_FACTOR * iqr,
+            "iqr_high": q3 + IQR_FACTOR * iqr,
+        },
+        index=df.index,
+    )
+
+
+def flag_outliers(scores: pd.DataFrame, values: pd.Series, method: str) -> np.ndarray:
+    if method not in OUTLIER_METHODS:
+        raise ValueError(f"Metode d'outliers desconegut: {method}")
+    values = values.to_numpy(dtype=np.float64)
+    by_mad = np.abs(scores["mad_z"].to_numpy()) > MAD_THRESHOLD
+    by_iqr = (values < scores["iqr_low"].to_numpy()) | (values > scores["iqr_high"].to_numpy())
+    if method == "mad":
+        return by_mad
+    if method == "iqr":
+        return by_iqr
+    return by_mad | by_iqr
+
+
+def exclude_outliers(
+    df: pd.DataFrame, method: str, column: str = DEFAULT_COLUMN
+) -> Tuple[pd.DataFrame, pd.DataFrame]:
+    """Treu els outliers de `column` i tota la parella ABBA (PAIR_KEYS) on n'hi hagi algun.
+
+    Torna el frame net i l'informe amb les files excloses (`motiu` = outlier o parella).
+    Sense les columnes de PAIR_KEYS nomes es treuen les files marcades.
+    """
+    keys = (*OUTLIER_KEYS, *(key for key in OPTIONAL_OUTLIER_KEYS if key in df.columns))
+    scores = outlier_scores(df, column, keys)
+    flagged = flag_outliers(scores, df[column], method)
+
+    if all(key in df.columns for key in PAIR_KEYS):
+        # Files amb alguna clau buida queden amb -1 i nomes s'exclouen si son outlier
+        pair = df.groupby(list(PAIR_KEYS), sort=False, observed=True).ngroup().to_numpy()
+        bad_pair = np.zeros(pair.max(initial=-1) + 2, dtype=bool)
+        bad_pair[pair[flagged]] = True
+        bad_pair[-1] = False
+        excluded = bad_pair[pair] | flagged
+    else:
+        print(f"[warn] Falten columnes {list(PAIR_KEYS)}: nomes s'exclouen les files outlier")
+        excluded = flagged
+
+    ids = [col for col in _REPORT_ID_COLUMNS if col in df.columns and df[col].notna().any()]
+    report = pd.concat([df.loc[excluded, [*ids, column]], scores.loc[excluded]], axis=1)
+    report["motiu"] = np.where(flagged[excluded], "outlier", "parella")
+    return df.loc[~excluded], report.reset_index(drop=True)
+
+
+def excluded_pairs(report: pd.DataFrame) -> pd.DataFrame:
+    if not all(key in report.columns for key in PAIR_KEYS):
+        return pd.DataFrame(columns=list(PAIR_KEYS))
+    return report[list(PAIR_KEYS)].drop_duplicates()
+
+
+def drop_pairs(frame: pd.DataFrame, report: pd.DataFrame) -> pd.DataFrame:
+    """Treu d'un frame (p. ex. l'aparellat de --db) les parelles que apareixen a l'informe."""
+    keys = [key for key in PAIR_KEYS if key in frame.columns]
+    pairs = excluded_pairs(report)
+    if pairs.empty or len(keys) < len(PAIR_KEYS):
+        return frame
+    # Anti-join amb claus normalitzades a text (categories i tipus poden diferir)
+    frame_key = pd.MultiIndex.from_frame(frame[keys].astype(str))
+    pair_key = pd.MultiIndex.from_frame(pairs[keys].astype(str))
+    return frame.loc[~frame_key.isin(pair_key)]
+
+
+def apply_outlier_stage(
+    df: pd.DataFrame,
+    method: Optional[str],
+    output_dir: Optional[Path] = None,
+    column: str = DEFAULT_COLUMN,
+    report_name: str = REPORT_NAME,
+) -> Tuple[pd.DataFrame, pd.DataFrame]:
+    """Etapa de preprocessat comuna a totes les eines (`--outliers mad|iqr|both`).
+
+    Sense `method` no fa res. Amb `output_dir` desa l'informe d'exclusio.
+    """
+    if not method or df.empty:
+        return df, pd.DataFrame()
+    if column not in df.columns:
+        print(f"[warn] Falta la columna {column}: no es detecten outliers")
+        return df, pd.DataFrame()
+
+    clean, report = exclude_outliers(df, method, column)
+    n_outliers = int((report["motiu"] == "outlier").sum())
+    print(
+        f"[outliers] {method}: {n_outliers} outliers de {column}, "
+        f"{len(report)} files excloses de {len(df)} ({len(excluded_pairs(report))} parelles)"
+    )
+    if output_dir is not None:
+        output_dir.mkdir(parents=True, exist_ok=True)
+        path = output_dir / report_name
+        report.to_csv(path, index=False)
+        print(f"[save] {path}")
+    return clean, report
+
+
+def read_db_paired(
+    conn,
+    columns: Optional[Sequence[str]],
+    method: Optional[str],
+    output_dir: Optional[Path] = None,
+    algs: Optional[Sequence[str]] = None,
+) -> pd.DataFrame:
+    """paired_runs d'un fil de --db; amb `method` es detecten els outliers a la taula runs i se'n
+    treuen les parelles."""
+    from utils_python.common import database
+
+    if not method:
+        return database.read_paired(conn, columns, algs, single_thread=True)
+    select = list(dict.fromkeys((*columns, *PAIR_KEYS))) if columns else None
+    paired = database.read_paired(conn, select, algs, single_thread=True)
+    _, report = apply_outlier_stage(database.read_runs(conn, OUTLIER_COLUMNS, algs), method, output_dir)
+    paired = drop_pairs(paired, report)
+    return paired[list(columns)] if columns else paired
@@ -0,0 +1,219 @@
+from __future__ import annotations
+
+from typing import Iterable, List, Sequence
+
+import numpy as np
+import pandas as pd
+
+from utils_python.common.loader import metric_float64
+
+PAIR_KEYS = ("pair_id", "alg", "n", "seed")
+LINUX_ABBA_LEGS = {1: "A", 4: "B"}
+WINDOWS_ABBA_LEGS = {2: "A", 3: "B"}
+
+# Metriques que s'aparellen per defecte (totes les que hi hagi al CSV)
+PAIRED_METRICS = (
+    "wall_ms",
+    "cpu_user_ms",
+    "cpu_sys_ms",
+    "cpu_total_ms",
+    "cpu_pct_avg",
+    "rss_peak_mib",
+)
+
+# Noms historics de les diferencies: (metrica, "log" o "abs") -> columna
+NAMED_DIFFERENCES = {
+    ("wall_ms", "log"): "Dlog",
+    ("cpu_pct_avg", "abs"): "Dcpu",
+    ("rss_peak_mib", "abs"): "Drss",
+}
+
+
+def has_columns(df: pd.DataFrame, required: Iterable[str]) -> bool:
+    missing = [col for col in required if col not in df.columns]
+    if missing:
+        print(f"[error] Falten columnes al CSV: {missing}")
+        return False
+    return True
+
+
+def difference_column(metric: str, kind: str) -> str:
+    default = f"{metric}_diff" if kind == "abs" else f"{metric}_dlog"
+    return NAMED_DIFFERENCES.get((metric, kind), default)
+
+
+def worker_threads(df: pd.DataFrame) -> pd.Series:
+    """Fils de treball de cada fila: la columna `workers` que escriu l'orquestrador.
+
+    Les files d'abans que existis (buides o sense la columna) es resolen pel pair_id,
+    `<alg>_<n>_t<T>` -> T i `<alg>_<n>` -> 1, el format de orchestrator.pair_id. La
+    columna `threads` no serveix: els CSV antics hi guardaven els threads hardware,
+    amb binaris d'un sol fil.
+    """
+    if "workers" in df.columns and df["workers"].notna().all():
+        return df["workers"].astype("int64")
+    fallback = _pair_id_workers(df)
+    if "workers" not in df.columns:
+        return fallback
+    return df["workers"].astype("Float64").fillna(fallback).astype("int64")
+
+
+def _pair_id_workers(df: pd.DataFrame) -> pd.Series:
+    keys = ["pair_id", "alg", "n"]
+    if not set(keys).issubset(df.columns):
+        print(f"[warn] Sense `workers` ni {keys}: es suposa que totes les execucions son d'un fil")
+        return pd.Series(1, index=df.index, dtype="int64")
+    # Nomes es parseja cada combinacio diferent, no cada fila
+    combos = df[keys].drop_duplicates()
+    workers = []
+    for pair_id, alg, n in combos.itertuples(index=False, name=None):
+        suffix = str(pair_id)[len(f"{alg}_{n}") :] if str(pair_id).startswith(f"{alg}_{n}") else ""
+        workers.append(int(suffix[2:]) if suffix.startswith("_t") and suffix[2:].isdigit() else 1)
+    mapping = combos.assign(workers=np.asarray(workers, dtype=np.int64))
+    merged = df[keys].merge(mapping, on=keys, how="left")
+    return pd.Series(merged["workers"].to_numpy(), index=df.index, dtype="int64")
+
+
+def single_thread(df: pd.DataFrame) -> pd.DataFrame:
+    """Nomes les execucions d'un fil de treball: amb un escombrat de `threads`, totes les
+    analisis excepte la de speedup es fan sobre aquestes (com les campanyes d'abans)."""
+    workers = worker_threads(df)
+    if (workers == 1).all():
+        return df
+    return df.loc[(workers == 1).to_numpy()].reset_index(drop=True)
+
+
+def maybe_add_abba_leg(df: pd.DataFrame, linux_label: str, windows_label: str) -> pd.DataFrame:
+    if "run_order" not in df.columns or "abba_leg" in df.columns:
+        return df
+
+    df = df.copy()
+    df["abba_leg"] = None
+
+    is_linux = df["os"] == linux_label
+    is_windows = df["os"] == windows_label
+
+    df.loc[is_linux, "abba_leg"] = df.loc[is_linux, "run_order"].map(LINUX_ABBA_LEGS)
+    df.loc[is_windows, "abba_leg"] = df.loc[is_windows, "run_order"].map(WINDOWS_ABBA_LEGS)
+    return df
+
+
+def collapse_iterations(df: pd.DataFrame, metrics: Sequence[str]) -> pd.DataFrame:
+    """Redueix les iteracions internes (`iter`) d'una execucio a la seva mediana.
+
+    Les iteracions d'un mateix proces no son independents: per aparellar Linux i
+    Windows es fa servir una observacio per execucio, com en el mode d'un proces
+    per mesura. Les files sense `iter` (CSV antics) no es toquen.
+    """
+    if "iter" not in df.columns or not df["iter"].notna().any():
+        return df
+    run_keys = [
+        col
+        for col in ("os", *PAIR_KEYS, "workers", "run_order", "run_id", "abba_leg")
+        if col in df.columns
+    ]
+    return (
+        df.groupby(run_keys, sort=False, observed=True, dropna=False)[list(metrics)]
+        .median()
+        .reset_index()
+    )
+
+
+def _log_diff(lin: pd.Series, win: pd.Series) -> pd.Series:
+    # log(0) no te sentit (p. ex. cpu_sys_ms = 0 a Windows): es deixa NaN
+    return np.log(lin.where(lin > 0)) - np.log(win.where(win > 0))
+
+
+def add_differences(merged: pd.DataFrame, metrics: Sequence[str]) -> pd.DataFrame:
+    diffs = {}
+    for metric in metrics:
+        # Les metriques es guarden en float32; les diferencies (i tot el que en surt) es
+        # calculen en float64 sobre el valor del CSV, perque -0.287 no surti com -0.28700003
+        lin = metric_float64(merged[f"{metric}_lin"])
+        win = metric_float64(merged[f"{metric}_win"])
+        diffs[difference_column(metric, "abs")] = lin - win
+        diffs[difference_column(metric, "log")] = _log_diff(lin, win)
+    return pd.concat([merged, pd.DataFrame(diffs, index=merged.index)], axis=1)
+
+
+def join_dense(key_left: np.ndarray, key_right: np.ndarray, n_keys: int):
+    # Les claus son enters densos (0..n_keys-1) i unics a cada banda: el join es una
+    # taula d'adreçament directe, O(files) i sense ordenar. Es conserva l'ordre de
+    # les files de l'esquerra, com feia el merge inner.
+    pos_right = np.full(n_keys, -1, dtype=np.int64)
+    pos_right[key_right] = np.arange(len(key_right))
+    idx_right = pos_right[key_left]
+    idx_left = np.flatnonzero(idx_right >= 0)
+    return idx_left, idx_right[idx_left]
+
+
+def prepare_paired_df(
+    df: pd.DataFrame,
+    linux_label: str,
+    windows_label: str,
+    metrics: Sequence[str] | None = None,
+) -> pd.DataFrame:
+    """Aparella Linux/Windows en un sol join i torna un frame ample.
+
+    Per cada metrica hi ha `<m>_lin`, `<m>_win`, la diferencia absoluta i la
+    logaritmica (`Dlog`, `Dcpu` i `Drss` conserven el nom historic). Si no
+    s'indiquen `metrics`, s'aparellen totes les de PAIRED_METRICS presents.
+    """
+    if metrics is None:
+        metrics = [m for m in PAIRED_METRICS if m in df.columns]
+        if not metrics:
+            print(f"[error] Falten columnes al CSV: cap de {list(PAIRED_METRICS)}")
+            return pd.DataFrame()
+    metrics = list(metrics)
+
+    required_cols = (*PAIR_KEYS, "os", *metrics)
+    if not has_columns(df, required_cols):
+        return pd.DataFrame()
+
+    df = maybe_add_abba_leg(df, linux_label, windows_label)
+    df = collapse_iterations(df, metrics)
+
+    merge_keys: List[str] = list(PAIR_KEYS)
+    if "abba_leg" in df.columns:
+        merge_keys.append("abba_leg")
+
+    is_linux = (df["os"] == linux_label).to_numpy()
+    is_windows = (df["os"] == windows_label).to_numpy()
+    keep = is_linux | is_windows
+    if "abba_leg" in merge_keys:
+        keep &= df["abba_leg"].notna().to_numpy()
+
+    # workers (constant dins de cada pair_id) viatja amb la banda de Linux
+    carried = ["workers"] if "workers" in df.columns else []
+    sub = df.loc[keep, [*merge_keys, *carried, *metrics]]
+    # Clau entera densa compartida per les dues bandes (un sol pas per tot el frame)
+    grouped = sub.groupby(merge_keys, sort=False, observed=True, dropna=False)
+    key = grouped.ngroup().to_numpy()
+    n_keys = grouped.ngroups
+    sub_linux = is_linux[keep]
+
+    lin = sub[sub_linux].rename(columns={m: f"{m}_lin" for m in metrics})
+    win = sub[~sub_linux][metrics].rename(columns={m: f"{m}_win" for m in metrics})
+    key_lin, key_win = key[sub_linux], key[~sub_linux]
+
+    unique_keys = (
+        np.bincount(key_lin, minlength=n_keys).max(initial=0) <= 1
+        and np.bincount(key_win, minlength=n_keys).max(initial=0) <= 1
+    )
+    if unique_keys:
+        idx_lin, idx_win = join_dense(key_lin, key_win, n_keys)
+        merged = pd.concat(
+            [lin.iloc[idx_lin].reset_index(drop=True), win.iloc[idx_win].reset_index(drop=True)],
+            axis=1,
+        )
+    else:
+        # Claus repetides (p. ex. sense run_order): es manté el merge many-to-many de pandas
+        lin = lin.assign(_key=key_lin)
+        win = win.assign(_key=key_win)
+        merged = lin.merge(win, on="_key").drop(columns="_key")
+
+    if merged.empty:
+        print("[warn] No s'ha trobat cap parell Linux/Windows amb els criteris indicats.")
+        return merged
+
+    return add_differences(merged, metrics)
@@ -0,0 +1,44 @@
+from __future__ import annotations
+
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Callable, Dict, Sequence, Tuple
+
+import matplotlib
+
+FigureTask = Tuple[Callable[..., Any], Tuple[Any, ...]]
+
+
+def default_jobs() -> int:
+    return os.cpu_count() or 1
+
+
+def _init_worker(rc_params: Dict[str, Any]) -> None:
+    matplotlib.use("Agg", force=True)
+    matplotlib.rcParams.update(rc_params)
+
+
+def _current_rc_params() -> Dict[str, Any]:
+    # El backend el fixa el worker; la resta (mida, dpi, tema de seaborn...) es copia
+    # perque les figures surtin identiques a les del cami serie.
+    return {k: v for k, v in matplotlib.rcParams.items() if k != "backend"}
+
+
+def run_figure_tasks(tasks: Sequence[FigureTask], jobs: int = 1) -> None:
+    """Executa `func(*args)` per cada tasca, en serie o en un pool de processos.
+
+    Les funcions han de ser de nivell de modul (picklables) i rebre nomes la
+    porcio de dades que necessiten.
+    """
+    if jobs <= 1 or len(tasks) <= 1:
+        for func, args in tasks:
+            func(*args)
+        return
+
+    workers = min(jobs, len(tasks))
+    with ProcessPoolExecutor(
+        max_workers=workers, initializer=_init_worker, initargs=(_current_rc_params(),)
+    ) as pool:
+        futures = [pool.submit(func, *args) for func, args in tasks]
+        for future in futures:
+            future.result()
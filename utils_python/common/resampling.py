@@ -0,0 +1,183 @@
+from __future__ import annotations
+
+import zlib
+from concurrent.futures import ProcessPoolExecutor
+from typing import Callable, Dict, Mapping, Tuple
+
+import numpy as np
+import pandas as pd
+from scipy.stats import norm
+
+DEFAULT_RESAMPLES = 10_000
+DEFAULT_SEED = 20240601
+# Amb com a molt MAX_SUPPORT valors diferents, cada remostra es un vector de recomptes
+# sobre els valors unics (cost B x K, no B x n). Es exacte: no s'agrupa cap valor
+MAX_SUPPORT = 256
+# Per sobre de LARGE_GROUP valors el cost no pot creixer amb remostres x n: el bootstrap
+# es fa sobre LARGE_BINS intervals de quantils (amb la variancia de dins de cada interval)
+# i el test de canvi de signe amb la seva aproximacio normal
+LARGE_GROUP = 4096
+LARGE_BINS = 256
+# Cel·les (remostres x suport) per bloc: acota la memoria de la matriu de remostres
+BLOCK_CELLS = 1 << 22
+
+
+def group_rng(seed: int, label: str) -> np.random.Generator:
+    # Flux propi per grup: el resultat no depen de l'ordre ni del nombre de processos
+    return np.random.default_rng([seed, zlib.crc32(label.encode("utf-8"))])
+
+
+def _block_size(width: int, total: int) -> int:
+    return max(1, min(total, BLOCK_CELLS // max(width, 1)))
+
+
+def bootstrap_means(values: np.ndarray, resamples: int, rng: np.random.Generator) -> np.ndarray:
+    """Mitjanes de `resamples` remostres bootstrap, generades per blocs matricials.
+
+    Amb pocs valors unics, recomptes multinomials sobre aquests valors (exacte). Amb mes
+    de LARGE_GROUP valors, recomptes multinomials sobre intervals de quantils mes la part
+    de dins de cada interval (vegeu _binned_means). Si no, indexos remostrats per blocs.
+    """
+    n = len(values)
+    out = np.empty(resamples)
+    support, counts = np.unique(values, return_counts=True)
+    if n > MAX_SUPPORT and len(support) <= MAX_SUPPORT:
+        probs = counts / n
+        step = _block_size(len(support), resamples)
+        for start in range(0, resamples, step):
+            stop = min(start + step, resamples)
+            draws = rng.multinomial(n, probs, size=stop - start)
+            out[start:stop] = draws @ support / n
+        return out
+    if n > LARGE_GROUP:
+        return _binned_means(values, resamples, rng)
+
+    step = _block_size(n, resamples)
+    for start in range(0, resamples, step):
+        stop = min(start + step, resamples)
+        idx = rng.integers(0, n, size=(stop - start, n))
+        out[start:stop] = values[idx].mean(axis=1)
+    return out
+
+
+def _binned_means(values: np.ndarray, resamples: int, rng: np.random.Generator) -> np.ndarray:
+    """Bootstrap de la mitjana amb cost remostres x LARGE_BINS, independent de n.
+
+    `values`, ordenats, es parteixen en intervals de quantils d'igual mida, amb el
+    recompte, la mitjana i la variancia de cadascun. Una remostra treu m_k valors de
+    l'interval k (multinomial); la seva suma es m_k * mitjana_k mes una part de dins de
+    l'interval, de mitjana 0 i variancia m_k * var_k, que es pren normal (m_k ~ n/K >= 16).
+    La variancia de la mitjana bootstrap es la mateixa que la del remostreig d'indexos.
+    """
+    n = len(values)
+    bins = np.array_split(np.sort(values), LARGE_BINS)
+    means = np.array([b.mean() for b in bins])
+    variances = np.array([b.var() for b in bins])
+    probs = np.array([len(b) for b in bins]) / n
+    out = np.empty(resamples)
+    step = _block_size(LARGE_BINS, resamples)
+    for start in range(0, resamples, step):
+        stop = min(start + step, resamples)
+        draws = rng.multinomial(n, probs, size=stop - start)
+        within = np.sqrt(draws @ variances) * rng.standard_normal(stop - start)
+        out[start:stop] = (draws @ means + within) / n
+    return out
+
+
+def bca_interval(
+    values: np.ndarray, boot: np.ndarray, level: float = 0.95
+) -> Tuple[float, float]:
+    """Interval BCa de la mitjana a partir de les mitjanes bootstrap `boot`."""
+    n = len(values)
+    mean = float(values.mean())
+    below = np.mean(boot < mean) + 0.5 * np.mean(boot == mean)
+    z0 = norm.ppf(np.clip(below, 1.0 / (len(boot) + 1), 1 - 1.0 / (len(boot) + 1)))
+
+    # Acceleracio pel jackknife; per a la mitjana te forma tancada: theta_(i) = (n*mean - x_i)/(n-1)
+    jack = (n * mean - values) / (n - 1)
+    dev = jack.mean() - jack
+    denom = 6.0 * np.sum(dev**2) ** 1.5
+    accel = float(np.sum(dev**3) / denom) if denom > 0 else 0.0
+
+    z = norm.ppf([(1 - level) / 2, (1 + level) / 2])
+    adjusted = norm.cdf(z0 + (z0 + z) / (1 - accel * (z0 + z)))
+    low, high = np.quantile(boot, adjusted)
+    return float(low), float(high)
+
+
+def signflip_pvalue(values: np.ndarray, resamples: int, rng: np.random.Generator) -> float:
+    """p-valor bilateral del test de permutacio aparellat (canvi de signe) per a mitjana 0.
+
+    Sota H0 les diferencies son simetriques al voltant de 0, de manera que la suma
+    permutada nomes depen de |d|: amb K valors unics de |d|, la suma dels signes dins
+    de cada valor es 2*Binomial(c_k, 1/2) - c_k. Amb mes de LARGE_GROUP valors (i molts
+    valors unics) la suma permutada te mitjana 0 i variancia sum(d^2), i per Lindeberg es
+    practicament normal: el p-valor es el de la normal i no es remostra.
+    """
+    n = len(values)
+    observed = abs(float(values.sum()))
+    exceed = 0
+    support, counts = np.unique(np.abs(values), return_counts=True)
+    if n > LARGE_GROUP and len(support) > MAX_SUPPORT:
+        scale = float(np.sqrt(np.sum(values * values)))
+        return float(2 * norm.sf(observed / scale)) if scale > 0 else 1.0
+    if n > MAX_SUPPORT and len(support) <= MAX_SUPPORT:
+        step = _block_size(len(support), resamples)
+        for start in range(0, resamples, step):
+            stop = min(start + step, resamples)
+            positive = rng.binomial(counts, 0.5, size=(stop - start, len(support)))
+            sums = (2 * positive - counts) @ support
+            exceed += int(np.count_nonzero(np.abs(sums) >= observed * (1 - 1e-12)))
+    else:
+        magnitudes = np.abs(values)
+        step = _block_size(n, resamples)
+        for start in range(0, resamples, step):
+            stop = min(start + step, resamples)
+            signs = rng.integers(0, 2, size=(stop - start, n), dtype=np.int8) * 2 - 1
+            exceed += int(np.count_nonzero(np.abs(signs @ magnitudes) >= observed * (1 - 1e-12)))
+    return (exceed + 1) / (resamples + 1)
+
+
+def resample_stats(
+    values: np.ndarray, resamples: int, seed: int, label: str
+) -> Dict[str, float]:
+    """IC95% BCa de la mitjana i p-valor de permutacio per canvi de signe."""
+    values = np.asarray(values, dtype=np.float64)
+    # Ordenades: el resultat no depen de l'ordre de les files (CSV o magatzem)
+    values = np.sort(values[np.isfinite(values)])
+    if len(values) < 2 or resamples <= 0:
+        return {"bca_ci95_low": np.nan, "bca_ci95_high": np.nan, "perm_p_value": np.nan}
+
+    rng = group_rng(seed, label)
+    low, high = bca_interval(values, bootstrap_means(values, resamples, rng))
+    return {
+        "bca_ci95_low": low,
+        "bca_ci95_high": high,
+        "perm_p_value": signflip_pvalue(values, resamples, rng),
+    }
+
+
+def resample_groups(
+    groups: Mapping[str, np.ndarray], resamples: int, seed: int, jobs: int = 1
+) -> Dict[str, Dict[str, float]]:
+    """`resample_stats` per a cada grup (p. ex. ALL i cada algorisme), opcionalment en paral·lel."""
+    labels = list(groups)
+    if jobs <= 1 or len(labels) <= 1:
+        return {label: resample_stats(groups[label], resamples, seed, label) for label in labels}
+
+    with ProcessPoolExecutor(max_workers=min(jobs, len(labels))) as pool:
+        futures = {
+            label: pool.submit(resample_stats, groups[label], resamples, seed, label)
+            for label in labels
+        }
+        return {label: future.result() for label, future in futures.items()}
+
+
+def groups_by_alg(
+    paired: pd.DataFrame, column: str, label: Callable[[str], str] = str.strip
+) -> Dict[str, np.ndarray]:
+    """Valors de `column` per a ALL i per a cada algorisme, amb les etiquetes de les taules."""
+    groups = {"ALL": paired[column].to_numpy(dtype=np.float64)}
+    for alg, values in paired.groupby("alg", observed=True, sort=False)[column]:
+        groups[label(str(alg))] = values.to_numpy(dtype=np.float64)
+    return groups
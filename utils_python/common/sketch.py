@@ -0,0 +1,200 @@
+from __future__ import annotations
+
+from pathlib import Path
+from typing import Dict, Iterable, List, Mapping, Optional, Sequence, Tuple
+
+import numpy as np
+
+# Centroides per grup ~ DEFAULT_COMPRESSION / 2. Amb menys punts que aixo el sketch
+# es exacte (cada punt es un centroide de pes 1).
+DEFAULT_COMPRESSION = 200
+SKETCH_SUFFIX = ".sketch.npz"
+WHIS = 1.5
+
+
+class QuantileSketch:
+    """t-digest fusionable: centroides (mitjana, pes) ordenats, mes el minim i el maxim exactes.
+
+    Cada `update` (un tros de dades) o `merge` (un altre sketch) torna a comprimir
+    els centroides agrupant-los per la funcio d'escala k1(q) = d/(2 pi) asin(2q - 1):
+    les cues queden amb centroides petits i el centre amb centroides grans.
+    """
+
+    def __init__(self, compression: int = DEFAULT_COMPRESSION) -> None:
+        self.compression = compression
+        self.means = np.empty(0, dtype=np.float64)
+        self.weights = np.empty(0, dtype=np.float64)
+        self.min = np.inf
+        self.max = -np.inf
+
+    @classmethod
+    def from_values(cls, values: Iterable[float], compression: int = DEFAULT_COMPRESSION) -> "QuantileSketch":
+        sketch = cls(compression)
+        sketch.update(values)
+        return sketch
+
+    @property
+    def count(self) -> float:
+        return float(self.weights.sum())
+
+    def update(self, values: Iterable[float]) -> "QuantileSketch":
+        values = np.asarray(values, dtype=np.float64)
+        values = values[np.isfinite(values)]
+        if values.size:
+            self.min = min(self.min, float(values.min()))
+            self.max = max(self.max, float(values.max()))
+            self._compress(
+                np.concatenate([self.means, values]),
+                np.concatenate([self.weights, np.ones(values.size)]),
+            )
+        return self
+
+    def merge(self, other: "QuantileSketch") -> "QuantileSketch":
+        if other.weights.size:
+            self.min = min(self.min, other.min)
+            self.max = max(self.max, other.max)
+            self._compress(
+                np.concatenate([self.means, other.means]),
+                np.concatenate([self.weights, other.weights]),
+            )
+        return self
+
+    def _compress(self, means: np.ndarray, weights: np.ndarray) -> None:
+        order = np.argsort(means, kind="stable")
+        means, weights = means[order], weights[order]
+        total = weights.sum()
+        cum = np.cumsum(weights)
+        q_mid = (cum - weights / 2) / total
+        k = self.compression / (2 * np.pi) * np.arcsin(2 * q_mid - 1)
+        bins = np.floor(k).astype(np.int64)
+        # Els centroides del mateix interval de k es fusionen (mitjana ponderada)
+        starts = np.flatnonzero(np.r_[True, bins[1:] != bins[:-1]])
+        merged_w = np.add.reduceat(weights, starts)
+        self.means = np.add.reduceat(means * weights, starts) / merged_w
+        self.weights = merged_w
+
+    def quantile(self, q: Sequence[float] | float) -> np.ndarray:
+        """Quantils amb la mateixa interpolacio lineal que np.percentile (exacte si no hi ha fusions)."""
+        q = np.atleast_1d(np.asarray(q, dtype=np.float64))
+        if not self.weights.size:
+            return np.full(q.shape, np.nan)
+        total = self.weights.sum()
+        # Posicio (0 .. total-1) del centre de cada centroide
+        centers = np.cumsum(self.weights) - (self.weights + 1) / 2
+        xp, fp = centers, self.means
+        if centers[0] > 0:
+            xp, fp = np.r_[0.0, xp], np.r_[self.min, fp]
+        if centers[-1] < total - 1:
+            xp, fp = np.r_[xp, total - 1], np.r_[fp, self.max]
+        return np.interp(q * (total - 1), xp, fp)
+
+    def to_arrays(self) -> Dict[str, np.ndarray]:
+        return {
+            "centroids": np.column_stack([self.means, self.weights]),
+            "range": np.array([self.min, self.max, self.compression], dtype=np.float64),
+        }
+
+    @classmethod
+    def from_arrays(cls, centroids: np.ndarray, range_: np.ndarray) -> "QuantileSketch":
+        sketch = cls(int(range_[2]))
+        sketch.means = centroids[:, 0].astype(np.float64)
+        sketch.weights = centroids[:, 1].astype(np.float64)
+        sketch.min, sketch.max = float(range_[0]), float(range_[1])
+        return sketch
+
+
+def sketch_path(figure_path: Path) -> Path:
+    return figure_path.with_name(figure_path.stem + SKETCH_SUFFIX)
+
+
+def save_sketches(path: Path, sketches: Mapping[str, QuantileSketch]) -> None:
+    arrays = {}
+    for label, sketch in sketches.items():
+        for field, values in sketch.to_arrays().items():
+            arrays[f"{label}::{field}"] = values
+    np.savez_compressed(path, **arrays)
+
+
+def load_sketches(path: Path) -> Dict[str, QuantileSketch]:
+    with np.load(path) as data:
+        labels = sorted({key.rsplit("::", 1)[0] for key in data.files})
+        return {
+            label: QuantileSketch.from_arrays(data[f"{label}::centroids"], data[f"{label}::range"])
+            for label in labels
+        }
+
+
+def fences(sketch: QuantileSketch, whis: float = WHIS) -> Tuple[float, float]:
+    q1, q3 = sketch.quantile([0.25, 0.75])
+    iqr = q3 - q1
+    return float(q1 - whis * iqr), float(q3 + whis * iqr)
+
+
+class Tails:
+    """Segona passada: extrems dins de les tanques (bigotis) i punts de fora (outliers)."""
+
+    def __init__(self, low: float, high: float) -> None:
+        self.low, self.high = low, high
+        self.whislo = np.inf
+        self.whishi = -np.inf
+        self.fliers: List[np.ndarray] = []
+
+    def update(self, values: Iterable[float]) -> "Tails":
+        values = np.asarray(values, dtype=np.float64)
+        values = values[np.isfinite(values)]
+        inside = (values >= self.low) & (values <= self.high)
+        if inside.any():
+            self.whislo = min(self.whislo, float(values[inside].min()))
+            self.whishi = max(self.whishi, float(values[inside].max()))
+        if not inside.all():
+            self.fliers.append(values[~inside])
+        return self
+
+
+def box_stats(sketch: QuantileSketch, tails: Tails, label: str) -> dict:
+    """Diccionari per a Axes.bxp: quartils del sketch, bigotis i outliers exactes."""
+    q1, med, q3 = sketch.quantile([0.25, 0.5, 0.75])
+    fliers = np.concatenate(tails.fliers) if tails.fliers else np.empty(0)
+    return {
+        "label": label,
+        "q1": q1,
+        "med": med,
+        "q3": q3,
+        "whislo": tails.whislo if np.isfinite(tails.whislo) else q1,
+        "whishi": tails.whishi if np.isfinite(tails.whishi) else q3,
+        "fliers": fliers,
+    }
+
+
+def sketch_groups(
+    groups: Mapping[str, np.ndarray], compression: int = DEFAULT_COMPRESSION
+) -> Tuple[Dict[str, QuantileSketch], List[dict]]:
+    """Sketch i estadistics de boxplot per grup quan les dades ja son a memoria."""
+    sketches: Dict[str, QuantileSketch] = {}
+    stats: List[dict] = []
+    for label, values in groups.items():
+        sketch = QuantileSketch.from_values(values, compression)
+        if not sketch.weights.size:
+            continue
+        tails = Tails(*fences(sketch)).update(values)
+        sketches[label] = sketch
+        stats.append(box_stats(sketch, tails, label))
+    return sketches, stats
+
+
+def draw_boxplot(ax, stats: Sequence[dict], colors: Optional[Sequence] = None) -> None:
+    """Dibuixa els boxplots ja resumits (sense passar totes les dades a matplotlib)."""
+    line = {"color": "0.25"}
+    filled = colors is not None
+    artists = ax.bxp(
+        list(stats),
+        patch_artist=filled,
+        # Amb caixes plenes "color" trepitjaria el color de fons: nomes la vora
+        boxprops={"edgecolor": "0.25"} if filled else line,
+        whiskerprops=line,
+        capprops=line,
+        medianprops=line,
+    )
+    if filled:
+        for box, color in zip(artists["boxes"], colors):
+            box.set_facecolor(color)
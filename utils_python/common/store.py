@@ -0,0 +1,236 @@
+from __future__ import annotations
+
+import json
+import re
+from datetime import datetime
+from pathlib import Path
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # pragma: no cover - depen de l'entorn
+    pa = None
+    pq = None
+
+from utils_python.common.loader import (
+    INTEGER_COLUMNS,
+    categorize,
+    file_digest,
+    parse_csv,
+)
+
+# Esquema que escriuen run_linux.sh, run_windows.ps1 i l'orquestrador (mateix ordre).
+# Les campanyes antigues nomes tenen les columnes obligatories.
+REQUIRED_COLUMNS = (
+    "pair_id",
+    "alg",
+    "n",
+    "seed",
+    "os",
+    "run_order",
+    "run_id",
+    "wall_ms",
+    "cpu_user_ms",
+    "cpu_sys_ms",
+    "cpu_pct_avg",
+    "threads",
+    "rss_peak_mib",
+    "temp_c",
+    "compiler",
+    "flags",
+    "os_name",
+    "kernel",
+    "timestamp",
+)
+OPTIONAL_COLUMNS = (
+    "cpu_core",
+    "cooldown_s",
+    "iter",
+    "cycles",
+    "instructions",
+    "llc_misses",
+    "branch_misses",
+    "context_switches",
+    "page_faults",
+    "workers",
+)
+# Columnes afegides per parse_csv
+DERIVED_COLUMNS = ("cpu_total_ms",)
+
+DEDUP_KEYS = ("os", "pair_id", "seed", "run_id", "timestamp")
+PARTITION_COLUMNS = ("os", "alg")
+LOG_NAME = "_ingested.json"
+
+
+def _partition_value(value: str) -> str:
+    # Noms de carpeta segurs tant a Linux com a Windows
+    return re.sub(r"[^0-9A-Za-z._-]", "_", str(value))
+
+
+def partition_dir(store: Path, os_name: str, alg: str) -> Path:
+    return store / f"os={_partition_value(os_name)}" / f"alg={_partition_value(alg)}"
+
+
+def validate_campaign(df: pd.DataFrame) -> List[str]:
+    """Problemes que impedeixen ingerir una campanya (llista buida si es valida)."""
+    problems: List[str] = []
+    missing = [col for col in REQUIRED_COLUMNS if col not in df.columns]
+    if missing:
+        problems.append(f"falten columnes {missing}")
+    known = set(REQUIRED_COLUMNS) | set(OPTIONAL_COLUMNS) | set(DERIVED_COLUMNS)
+    unknown = [col for col in df.columns if col not in known]
+    if unknown:
+        problems.append(f"columnes desconegudes {unknown}")
+    if missing:
+        return problems
+
+    for col in ("os", "alg", "n", "seed", "run_id", "wall_ms"):
+        empty = int(df[col].isna().sum())
+        if empty:
+            problems.append(f"{empty} files sense {col}")
+    bad_wall = int((df["wall_ms"] <= 0).sum())
+    if bad_wall:
+        problems.append(f"{bad_wall} files amb wall_ms <= 0")
+    return problems
+
+
+def conform(df: pd.DataFrame) -> pd.DataFrame:
+    """Afegeix les columnes opcionals que falten perque tots els fitxers tinguin el mateix esquema."""
+    df = df.copy()
+    for col in OPTIONAL_COLUMNS:
+        if col not in df.columns:
+            df[col] = pd.array([pd.NA] * len(df), dtype="Int64") if col in INTEGER_COLUMNS else np.nan
+        elif col in INTEGER_COLUMNS:
+            df[col] = df[col].astype("Int64")
+    df["cooldown_s"] = pd.to_numeric(df["cooldown_s"], errors="coerce").astype("float64")
+    for col in ("n", "seed"):
+        df[col] = df[col].astype("int64")
+    ordered = [*REQUIRED_COLUMNS, *OPTIONAL_COLUMNS, *DERIVED_COLUMNS]
+    return df[[col for col in ordered if col in df.columns]]
+
+
+def _key_hash(df: pd.DataFrame) -> np.ndarray:
+    keys = df[list(DEDUP_KEYS)].astype(str)
+    return pd.util.hash_pandas_object(keys, index=False).to_numpy()
+
+
+def read_log(store: Path) -> Dict[str, dict]:
+    path = store / LOG_NAME
+    if not path.exists():
+        return {}
+    return json.loads(path.read_text(encoding="utf-8"))
+
+
+def write_log(store: Path, log: Dict[str, dict]) -> None:
+    tmp = store / (LOG_NAME + ".tmp")
+    tmp.write_text(json.dumps(log, indent=2, sort_keys=True), encoding="utf-8")
+    tmp.replace(store / LOG_NAME)
+
+
+def _existing_keys(store: Path, os_name: str, alg: str) -> np.ndarray:
+    files = sorted(partition_dir(store, os_name, alg).glob("*.parquet"))
+    if not files:
+        return np.empty(0, dtype=np.uint64)
+    keys = pd.concat(
+        [pq.read_table(f, columns=list(DEDUP_KEYS)).to_pandas() for f in files], ignore_index=True
+    )
+    return _key_hash(keys)
+
+
+def append_campaign(store: Path, df: pd.DataFrame, part_name: str) -> int:
+    """Afegeix les files noves d'una campanya (una particio per os/alg). Torna quantes."""
+    df = conform(df)
+    df = df[~pd.Series(_key_hash(df)).duplicated().to_numpy()]
+    added = 0
+    for (os_name, alg), sub in df.groupby(list(PARTITION_COLUMNS), observed=True, sort=True):
+        sub = sub[~np.isin(_key_hash(sub), _existing_keys(store, os_name, alg))]
+        if sub.empty:
+            continue
+        target = partition_dir(store, os_name, alg)
+        target.mkdir(parents=True, exist_ok=True)
+        table = pa.Table.from_pandas(sub, preserve_index=False)
+        tmp = target / f"{part_name}.parquet.tmp"
+        pq.write_table(table, tmp, compression="zstd")
+        tmp.replace(target / f"{part_name}.parquet")
+        added += len(sub)
+    return added
+
+
+def ingest_csv(
+    store: Path,
+    csv_path: Path,
+    campaign_id: str,
+    log: Dict[str, dict],
+    append: Optional[Callable[[pd.DataFrame, str], int]] = None,
+) -> Tuple[str, int]:
+    """Ingereix un CSV si no s'havia vist (o ha canviat des de l'ultima vegada).
+
+    Torna ("seen" | "invalid" | "ingested", files afegides) i actualitza `log`.
+    `append(df, part_name)` permet desar-lo en un altre lloc (p. ex. SQLite);
+    per defecte s'afegeix al magatzem Parquet `store`.
+    """
+    digest = file_digest(csv_path)
+    previous = log.get(campaign_id)
+    if previous and previous.get("blake2b") == digest:
+        return "seen", 0
+
+    df = parse_csv(csv_path)
+    problems = validate_campaign(df)
+    if problems:
+        print(f"[error] {csv_path}: " + "; ".join(problems))
+        return "invalid", 0
+
+    part_name = f"{_partition_value(campaign_id)}-{digest[:8]}"
+    if append is None:
+        added = append_campaign(store, df, part_name)
+    else:
+        added = append(df, part_name)
+    log[campaign_id] = {
+        "blake2b": digest,
+        "rows": int(len(df)),
+        "added": int(added),
+        "ingested_at": datetime.now().isoformat(timespec="seconds"),
+    }
+    return "ingested", added
+
+
+def _selected(values: Optional[Sequence[str]]) -> Optional[set]:
+    return {_partition_value(v) for v in values} if values else None
+
+
+def store_files(
+    store: Path, oses: Optional[Sequence[str]] = None, algs: Optional[Sequence[str]] = None
+) -> List[Path]:
+    want_os, want_alg = _selected(oses), _selected(algs)
+    files: List[Path] = []
+    for os_dir in sorted(store.glob("os=*")):
+        if want_os is not None and os_dir.name[len("os="):] not in want_os:
+            continue
+        for alg_dir in sorted(os_dir.glob("alg=*")):
+            if want_alg is not None and alg_dir.name[len("alg="):] not in want_alg:
+                continue
+            files.extend(sorted(alg_dir.glob("*.parquet")))
+    return files
+
+
+def read_store(
+    store: Path,
+    oses: Optional[Sequence[str]] = None,
+    algs: Optional[Sequence[str]] = None,
+    columns: Optional[Iterable[str]] = None,
+) -> pd.DataFrame:
+    """Llegeix nomes les particions os/alg demanades, amb els mateixos tipus que load_dataframe."""
+    if pq is None:
+        raise ImportError("Cal pyarrow per llegir el magatzem Parquet")
+    files = store_files(store, oses, algs)
+    if not files:
+        print(f"[warn] Cap particio al magatzem {store} amb els filtres indicats.")
+        return pd.DataFrame()
+    cols = list(columns) if columns is not None else None
+    frames = [pq.read_table(f, columns=cols).to_pandas() for f in files]
+    df = pd.concat(frames, ignore_index=True) if len(frames) > 1 else frames[0]
+    return categorize(df)
@@ -0,0 +1,99 @@
+from __future__ import annotations
+
+from typing import Dict, Sequence
+
+import numpy as np
+import pandas as pd
+from scipy import stats
+
+CELL_KEYS = ("alg", "n")
+CORRECTIONS = ("holm", "bh")
+DEFAULT_CORRECTION = "holm"
+ALPHA = 0.05
+
+
+def adjust_pvalues(p_values: np.ndarray, method: str = DEFAULT_CORRECTION) -> np.ndarray:
+    """p-valors ajustats per comparacions multiples: Holm (FWER) o Benjamini-Hochberg (FDR).
+
+    Els NaN (cel·les amb menys de 2 parelles) no compten dins de la familia.
+    """
+    if method not in CORRECTIONS:
+        raise ValueError(f"Correccio desconeguda: {method}")
+    p_values = np.asarray(p_values, dtype=np.float64)
+    adjusted = np.full(p_values.shape, np.nan)
+    valid = np.flatnonzero(~np.isnan(p_values))
+    m = len(valid)
+    if not m:
+        return adjusted
+    order = valid[np.argsort(p_values[valid], kind="stable")]
+    ranked = p_values[order]
+    if method == "holm":
+        # (m - i) * p_(i) amb maxim acumulat cap endavant
+        scaled = np.maximum.accumulate((m - np.arange(m)) * ranked)
+    else:
+        # m / (i + 1) * p_(i) amb minim acumulat des del final
+        scaled = np.minimum.accumulate((m / np.arange(1, m + 1) * ranked)[::-1])[::-1]
+    adjusted[order] = np.minimum(scaled, 1.0)
+    return adjusted
+
+
+def cell_stats(
+    paired: pd.DataFrame,
+    columns: Sequence[str],
+    keys: Sequence[str] = CELL_KEYS,
+    correction: str = DEFAULT_CORRECTION,
+) -> pd.DataFrame:
+    """Mitjana, sd, IC95% t i test t (H0: mitjana 0) per cada cel·la de `keys` i cada columna.
+
+    Un sol groupby per totes les columnes; els quantils i p-valors de la t es calculen
+    sobre els vectors de cel·les. La correccio s'aplica a cada columna per separat
+    (la familia son totes les cel·les d'aquella metrica). Torna una fila per
+    (cel·la, metrica), ordenada per claus.
+    """
+    keys = list(keys)
+    columns = list(columns)
+    values = paired[keys + columns].copy()
+    values[columns] = values[columns].astype("float64")
+    grouped = values.groupby(keys, observed=True, sort=True)[columns].agg(["count", "mean", "std"])
+
+    frames = []
+    for column in columns:
+        count = grouped[(column, "count")].to_numpy(dtype=np.float64)
+        mean = grouped[(column, "mean")].to_numpy()
+        sd = grouped[(column, "std")].to_numpy()
+        dof = np.where(count > 1, count - 1, np.nan)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            se = sd / np.sqrt(count)
+            t_stat = mean / se
+        t_crit = stats.t.ppf(0.975, dof)
+        p_value = 2 * stats.t.sf(np.abs(t_stat), dof)
+        p_adjusted = adjust_pvalues(p_value, correction)
+        frames.append(
+            pd.DataFrame(
+                {
+                    "metric": column,
+                    "pairs": count.astype("int64"),
+                    "mean": mean,
+                    "sd": sd,
+                    "ci95_low": mean - t_crit * se,
+                    "ci95_high": mean + t_crit * se,
+                    "t_stat": t_stat,
+                    "p_value": p_value,
+                    "p_adjusted": p_adjusted,
+                    "correction": correction,
+                    "significant": p_adjusted < ALPHA,
+                },
+                index=grouped.index,
+            )
+        )
+    return pd.concat(frames).reset_index()
+
+
+def summary_columns(metric: str, suffix: str = "") -> Dict[str, str]:
+    """Reanomena les columnes generiques de cell_stats amb el nom de la metrica (mean_dlog, ...)."""
+    return {
+        "mean": f"mean_{metric}{suffix}",
+        "sd": f"sd_{metric}{suffix}",
+        "ci95_low": f"ci95_low{suffix}",
+        "ci95_high": f"ci95_high{suffix}",
+    }
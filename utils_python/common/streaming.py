@@ -0,0 +1,192 @@
+from __future__ import annotations
+
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+from utils_python.common.loader import METRIC_COLUMNS, METRIC_DTYPE, clean_frame, metric_float64
+from utils_python.common.sketch import QuantileSketch, Tails
+
+# Acumuladors per grup i columna: es poden fusionar en qualsevol ordre (Chan et al.)
+MOMENT_FIELDS = ("count", "sum", "mean", "m2", "min", "max")
+DEFAULT_CHUNK_ROWS = 1_000_000
+
+
+def iter_chunks(
+    path: Path, chunk_rows: int, columns: Optional[Sequence[str]] = None
+) -> Iterator[pd.DataFrame]:
+    """Llegeix un CSV (o el magatzem Parquet) a trossos de `chunk_rows` files, amb els tipus de parse_csv."""
+    path = Path(path)
+    wanted = set(columns) if columns is not None else None
+    if wanted is not None and "cpu_total_ms" in wanted:
+        wanted |= {"cpu_user_ms", "cpu_sys_ms"}
+
+    if path.is_dir():
+        from utils_python.common.store import pq, store_files
+
+        for part in store_files(path):
+            parquet = pq.ParquetFile(part)
+            names = [c for c in parquet.schema_arrow.names if wanted is None or c in wanted]
+            for batch in parquet.iter_batches(batch_size=chunk_rows, columns=names):
+                yield batch.to_pandas()
+        return
+
+    reader = pd.read_csv(
+        path,
+        skipinitialspace=True,
+        encoding="utf-8-sig",
+        chunksize=chunk_rows,
+        usecols=None if wanted is None else (lambda col: col.strip() in wanted),
+    )
+    with reader:
+        for chunk in reader:
+            yield clean_frame(chunk)
+
+
+def chunk_moments(chunk: pd.DataFrame, keys: Sequence[str], columns: Sequence[str]) -> pd.DataFrame:
+    """Acumuladors d'un tros: una fila per grup, columnes (columna, camp de MOMENT_FIELDS)."""
+    values = pd.DataFrame({col: metric_float64(chunk[col]) for col in columns})
+    for key in keys:
+        # Claus comparables entre trossos (les categories de cada tros son diferents)
+        values[key] = chunk[key].astype("int64") if key == "n" else chunk[key].astype(str)
+    grouped = values.groupby(list(keys), sort=False)[list(columns)]
+    count = grouped.count()
+    mean = grouped.mean()
+    parts = {
+        "count": count.astype("float64"),
+        "sum": grouped.sum(),
+        "mean": mean,
+        "m2": grouped.var(ddof=0) * count,
+        "min": grouped.min(),
+        "max": grouped.max(),
+    }
+    return pd.concat(parts, axis=1).swaplevel(axis=1)
+
+
+def merge_moments(left: Optional[pd.DataFrame], right: pd.DataFrame) -> pd.DataFrame:
+    if left is None:
+        return right
+    index = left.index.union(right.index, sort=False)
+    a = left.reindex(index)
+    b = right.reindex(index)
+    merged = {}
+    for column in a.columns.get_level_values(0).unique():
+        na = a[(column, "count")].fillna(0).to_numpy()
+        nb = b[(column, "count")].fillna(0).to_numpy()
+        ma = a[(column, "mean")].fillna(0).to_numpy()
+        mb = b[(column, "mean")].fillna(0).to_numpy()
+        n = na + nb
+        delta = mb - ma
+        with np.errstate(divide="ignore", invalid="ignore"):
+            mean = np.where(n > 0, ma + delta * (nb / n), np.nan)
+            m2 = (
+                a[(column, "m2")].fillna(0).to_numpy()
+                + b[(column, "m2")].fillna(0).to_numpy()
+                + np.where(n > 0, delta * delta * na * nb / n, 0.0)
+            )
+        merged[(column, "count")] = n
+        merged[(column, "sum")] = (
+            a[(column, "sum")].fillna(0).to_numpy() + b[(column, "sum")].fillna(0).to_numpy()
+        )
+        merged[(column, "mean")] = mean
+        merged[(column, "m2")] = m2
+        merged[(column, "min")] = np.fmin(a[(column, "min")].to_numpy(), b[(column, "min")].to_numpy())
+        merged[(column, "max")] = np.fmax(a[(column, "max")].to_numpy(), b[(column, "max")].to_numpy())
+    return pd.DataFrame(merged, index=index)
+
+
+def finalize_moments(moments: pd.DataFrame, aggregates: Dict[str, tuple]) -> pd.DataFrame:
+    """Taula final {nom: (columna, "mean" | "std" | "min" | "max" | "count" | "sum")}, ordenada per claus."""
+    out = {}
+    for name, (column, func) in aggregates.items():
+        count = moments[(column, "count")].to_numpy()
+        if func == "count":
+            out[name] = count.astype("int64")
+            continue
+        if func == "std":
+            with np.errstate(divide="ignore", invalid="ignore"):
+                m2 = moments[(column, "m2")].to_numpy()
+                values = np.where(count > 1, np.sqrt(m2 / (count - 1)), np.nan)
+        elif func in ("mean", "min", "max", "sum"):
+            values = moments[(column, func)].to_numpy()
+        else:
+            raise ValueError(f"Agregat desconegut: {func}")
+        # Mateix tipus que el groupby de pandas sobre les columnes float32
+        out[name] = values.astype(METRIC_DTYPE) if column in METRIC_COLUMNS else values
+    table = pd.DataFrame(out, index=moments.index)
+    return table.sort_index().reset_index()
+
+
+def update_moments(
+    moments: Dict[str, Optional[pd.DataFrame]],
+    chunk: pd.DataFrame,
+    tables: Dict[str, Tuple[Sequence[str], Dict[str, tuple]]],
+) -> None:
+    for name, (keys, aggregates) in tables.items():
+        columns = list(dict.fromkeys(column for column, _ in aggregates.values()))
+        if not set((*keys, *columns)).issubset(chunk.columns):
+            continue
+        moments[name] = merge_moments(moments.get(name), chunk_moments(chunk, keys, columns))
+
+
+def finalize_tables(
+    moments: Dict[str, Optional[pd.DataFrame]],
+    tables: Dict[str, Tuple[Sequence[str], Dict[str, tuple]]],
+) -> Dict[str, pd.DataFrame]:
+    return {
+        name: finalize_moments(moments[name], tables[name][1])
+        for name in tables
+        if moments.get(name) is not None
+    }
+
+
+def stream_group_stats(
+    chunks: Iterable[pd.DataFrame], tables: Dict[str, Tuple[Sequence[str], Dict[str, tuple]]]
+) -> Dict[str, pd.DataFrame]:
+    """Calcula diverses taules agrupades en una sola passada: {taula: (claus, agregats)}.
+
+    Nomes es guarden els acumuladors de cada grup, aixi que la memoria no depen
+    del nombre de files.
+    """
+    moments: Dict[str, Optional[pd.DataFrame]] = {}
+    for chunk in chunks:
+        if not chunk.empty:
+            update_moments(moments, chunk, tables)
+    return finalize_tables(moments, tables)
+
+
+def _group_values(chunk: pd.DataFrame, keys: Sequence[str], column: str):
+    grouped = chunk[[*keys, column]].groupby(list(keys), observed=True, sort=False)[column]
+    for key, values in grouped:
+        key = key if isinstance(key, tuple) else (key,)
+        yield tuple(str(k) for k in key), values.to_numpy(dtype=np.float64)
+
+
+def update_sketches(
+    sketches: Dict[str, Dict[tuple, QuantileSketch]],
+    chunk: pd.DataFrame,
+    specs: Dict[str, Tuple[Sequence[str], str]],
+) -> None:
+    """Primera passada dels boxplots: un sketch de quantils per figura i grup {figura: (claus, columna)}."""
+    for name, (keys, column) in specs.items():
+        if not set((*keys, column)).issubset(chunk.columns):
+            continue
+        per_group = sketches.setdefault(name, {})
+        for key, values in _group_values(chunk, keys, column):
+            per_group.setdefault(key, QuantileSketch()).update(values)
+
+
+def update_tails(
+    tails: Dict[str, Dict[tuple, Tails]],
+    chunk: pd.DataFrame,
+    specs: Dict[str, Tuple[Sequence[str], str]],
+) -> None:
+    """Segona passada: bigotis i outliers amb les tanques que donen els sketches."""
+    for name, (keys, column) in specs.items():
+        if name not in tails:
+            continue
+        for key, values in _group_values(chunk, keys, column):
+            if key in tails[name]:
+                tails[name][key].update(values)
@@ -0,0 +1,146 @@
+from __future__ import annotations
+
+import struct
+from pathlib import Path
+from typing import BinaryIO, Dict, Iterable, List, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+# Format binari de les linies de temps RSS/CPU que desa l'orquestrador (una per execucio):
+#   capcalera fixa  <4s magic, H versio, H run_order, H fils, I interval_us, Q n, Q seed, I mostres>
+#   tres cadenes    os, alg, run_id (H longitud + UTF-8)
+#   mostres         <I t_us, I rss_kib, I cpu_user_us, I cpu_sys_us> (16 bytes cadascuna)
+# Amb enters de 32 bits una execucio pot durar fins a ~71 minuts.
+TIMELINE_MAGIC = b"RSTL"
+TIMELINE_VERSION = 1
+TIMELINE_SUFFIX = ".rsstl"
+
+_HEADER = struct.Struct("<4sHHHIQQI")
+_LENGTH = struct.Struct("<H")
+SAMPLE_DTYPE = np.dtype(
+    [("t_us", "<u4"), ("rss_kib", "<u4"), ("cpu_user_us", "<u4"), ("cpu_sys_us", "<u4")]
+)
+
+Sample = Tuple[int, int, int, int]
+
+
+def timeline_name(os_label: str, alg: str, n: int, seed: int, run_id: str, threads: int = 1) -> str:
+    workers = f"_t{threads}" if threads != 1 else ""
+    return f"{os_label}_{alg}_{n}{workers}_{seed}_{run_id}{TIMELINE_SUFFIX}"
+
+
+def _write_str(fh: BinaryIO, value: str) -> None:
+    raw = value.encode("utf-8")
+    fh.write(_LENGTH.pack(len(raw)))
+    fh.write(raw)
+
+
+def _read_str(fh: BinaryIO) -> str:
+    (length,) = _LENGTH.unpack(fh.read(_LENGTH.size))
+    return fh.read(length).decode("utf-8")
+
+
+def write_timeline(
+    path: Path,
+    samples: Sequence[Sample],
+    *,
+    os_label: str,
+    alg: str,
+    n: int,
+    seed: int,
+    run_order: int,
+    run_id: str,
+    interval_us: int,
+    threads: int = 1,
+) -> None:
+    data = np.asarray(samples, dtype=np.uint32).reshape(-1, 4)
+    records = np.empty(len(data), dtype=SAMPLE_DTYPE)
+    for i, name in enumerate(SAMPLE_DTYPE.names):
+        records[name] = data[:, i]
+
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with path.open("wb") as fh:
+        fh.write(
+            _HEADER.pack(
+                TIMELINE_MAGIC, TIMELINE_VERSION, run_order, threads, interval_us, n, seed, len(records)
+            )
+        )
+        for value in (os_label, alg, run_id):
+            _write_str(fh, value)
+        fh.write(records.tobytes())
+
+
+def read_timeline(path: Path) -> Tuple[Dict[str, object], np.ndarray]:
+    with path.open("rb") as fh:
+        magic, version, run_order, threads, interval_us, n, seed, count = _HEADER.unpack(
+            fh.read(_HEADER.size)
+        )
+        if magic != TIMELINE_MAGIC or version != TIMELINE_VERSION:
+            raise ValueError(f"Format de linia de temps desconegut: {path}")
+        os_label, alg, run_id = (_read_str(fh) for _ in range(3))
+        samples = np.frombuffer(fh.read(count * SAMPLE_DTYPE.itemsize), dtype=SAMPLE_DTYPE)
+
+    meta = {
+        "os": os_label,
+        "alg": alg,
+        "n": n,
+        "threads": threads,
+        "seed": seed,
+        "run_order": run_order,
+        "run_id": run_id,
+        "interval_us": interval_us,
+    }
+    return meta, samples
+
+
+def summarize_timeline(samples: np.ndarray) -> Dict[str, float]:
+    """RSS mitjana ponderada pel temps, pic, pendent de creixement i %CPU d'una execucio."""
+    if len(samples) < 2:
+        return {
+            "duration_ms": np.nan,
+            "twa_rss_mib": np.nan,
+            "peak_rss_mib": np.nan,
+            "rss_slope_mib_s": np.nan,
+            "cpu_pct_mean": np.nan,
+        }
+
+    t_s = samples["t_us"].astype(np.float64) / 1e6
+    rss_mib = samples["rss_kib"].astype(np.float64) / 1024.0
+    duration_s = t_s[-1] - t_s[0]
+    # Regla del trapezi: les mostres no son exactament equiespaiades
+    area = float(np.sum((rss_mib[1:] + rss_mib[:-1]) * np.diff(t_s)) / 2)
+    twa = area / duration_s if duration_s > 0 else float(rss_mib.mean())
+    slope = np.polyfit(t_s, rss_mib, 1)[0] if duration_s > 0 else np.nan
+    cpu_us = samples["cpu_user_us"].astype(np.float64) + samples["cpu_sys_us"]
+    cpu_pct = (cpu_us[-1] - cpu_us[0]) / (duration_s * 1e6) * 100 if duration_s > 0 else np.nan
+
+    return {
+        "duration_ms": duration_s * 1e3,
+        "twa_rss_mib": float(twa),
+        "peak_rss_mib": float(rss_mib.max()),
+        "rss_slope_mib_s": float(slope),
+        "cpu_pct_mean": float(cpu_pct),
+    }
+
+
+def find_timelines(dirs: Iterable[Path]) -> List[Path]:
+    paths: List[Path] = []
+    for directory in dirs:
+        paths.extend(sorted(Path(directory).rglob(f"*{TIMELINE_SUFFIX}")))
+    return paths
+
+
+def load_timelines(paths: Iterable[Path]) -> Tuple[pd.DataFrame, List[np.ndarray]]:
+    """Llegeix les linies de temps i torna un resum per execucio i les mostres (mateix ordre)."""
+    rows: List[dict] = []
+    series: List[np.ndarray] = []
+    for path in paths:
+        try:
+            meta, samples = read_timeline(path)
+        except (OSError, ValueError, struct.error) as exc:
+            print(f"[warn] No es pot llegir {path}: {exc}")
+            continue
+        rows.append({**meta, **summarize_timeline(samples), "samples": len(samples)})
+        series.append(samples)
+    return pd.DataFrame(rows), series
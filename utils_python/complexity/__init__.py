@@ -0,0 +1 @@
+"Ajust empiric de la complexitat (temps vs n) per algorisme i sistema operatiu."
@@ -0,0 +1,404 @@
+from __future__ import annotations
+
+import argparse
+import json
+import re
+import sys
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+
+import matplotlib.pyplot as plt
+import numpy as np
+import pandas as pd
+
+if __package__ in (None, ""):
+    sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
+
+from utils_python.common import database, outliers, pairing, resampling  # noqa: E402
+from utils_python.common.loader import load_dataframe  # noqa: E402
+from utils_python.common.manifest import OutputManifest, source_digest  # noqa: E402
+
+DEFAULT_INPUT = Path(__file__).resolve().parents[2] / "resultats_tots.csv"
+DEFAULT_CONFIG = Path(__file__).resolve().parents[2] / "config.json"
+DEFAULT_OUTPUT_DIR = Path(__file__).resolve().parents[1] / "sortides" / "complexity"
+# Amb --db: claus d'execucio (collapse_iterations) i la metrica ajustada
+DB_RUN_COLUMNS = ("os", *pairing.PAIR_KEYS, "workers", "run_order", "run_id", "iter", "wall_ms")
+
+# Models candidats: wall_ms = c * f(n). Un sol parametre per model, de manera que
+# el R^2 es comparable entre models.
+MODELS: Dict[str, Callable[[np.ndarray], np.ndarray]] = {
+    "O(1)": np.ones_like,
+    "O(log n)": np.log2,
+    "O(n)": lambda n: n,
+    "O(n log n)": lambda n: n * np.log2(n),
+    "O(n^2)": lambda n: n**2,
+    "O(n^3)": lambda n: n**3,
+}
+# Amb menys mides diferents el millor model no es pot distingir de manera fiable
+MIN_DISTINCT_N = 3
+
+
+def configure_plots() -> None:
+    plt.rcParams["figure.figsize"] = (6, 4)
+    plt.rcParams["figure.dpi"] = 150
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        description=(
+            "Ajusta wall_ms = c * f(n) per (os, alg) amb el model declarat a config.json i "
+            "els candidats, i compara les constants Linux/Windows."
+        )
+    )
+    parser.add_argument(
+        "--input",
+        "-i",
+        type=Path,
+        default=DEFAULT_INPUT,
+        help="CSV amb totes les execucions (Windows + Linux).",
+    )
+    parser.add_argument(
+        "--db",
+        type=Path,
+        default=None,
+        help="Base de dades SQLite (ingest_runs.py --db) en lloc de --input: llegeix la taula runs.",
+    )
+    parser.add_argument(
+        "--config",
+        "-c",
+        type=Path,
+        default=DEFAULT_CONFIG,
+        help="config.json amb la complexitat declarada de cada algorisme (camp complexity).",
+    )
+    parser.add_argument(
+        "--output-dir",
+        "-o",
+        type=Path,
+        default=DEFAULT_OUTPUT_DIR,
+        help="Carpeta on es desaran les taules i les figures.",
+    )
+    parser.add_argument(
+        "--linux-label",
+        default="Linux",
+        help="Valor de la columna os que identifica Linux.",
+    )
+    parser.add_argument(
+        "--windows-label",
+        default="Windows",
+        help="Valor de la columna os que identifica Windows.",
+    )
+    parser.add_argument(
+        "--resamples",
+        type=int,
+        default=resampling.DEFAULT_RESAMPLES,
+        help="Remostres bootstrap per a l'IC95% de la ratio de constants (0 = sense IC).",
+    )
+    parser.add_argument(
+        "--seed",
+        type=int,
+        default=resampling.DEFAULT_SEED,
+        help="Llavor del bootstrap.",
+    )
+    parser.add_argument(
+        "--force",
+        action="store_true",
+        help="Regenera totes les sortides encara que les dades no hagin canviat (ignora manifest.json).",
+    )
+    parser.add_argument(
+        "--outliers",
+        choices=outliers.OUTLIER_METHODS,
+        default=None,
+        help=(
+            "Exclou els outliers de wall_ms per (os, alg, n) abans de l'analisi: mad "
+            "(|x - mediana| > 3 MAD), iqr (fora de Q1 - 1.5 IQR, Q3 + 1.5 IQR) o both. "
+            "Es treu tota la parella ABBA i es desa outliers_exclosos.csv."
+        ),
+    )
+    parser.add_argument(
+        "--no-cache",
+        action="store_true",
+        help="No llegeix ni escriu la cache columnar (.feather) al costat del CSV.",
+    )
+    return parser.parse_args()
+
+
+def sanitize_for_filename(value: str) -> str:
+    return "".join(ch if ch.isalnum() or ch in ("-", "_") else "_" for ch in value)
+
+
+def canonical_model(label: str) -> Optional[str]:
+    # "O(n log n)", "O(nlogn)", "O(n*log(n))", "O(n²)"... -> clau de MODELS
+    key = re.sub(r"[\s*·()]", "", label.lower()).replace("²", "^2").replace("³", "^3")
+    for model in MODELS:
+        if re.sub(r"[\s()]", "", model.lower()) == key:
+            return model
+    return None
+
+
+def load_declared(config_path: Path) -> Dict[str, str]:
+    if not config_path.exists():
+        print(f"[warn] No s'ha trobat {config_path}; nomes s'ajusten els models candidats.")
+        return {}
+    cfg = json.loads(config_path.read_text(encoding="utf-8"))
+    declared: Dict[str, str] = {}
+    for entry in cfg.get("algos", []):
+        label = entry.get("complexity")
+        if not label:
+            continue
+        model = canonical_model(label)
+        if model is None:
+            print(f"[warn] Complexitat desconeguda per {entry['name']}: {label!r}")
+            continue
+        declared[entry["name"]] = model
+    return declared
+
+
+def fit_model(n: np.ndarray, wall: np.ndarray, model: str) -> Dict[str, float]:
+    """Minims quadrats de wall = c * f(n) (forma tancada) i R^2 respecte la mitjana."""
+    x = MODELS[model](n)
+    c = float(np.dot(x, wall) / np.dot(x, x))
+    ss_res = float(np.sum((wall - c * x) ** 2))
+    ss_tot = float(np.sum((wall - wall.mean()) ** 2))
+    # Amb una sola mida tots els models donen el mateix ajust: el R^2 no diu res
+    informative = ss_tot > 0 and np.unique(n).size > 1
+    return {"c_ms": c, "r2": 1 - ss_res / ss_tot if informative else np.nan}
+
+
+def fit_all(df: pd.DataFrame, declared: Dict[str, str]) -> pd.DataFrame:
+    rows: List[dict] = []
+    for (os_name, alg), sub in df.groupby(["os", "alg"], observed=True):
+        n = sub["n"].to_numpy(dtype=np.float64)
+        wall = sub["wall_ms"].to_numpy(dtype=np.float64)
+        for model in MODELS:
+            rows.append(
+                {
+                    "os": os_name,
+                    "alg": alg,
+                    "model": model,
+                    "declared": declared.get(str(alg)) == model,
+                    **fit_model(n, wall, model),
+                    "n_obs": len(sub),
+                    "distinct_n": int(sub["n"].nunique()),
+                }
+            )
+    return pd.DataFrame(rows)
+
+
+def summarize_fits(fits: pd.DataFrame, declared: Dict[str, str]) -> pd.DataFrame:
+    rows: List[dict] = []
+    for (os_name, alg), sub in fits.groupby(["os", "alg"], observed=True, sort=False):
+        distinct_n = int(sub["distinct_n"].iloc[0])
+        model = declared.get(str(alg), "")
+        best = sub.loc[sub["r2"].idxmax()] if sub["r2"].notna().any() else None
+        decl = sub[sub["model"] == model]
+        classified = best is not None and distinct_n >= MIN_DISTINCT_N
+        rows.append(
+            {
+                "os": os_name,
+                "alg": alg,
+                "declared": model,
+                "best_fit": best["model"] if classified else "",
+                "r2_declared": float(decl["r2"].iloc[0]) if not decl.empty else np.nan,
+                "r2_best": float(best["r2"]) if classified else np.nan,
+                "distinct_n": distinct_n,
+                # Buit si no es pot decidir (model no declarat o poques mides)
+                "agrees": (best["model"] == model) if classified and model else pd.NA,
+            }
+        )
+    return pd.DataFrame(rows)
+
+
+def bootstrap_constant(
+    sub: pd.DataFrame, model: str, resamples: int, seed: int, label: str
+) -> np.ndarray:
+    """Remostres de c remostrejant les execucions dins de cada n.
+
+    Amb recomptes fixos per n, c = sum_n f_n k_n mean_n / sum_n f_n^2 k_n, aixi que
+    n'hi ha prou amb les mitjanes bootstrap de cada mida.
+    """
+    boot = np.zeros(resamples)
+    denom = 0.0
+    for n_value, group in sub.groupby("n", observed=True):
+        f_n = float(MODELS[model](np.array([float(n_value)]))[0])
+        wall = group["wall_ms"].to_numpy(dtype=np.float64)
+        rng = resampling.group_rng(seed, f"{label}/{n_value}")
+        boot += f_n * len(wall) * resampling.bootstrap_means(wall, resamples, rng)
+        denom += f_n * f_n * len(wall)
+    return boot / denom
+
+
+def build_ratios(
+    df: pd.DataFrame,
+    fits: pd.DataFrame,
+    summary: pd.DataFrame,
+    linux_label: str,
+    windows_label: str,
+    resamples: int,
+    seed: int,
+) -> pd.DataFrame:
+    rows: List[dict] = []
+    for alg in summary["alg"].unique():
+        sub_summary = summary[summary["alg"] == alg]
+        # Model declarat; si no n'hi ha, el millor ajust de Linux
+        model = sub_summary["declared"].iloc[0] or next(
+            (m for m in sub_summary.loc[sub_summary["os"] == linux_label, "best_fit"] if m), ""
+        )
+        if not model:
+            continue
+        consts = fits[(fits["alg"] == alg) & (fits["model"] == model)].set_index("os")["c_ms"]
+        if linux_label not in consts.index or windows_label not in consts.index:
+            continue
+
+        row = {
+            "alg": alg,
+            "model": model,
+            "c_linux_ms": float(consts[linux_label]),
+            "c_windows_ms": float(consts[windows_label]),
+            "ratio": float(consts[linux_label] / consts[windows_label]),
+            "ratio_ci95_low": np.nan,
+            "ratio_ci95_high": np.nan,
+        }
+        if resamples > 0:
+            boots = {
+                os_name: bootstrap_constant(
+                    df[(df["os"] == os_name) & (df["alg"] == alg)],
+                    model,
+                    resamples,
+                    seed,
+                    f"{os_name}/{alg}",
+                )
+                for os_name in (linux_label, windows_label)
+            }
+            ratio = boots[linux_label] / boots[windows_label]
+            row["ratio_ci95_low"], row["ratio_ci95_high"] = (
+                float(v) for v in np.quantile(ratio, [0.025, 0.975])
+            )
+        rows.append(row)
+    return pd.DataFrame(rows)
+
+
+def save_fit_figure(
+    df: pd.DataFrame, fits: pd.DataFrame, alg: str, model: str, output_dir: Path
+) -> Path:
+    sub = df[df["alg"] == alg]
+    means = sub.groupby(["os", "n"], observed=True)["wall_ms"].mean().reset_index()
+    grid = np.geomspace(float(sub["n"].min()), float(sub["n"].max()), 100)
+
+    plt.figure()
+    for os_name, os_means in means.groupby("os", observed=True):
+        points = plt.plot(os_means["n"], os_means["wall_ms"], marker="o", linestyle="", label=os_name)
+        fit = fits[(fits["os"] == os_name) & (fits["alg"] == alg) & (fits["model"] == model)]
+        if not fit.empty:
+            plt.plot(grid, fit["c_ms"].iloc[0] * MODELS[model](grid), color=points[0].get_color())
+    plt.xscale("log")
+    plt.yscale("log")
+    plt.xlabel("Mida de l'input (n)")
+    plt.ylabel("Temps mitja d'execucio (ms)")
+    plt.title(f"{alg}: ajust {model}")
+    plt.legend(title="Sistema operatiu")
+    plt.tight_layout()
+    path = output_dir / f"complexity_fit_{sanitize_for_filename(alg)}.png"
+    plt.savefig(path)
+    plt.close()
+    print(f"[save] {path}")
+    return path
+
+
+def run_report(
+    df: pd.DataFrame,
+    output_dir: Path,
+    declared: Dict[str, str],
+    linux_label: str = "Linux",
+    windows_label: str = "Windows",
+    resamples: int = resampling.DEFAULT_RESAMPLES,
+    seed: int = resampling.DEFAULT_SEED,
+    incremental: bool = True,
+) -> None:
+    required = ("os", "alg", "n", "wall_ms")
+    missing = [col for col in required if col not in df.columns]
+    if missing:
+        print(f"[error] Falten columnes al CSV: {missing}")
+        return
+
+    output_dir.mkdir(parents=True, exist_ok=True)
+    manifest = OutputManifest(output_dir, {"tool": source_digest(__file__)}, incremental)
+
+    # L'ajust es fa sobre T(n) a un fil; amb mes fils la corba seria una altra
+    data = pairing.collapse_iterations(pairing.single_thread(df), ("wall_ms",))
+    data = data[(data["n"] > 0) & (data["wall_ms"] > 0)].dropna(subset=list(required))
+    data = data.assign(alg=data["alg"].astype(str).str.strip(), os=data["os"].astype(str))
+    inputs = data[list(required)]
+    params = {"declared": declared, "resamples": resamples, "seed": seed}
+
+    fits = fit_all(data, declared)
+    summary = summarize_fits(fits, declared)
+    if manifest.stale("complexity_fits.csv", inputs, params):
+        out_fits = output_dir / "complexity_fits.csv"
+        fits.to_csv(out_fits, index=False)
+        print(f"[save] {out_fits}")
+        manifest.done("complexity_fits.csv")
+
+    if manifest.stale("complexity_summary.csv", inputs, params):
+        out_summary = output_dir / "complexity_summary.csv"
+        summary.to_csv(out_summary, index=False)
+        print(f"[save] {out_summary}")
+        manifest.done("complexity_summary.csv")
+
+    if manifest.stale("complexity_ratio_lin_win.csv", inputs, params):
+        ratios = build_ratios(data, fits, summary, linux_label, windows_label, resamples, seed)
+        out_ratios = output_dir / "complexity_ratio_lin_win.csv"
+        ratios.to_csv(out_ratios, index=False)
+        print(f"[save] {out_ratios}")
+        manifest.done("complexity_ratio_lin_win.csv")
+
+    for alg in summary["alg"].unique():
+        model = declared.get(alg) or next(
+            (m for m in summary.loc[summary["alg"] == alg, "best_fit"] if m), ""
+        )
+        name = f"complexity_fit_{sanitize_for_filename(alg)}.png"
+        if model and manifest.stale(name, inputs[inputs["alg"] == alg], model):
+            save_fit_figure(data, fits, alg, model, output_dir)
+            manifest.done(name)
+    manifest.save()
+
+    for _, row in summary[summary["agrees"].eq(False).fillna(False)].iterrows():
+        print(
+            f"[warn] {row['alg']} ({row['os']}): el millor ajust es {row['best_fit']} "
+            f"(R2={row['r2_best']:.4f}) pero config.json declara {row['declared']} "
+            f"(R2={row['r2_declared']:.4f})"
+        )
+    unclassified = summary.loc[summary["distinct_n"] < MIN_DISTINCT_N, "alg"].unique()
+    if len(unclassified):
+        print(
+            f"[omit] Sense classificar (menys de {MIN_DISTINCT_N} mides n diferents): "
+            f"{', '.join(unclassified)}"
+        )
+
+
+def main() -> None:
+    args = parse_args()
+
+    if args.db is not None:
+        conn = database.connect_db(args.db)
+        df = database.read_runs(conn, list(dict.fromkeys((*DB_RUN_COLUMNS, *outliers.OUTLIER_COLUMNS))))
+    else:
+        if not args.input.exists():
+            raise FileNotFoundError(f"No s'ha trobat el fitxer d'entrada: {args.input}")
+        df = load_dataframe(args.input, use_cache=not args.no_cache)
+
+    configure_plots()
+    df, _ = outliers.apply_outlier_stage(df, args.outliers, args.output_dir)
+    run_report(
+        df,
+        args.output_dir,
+        load_declared(args.config),
+        args.linux_label,
+        args.windows_label,
+        args.resamples,
+        args.seed,
+        incremental=not args.force,
+    )
+
+
+if __name__ == "__main__":
+    main()
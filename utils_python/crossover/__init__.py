@@ -0,0 +1 @@
+"Model de crossover ABBA: efecte del sistema operatiu, del periode i carryover per (alg, n)."
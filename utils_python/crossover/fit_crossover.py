@@ -0,0 +1,311 @@
+from __future__ import annotations
+
+import argparse
+import sys
+from pathlib import Path
+from typing import Sequence
+
+import numpy as np
+import pandas as pd
+from scipy import stats
+
+if __package__ in (None, ""):
+    sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
+
+from utils_python.common import database, outliers, pairing, stratified  # noqa: E402
+from utils_python.common.loader import load_dataframe  # noqa: E402
+from utils_python.common.manifest import OutputManifest, source_digest  # noqa: E402
+
+DEFAULT_INPUT = Path(__file__).resolve().parents[2] / "resultats_tots.csv"
+DEFAULT_OUTPUT_DIR = Path(__file__).resolve().parents[1] / "sortides" / "crossover"
+
+# Escala de cada metrica: els temps en log (efectes = log-ratios, com Dlog) i la resta
+# en unitats absolutes (com Dcpu i Drss)
+METRIC_SCALES = {
+    "wall_ms": "log",
+    "cpu_user_ms": "log",
+    "cpu_sys_ms": "log",
+    "cpu_total_ms": "log",
+    "cpu_pct_avg": "abs",
+    "rss_peak_mib": "abs",
+}
+# Codificacio +-1/2: "os" es Linux - Windows (mitjana de les dues potes), "period" es
+# pota B - pota A i "carryover" es (Linux_B - Linux_A) - (Windows_B - Windows_A).
+# Amb l'ordre 1-2-3-4 = L-W-W-L, el carryover inclou l'efecte de ser la segona
+# execucio d'una pota (Windows a la A, Linux a la B).
+EFFECTS = ("os", "period", "carryover")
+DB_RUN_COLUMNS = ("os", *pairing.PAIR_KEYS, "workers", "run_order", "run_id", "iter", *METRIC_SCALES)
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        description=(
+            "Ajusta el model de crossover de l'esquema ABBA per (alg, n) i metrica: efecte "
+            "del sistema operatiu, del periode (pota A/B) i carryover OS x periode."
+        )
+    )
+    parser.add_argument(
+        "--input",
+        "-i",
+        type=Path,
+        default=DEFAULT_INPUT,
+        help="CSV amb totes les execucions (Windows + Linux), amb run_order.",
+    )
+    parser.add_argument(
+        "--db",
+        type=Path,
+        default=None,
+        help="Base de dades SQLite (ingest_runs.py --db) en lloc de --input: llegeix la taula runs.",
+    )
+    parser.add_argument(
+        "--output-dir",
+        "-o",
+        type=Path,
+        default=DEFAULT_OUTPUT_DIR,
+        help="Carpeta on es desa crossover_effects.csv.",
+    )
+    parser.add_argument(
+        "--linux-label",
+        default="Linux",
+        help="Valor de la columna os que identifica Linux.",
+    )
+    parser.add_argument(
+        "--windows-label",
+        default="Windows",
+        help="Valor de la columna os que identifica Windows.",
+    )
+    parser.add_argument(
+        "--correction",
+        choices=stratified.CORRECTIONS,
+        default=stratified.DEFAULT_CORRECTION,
+        help="Correccio dels p-valors entre cel·les (alg, n) de cada metrica i efecte: holm o bh.",
+    )
+    parser.add_argument(
+        "--force",
+        action="store_true",
+        help="Regenera totes les sortides encara que les dades no hagin canviat (ignora manifest.json).",
+    )
+    parser.add_argument(
+        "--outliers",
+        choices=outliers.OUTLIER_METHODS,
+        default=None,
+        help=(
+            "Exclou els outliers de wall_ms per (os, alg, n) abans de l'analisi: mad "
+            "(|x - mediana| > 3 MAD), iqr (fora de Q1 - 1.5 IQR, Q3 + 1.5 IQR) o both. "
+            "Es treu tota la parella ABBA i es desa outliers_exclosos.csv."
+        ),
+    )
+    parser.add_argument(
+        "--no-cache",
+        action="store_true",
+        help="No llegeix ni escriu la cache columnar (.feather) al costat del CSV.",
+    )
+    return parser.parse_args()
+
+
+def design(data: pd.DataFrame, linux_label: str) -> np.ndarray:
+    """Columnes (os, period, carryover) amb codificacio +-1/2."""
+    x_os = np.where((data["os"] == linux_label).to_numpy(), 0.5, -0.5)
+    x_period = np.where((data["abba_leg"] == "B").to_numpy(), 0.5, -0.5)
+    return np.column_stack([x_os, x_period, x_os * x_period])
+
+
+def _within(values: np.ndarray, block: np.ndarray, n_blocks: int) -> np.ndarray:
+    # Resta la mitjana de cada bloc ABBA: absorbeix l'efecte fix de bloc (Frisch-Waugh)
+    counts = np.bincount(block, minlength=n_blocks)
+    if values.ndim == 1:
+        return values - (np.bincount(block, values, n_blocks) / counts)[block]
+    means = np.column_stack(
+        [np.bincount(block, values[:, j], n_blocks) for j in range(values.shape[1])]
+    ) / counts[:, None]
+    return values - means[block]
+
+
+def fit_crossover(
+    data: pd.DataFrame, metric: str, linux_label: str, keys: Sequence[str] = stratified.CELL_KEYS
+) -> pd.DataFrame:
+    """Minims quadrats y = bloc + os + period + carryover per cada cel·la, en un sol solve.
+
+    Els efectes fixos de bloc (cada repeticio ABBA) s'eliminen centrant dins del bloc;
+    despres les X'X (3x3) i X'y de totes les cel·les es calculen amb bincount i la
+    pila de matrius s'inverteix d'un cop (la inversa tambe dona els errors estandard).
+    """
+    scale = METRIC_SCALES[metric]
+    values = data[metric].to_numpy(dtype=np.float64)
+    if scale == "log":
+        with np.errstate(divide="ignore", invalid="ignore"):
+            values = np.log(np.where(values > 0, values, np.nan))
+    keep = np.isfinite(values)
+    sub = data.loc[keep]
+    y = values[keep]
+    if sub.empty:
+        return pd.DataFrame()
+
+    cells = sub.groupby(list(keys), observed=True, sort=True)
+    cell = cells.ngroup().to_numpy()
+    n_cells = cells.ngroups
+    block = sub.groupby(list(pairing.PAIR_KEYS), observed=True, sort=False).ngroup().to_numpy()
+    n_blocks = int(block.max()) + 1
+
+    x = _within(design(sub, linux_label), block, n_blocks)
+    y = _within(y, block, n_blocks)
+
+    xtx = np.empty((n_cells, 3, 3))
+    for i in range(3):
+        for j in range(i, 3):
+            xtx[:, i, j] = xtx[:, j, i] = np.bincount(cell, x[:, i] * x[:, j], n_cells)
+    xty = np.column_stack([np.bincount(cell, x[:, j] * y, n_cells) for j in range(3)])
+    yty = np.bincount(cell, y * y, n_cells)
+
+    obs = np.bincount(cell, minlength=n_cells)
+    block_cell = np.zeros(n_blocks, dtype=np.int64)
+    block_cell[block] = cell
+    blocks = np.bincount(block_cell, minlength=n_cells)
+    dof = obs - blocks - len(EFFECTS)
+    # Cel·les sense les quatre combinacions OS x pota o sense graus de llibertat: NaN
+    solvable = (dof > 0) & (np.abs(np.linalg.det(xtx)) > 1e-12)
+
+    beta = np.full((n_cells, 3), np.nan)
+    variances = np.full((n_cells, 3), np.nan)
+    if solvable.any():
+        inv = np.linalg.inv(xtx[solvable])
+        beta[solvable] = np.einsum("cij,cj->ci", inv, xty[solvable])
+        rss = yty[solvable] - np.einsum("ci,ci->c", beta[solvable], xty[solvable])
+        sigma2 = np.maximum(rss, 0) / dof[solvable]
+        variances[solvable] = sigma2[:, None] * np.diagonal(inv, axis1=1, axis2=2)
+
+    dof_t = np.where(solvable, dof, np.nan)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        se = np.sqrt(variances)
+        t_stat = beta / se
+    t_crit = stats.t.ppf(0.975, dof_t)
+    p_value = 2 * stats.t.sf(np.abs(t_stat), dof_t[:, None])
+
+    index = cells.size().index
+    frames = []
+    for k, effect in enumerate(EFFECTS):
+        frame = pd.DataFrame(
+            {
+                "metric": metric,
+                "scale": scale,
+                "effect": effect,
+                "estimate": beta[:, k],
+                "se": se[:, k],
+                "ci95_low": beta[:, k] - t_crit * se[:, k],
+                "ci95_high": beta[:, k] + t_crit * se[:, k],
+                "t_stat": t_stat[:, k],
+                "p_value": p_value[:, k],
+                "blocks": blocks,
+                "obs": obs,
+                "dof": dof,
+            },
+            index=index,
+        )
+        frames.append(frame)
+    return pd.concat(frames).reset_index()
+
+
+def build_effects(
+    data: pd.DataFrame,
+    metrics: Sequence[str],
+    linux_label: str,
+    correction: str = stratified.DEFAULT_CORRECTION,
+) -> pd.DataFrame:
+    frames = [fit_crossover(data, metric, linux_label) for metric in metrics]
+    frames = [frame for frame in frames if not frame.empty]
+    if not frames:
+        return pd.DataFrame()
+    effects = pd.concat(frames, ignore_index=True)
+    # Familia de comparacions: totes les cel·les d'una metrica i un efecte
+    effects["p_adjusted"] = np.nan
+    for _, idx in effects.groupby(["metric", "effect"], sort=False).groups.items():
+        effects.loc[idx, "p_adjusted"] = stratified.adjust_pvalues(effects.loc[idx, "p_value"], correction)
+    effects["significant"] = effects["p_adjusted"] < stratified.ALPHA
+    # En escala log l'efecte es una log-ratio: tambe es dona com a ratio
+    is_log = effects["scale"] == "log"
+    for col, src in (("ratio", "estimate"), ("ratio_ci_low", "ci95_low"), ("ratio_ci_high", "ci95_high")):
+        effects[col] = np.where(is_log, np.exp(effects[src]), np.nan)
+    effects["alg"] = effects["alg"].astype(str).str.strip()
+    return effects
+
+
+def prepare_runs(df: pd.DataFrame, linux_label: str, windows_label: str) -> pd.DataFrame:
+    metrics = [m for m in METRIC_SCALES if m in df.columns]
+    data = pairing.maybe_add_abba_leg(df, linux_label, windows_label)
+    data = pairing.collapse_iterations(data, metrics)
+    return data[data["abba_leg"].notna() & data["os"].isin([linux_label, windows_label])]
+
+
+def run_report(
+    df: pd.DataFrame,
+    output_dir: Path,
+    linux_label: str = "Linux",
+    windows_label: str = "Windows",
+    correction: str = stratified.DEFAULT_CORRECTION,
+    incremental: bool = True,
+) -> None:
+    required = ("os", *pairing.PAIR_KEYS, "run_order")
+    missing = [col for col in required if col not in df.columns]
+    if missing:
+        print(f"[error] Falten columnes al CSV: {missing} (el model de crossover necessita l'esquema ABBA)")
+        return
+    metrics = [m for m in METRIC_SCALES if m in df.columns]
+    if not metrics:
+        print(f"[error] Falten columnes al CSV: cap de {list(METRIC_SCALES)}")
+        return
+
+    output_dir.mkdir(parents=True, exist_ok=True)
+    manifest = OutputManifest(output_dir, {"tool": source_digest(__file__)}, incremental)
+
+    # Els blocs ABBA de cada nombre de fils son cel·les diferents; nomes s'ajusten els d'un fil
+    data = prepare_runs(pairing.single_thread(df), linux_label, windows_label)
+    inputs = data[[*required, "abba_leg", *metrics]]
+    if manifest.stale("crossover_effects.csv", inputs, {"correction": correction, "linux": linux_label}):
+        effects = build_effects(data, metrics, linux_label, correction)
+        if effects.empty:
+            print("[warn] No hi ha cap bloc ABBA per ajustar el model de crossover.")
+            manifest.save()
+            return
+        out_csv = output_dir / "crossover_effects.csv"
+        effects.to_csv(out_csv, index=False)
+        print(f"[save] {out_csv}")
+        manifest.done("crossover_effects.csv")
+        report_order_effects(effects)
+    manifest.save()
+
+
+def report_order_effects(effects: pd.DataFrame) -> None:
+    # Efectes d'ordre significatius (despres de la correccio): l'ABBA no els ha cancel·lat
+    flagged = effects[(effects["effect"] != "os") & effects["significant"]]
+    for _, row in flagged.iterrows():
+        size = f"ratio {row['ratio']:.4f}" if row["scale"] == "log" else f"{row['estimate']:+.4g}"
+        print(
+            f"[warn] {row['alg']} n={row['n']} {row['metric']}: efecte {row['effect']} "
+            f"significatiu ({size}, p ajustat={row['p_adjusted']:.3g})"
+        )
+
+
+def main() -> None:
+    args = parse_args()
+
+    if args.db is not None:
+        conn = database.connect_db(args.db)
+        df = database.read_runs(conn, DB_RUN_COLUMNS)
+    else:
+        if not args.input.exists():
+            raise FileNotFoundError(f"No s'ha trobat el fitxer d'entrada: {args.input}")
+        df = load_dataframe(args.input, use_cache=not args.no_cache)
+    df, _ = outliers.apply_outlier_stage(df, args.outliers, args.output_dir)
+
+    run_report(
+        df,
+        args.output_dir,
+        args.linux_label,
+        args.windows_label,
+        args.correction,
+        incremental=not args.force,
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,126 @@
+from __future__ import annotations
+
+import argparse
+import sys
+from pathlib import Path
+from typing import List, Tuple
+
+if __package__ in (None, ""):
+    sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from utils_python.common import database, store  # noqa: E402
+
+ROOT = Path(__file__).resolve().parents[1]
+DEFAULT_RUNS_DIR = ROOT / "runs"
+DEFAULT_STORE = ROOT / "resultats_store"
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        description=(
+            "Ingereix les campanyes de runs/ (data_linux.csv, data_windows.csv) en un magatzem "
+            "Parquet particionat per os/alg (o en una base de dades SQLite amb --db), nomes "
+            "les noves i sense duplicats."
+        )
+    )
+    parser.add_argument(
+        "--runs-dir",
+        type=Path,
+        default=DEFAULT_RUNS_DIR,
+        help="Carpeta amb les campanyes (una subcarpeta per campanya, p. ex. linux_<data>).",
+    )
+    parser.add_argument(
+        "--store",
+        "-s",
+        type=Path,
+        default=DEFAULT_STORE,
+        help="Carpeta del magatzem Parquet (es crea si no existeix).",
+    )
+    parser.add_argument(
+        "--csv",
+        nargs="+",
+        type=Path,
+        default=[],
+        metavar="CSV",
+        help="CSV addicionals a ingerir (p. ex. un resultats_tots.csv antic).",
+    )
+    parser.add_argument(
+        "--db",
+        type=Path,
+        default=None,
+        help=(
+            "Carrega les campanyes en aquesta base de dades SQLite en lloc del magatzem "
+            "Parquet (es crea si no existeix) i refresca la taula aparellada."
+        ),
+    )
+    parser.add_argument(
+        "--linux-label",
+        default="Linux",
+        help="Etiqueta de Linux a la columna os (per aparellar a --db).",
+    )
+    parser.add_argument(
+        "--windows-label",
+        default="Windows",
+        help="Etiqueta de Windows a la columna os (per aparellar a --db).",
+    )
+    return parser.parse_args()
+
+
+def find_campaigns(runs_dir: Path) -> List[Tuple[str, Path]]:
+    if not runs_dir.is_dir():
+        return []
+    return [
+        (str(csv_path.relative_to(runs_dir).as_posix()), csv_path)
+        for csv_path in sorted(runs_dir.glob("*/data_*.csv"))
+    ]
+
+
+def main() -> int:
+    args = parse_args()
+    if args.db is None and store.pq is None:
+        print("[error] Cal pyarrow per escriure el magatzem Parquet.")
+        return 2
+
+    sources = find_campaigns(args.runs_dir)
+    sources += [(csv_path.resolve().as_posix(), csv_path) for csv_path in args.csv]
+    if not sources:
+        print(f"[warn] No s'ha trobat cap campanya a {args.runs_dir}")
+        return 0
+
+    if args.db is not None:
+        args.db.parent.mkdir(parents=True, exist_ok=True)
+        conn = database.connect_db(args.db, create=True)
+        log = database.read_log(conn)
+        append = lambda df, _part: database.append_campaign(conn, df)  # noqa: E731
+        write_log = lambda log: database.write_log(conn, log)  # noqa: E731
+        target = args.db
+    else:
+        args.store.mkdir(parents=True, exist_ok=True)
+        log = store.read_log(args.store)
+        append = None
+        write_log = lambda log: store.write_log(args.store, log)  # noqa: E731
+        target = args.store
+
+    counts = {"ingested": 0, "seen": 0, "invalid": 0}
+    for campaign_id, csv_path in sources:
+        status, added = store.ingest_csv(args.store, csv_path, campaign_id, log, append)
+        counts[status] += 1
+        if status != "ingested":
+            continue
+        # Es desa despres de cada campanya: si una falla, les anteriors queden registrades
+        write_log(log)
+        print(f"[save] {campaign_id}: {added} files noves")
+
+    if args.db is not None:
+        database.ensure_paired(conn, args.linux_label, args.windows_label)
+        conn.close()
+
+    print(
+        f"Campanyes: {counts['ingested']} ingerides, {counts['seen']} ja vistes, "
+        f"{counts['invalid']} amb errors. Desti: {target}"
+    )
+    return 1 if counts["invalid"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1 @@
+"Comparacio d'una campanya nova amb una campanya de referencia (deteccio de regressions)."
@@ -0,0 +1,238 @@
+from __future__ import annotations
+
+import argparse
+import sys
+from pathlib import Path
+from typing import List
+
+import numpy as np
+import pandas as pd
+
+if __package__ in (None, ""):
+    sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
+
+from utils_python.agreement_plots.infer_dlog_stats import compute_dlog_stats  # noqa: E402
+from utils_python.common import database, outliers, pairing  # noqa: E402
+from utils_python.common.loader import load_dataframe  # noqa: E402
+
+DEFAULT_OUTPUT_DIR = Path(__file__).resolve().parents[1] / "sortides" / "regression"
+GROUP_KEYS = ["os", "alg", "n"]
+DB_SUFFIXES = (".sqlite", ".sqlite3", ".db")
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        description=(
+            "Compara una campanya candidata amb una de referencia (p. ex. dos runs/linux_*): "
+            "aparella per (alg, n, seed) i detecta les (alg, n) que s'han alentit."
+        )
+    )
+    parser.add_argument(
+        "--baseline",
+        "-b",
+        type=Path,
+        required=True,
+        help=(
+            "CSV o carpeta de la campanya de referencia (es llegeixen tots els *.csv), o base de "
+            "dades SQLite (ingest_runs.py --db) amb nomes aquesta campanya."
+        ),
+    )
+    parser.add_argument(
+        "--candidate",
+        "-c",
+        type=Path,
+        required=True,
+        help="CSV, carpeta o base de dades SQLite de la campanya nova.",
+    )
+    parser.add_argument(
+        "--output-dir",
+        "-o",
+        type=Path,
+        default=DEFAULT_OUTPUT_DIR,
+        help="Carpeta on es desa regressions.csv.",
+    )
+    parser.add_argument(
+        "--metric",
+        default="wall_ms",
+        help="Metrica a comparar (per defecte wall_ms).",
+    )
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=0.05,
+        help="Alentiment minim per considerar regressio (0.05 = candidat un 5%% mes lent).",
+    )
+    parser.add_argument(
+        "--alpha",
+        type=float,
+        default=0.05,
+        help="Nivell de significacio del test t sobre Dlog.",
+    )
+    parser.add_argument(
+        "--outliers",
+        choices=outliers.OUTLIER_METHODS,
+        default=None,
+        help=(
+            "Exclou els outliers de wall_ms per (os, alg, n) abans de l'analisi: mad "
+            "(|x - mediana| > 3 MAD), iqr (fora de Q1 - 1.5 IQR, Q3 + 1.5 IQR) o both. "
+            "S'aplica a cada campanya i es desa outliers_exclosos_<baseline|candidate>.csv."
+        ),
+    )
+    parser.add_argument(
+        "--no-cache",
+        action="store_true",
+        help="No llegeix ni escriu la cache columnar (.feather) al costat dels CSV.",
+    )
+    return parser.parse_args()
+
+
+def load_campaign(path: Path, use_cache: bool = True, metric: str = "wall_ms") -> pd.DataFrame:
+    if not path.exists():
+        raise FileNotFoundError(f"No s'ha trobat la campanya: {path}")
+    if path.is_file() and path.suffix in DB_SUFFIXES:
+        # La taula runs no guarda de quina campanya ve cada fila: una base de dades per campanya
+        columns = ("os", *pairing.PAIR_KEYS, "workers", "run_order", "run_id", "iter", metric, *outliers.OUTLIER_COLUMNS)
+        return database.read_runs(database.connect_db(path), list(dict.fromkeys(columns)))
+    paths = sorted(path.rglob("*.csv")) if path.is_dir() else [path]
+    frames = [load_dataframe(csv_path, use_cache=use_cache) for csv_path in paths]
+    frames = [frame for frame in frames if not frame.empty]
+    if not frames:
+        print(f"[warn] Cap CSV amb dades a {path}")
+        return pd.DataFrame()
+    return pd.concat(frames, ignore_index=True) if len(frames) > 1 else frames[0]
+
+
+def pair_campaigns(baseline: pd.DataFrame, candidate: pd.DataFrame, metric: str) -> pd.DataFrame:
+    """Aparella execucions per (os, alg, n, seed[, run_order]) i calcula Dlog = log(cand/base).
+
+    Si una clau es repeteix dins d'una campanya (p. ex. iteracions internes o CSV
+    concatenats), es fa servir la mediana de la clau.
+    """
+    keys = ["os", "alg", "n", "seed"]
+    if "run_order" in baseline.columns and "run_order" in candidate.columns:
+        keys.append("run_order")
+    for df in (baseline, candidate):
+        if not pairing.has_columns(df, (*keys, metric)):
+            return pd.DataFrame()
+
+    both = pd.concat(
+        [baseline[keys + [metric]], candidate[keys + [metric]]], ignore_index=True
+    )
+    for col in ("os", "alg"):
+        both[col] = both[col].astype(str).str.strip()
+    is_candidate = np.arange(len(both)) >= len(baseline)
+
+    # Clau entera densa comuna a les dues campanyes
+    key = both.groupby(keys, sort=False, dropna=False).ngroup().to_numpy()
+    n_keys = int(key.max()) + 1 if len(key) else 0
+    values = both[metric].to_numpy(dtype=np.float64)
+
+    def medians(mask: np.ndarray):
+        per_key = pd.Series(values[mask]).groupby(key[mask], sort=False).median()
+        return per_key.index.to_numpy(), per_key.to_numpy()
+
+    key_base, value_base = medians(~is_candidate)
+    key_cand, value_cand = medians(is_candidate)
+    idx_cand, idx_base = pairing.join_dense(key_cand, key_base, n_keys)
+
+    _, first_row = np.unique(key, return_index=True)
+    labels = both.iloc[first_row[key_cand[idx_cand]]][GROUP_KEYS].reset_index(drop=True)
+    base = value_base[idx_base]
+    cand = value_cand[idx_cand]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        dlog = np.where((base > 0) & (cand > 0), np.log(cand) - np.log(base), np.nan)
+    return labels.assign(**{f"{metric}_base": base, f"{metric}_cand": cand, "Dlog": dlog})
+
+
+def build_regression_table(
+    paired: pd.DataFrame, threshold: float, alpha: float
+) -> pd.DataFrame:
+    rows: List[dict] = []
+    for (os_name, alg, n), sub in paired.groupby(GROUP_KEYS, sort=False):
+        dlog = sub["Dlog"].dropna().to_numpy()
+        stats_dict = compute_dlog_stats(dlog)
+        if stats_dict:
+            n_pairs = stats_dict.pop("n")
+            rows.append({"os": os_name, "alg": alg, "n": n, "n_pairs": n_pairs, **stats_dict})
+    if not rows:
+        return pd.DataFrame()
+
+    table = pd.DataFrame(rows)
+    significant = table["p_value"] < alpha
+    table["status"] = np.select(
+        [
+            significant & (table["ratio"] >= 1 + threshold),
+            significant & (table["ratio"] <= 1 / (1 + threshold)),
+        ],
+        ["regression", "improvement"],
+        default="ok",
+    )
+    # Primer les regressions, ordenades per alentiment
+    return table.sort_values("ratio", ascending=False, kind="stable").reset_index(drop=True)
+
+
+def run_report(
+    baseline: pd.DataFrame,
+    candidate: pd.DataFrame,
+    output_dir: Path,
+    metric: str = "wall_ms",
+    threshold: float = 0.05,
+    alpha: float = 0.05,
+) -> pd.DataFrame:
+    # Les dues campanyes s'aparellen per (alg, n, seed): nomes les execucions d'un fil
+    baseline = pairing.collapse_iterations(pairing.single_thread(baseline), (metric,))
+    candidate = pairing.collapse_iterations(pairing.single_thread(candidate), (metric,))
+    paired = pair_campaigns(baseline, candidate, metric)
+    if paired.empty:
+        print("[warn] Cap execucio comuna (alg, n, seed) entre les dues campanyes.")
+        return pd.DataFrame()
+
+    table = build_regression_table(paired, threshold, alpha)
+    if table.empty:
+        print("[warn] No s'ha pogut calcular cap estadistic (potser n<2).")
+        return table
+
+    output_dir.mkdir(parents=True, exist_ok=True)
+    out_csv = output_dir / "regressions.csv"
+    table.to_csv(out_csv, index=False)
+    print(f"[save] {out_csv}")
+
+    for _, row in table[table["status"] == "regression"].iterrows():
+        print(
+            f"[regressio] {row['os']} {row['alg']} n={row['n']}: x{row['ratio']:.3f} "
+            f"(IC95% {row['ratio_ci_low']:.3f}-{row['ratio_ci_high']:.3f}, p={row['p_value']:.2g})"
+        )
+    return table
+
+
+def main() -> int:
+    args = parse_args()
+
+    use_cache = not args.no_cache
+    table = run_report(
+        outliers.apply_outlier_stage(
+            load_campaign(args.baseline, use_cache, args.metric),
+            args.outliers,
+            args.output_dir,
+            report_name="outliers_exclosos_baseline.csv",
+        )[0],
+        outliers.apply_outlier_stage(
+            load_campaign(args.candidate, use_cache, args.metric),
+            args.outliers,
+            args.output_dir,
+            report_name="outliers_exclosos_candidate.csv",
+        )[0],
+        args.output_dir,
+        args.metric,
+        args.threshold,
+        args.alpha,
+    )
+    if table.empty:
+        return 2
+    regressions = int((table["status"] == "regression").sum())
+    print(f"{regressions} regressions de {len(table)} combinacions (os, alg, n)")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,6 +1,7 @@
 from __future__ import annotations
 
 import argparse
+import sys
 from pathlib import Path
 from typing import Iterable, List, Tuple
 
@@ -10,12 +11,25 @@ import pandas as pd
 import seaborn as sns
 from scipy.stats import t
 
+if __package__ in (None, ""):
+    sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
+
+from utils_python.common import database, outliers, pairing, resampling, sketch, stratified  # noqa: E402
+from utils_python.common.loader import load_dataframe  # noqa: E402
+from utils_python.common.manifest import OutputManifest, source_digest  # noqa: E402
+from utils_python.common.timeline import find_timelines, load_timelines  # noqa: E402
+
 DEFAULT_INPUT = Path(__file__).resolve().parents[2] / "resultats_tots.csv"
 DEFAULT_OUTPUT_DIR = Path(__file__).resolve().parents[1] / "sortides" / "rss_stats"
+# Columnes de paired_runs que fa servir l'informe (amb --db)
+DB_PAIRED_COLUMNS = (*pairing.PAIR_KEYS, "workers", "abba_leg", "rss_peak_mib_lin", "rss_peak_mib_win", "Drss")
+DB_RUN_COLUMNS = ("os", "pair_id", "alg", "n", "workers", "rss_peak_mib")
+
 
-plt.rcParams["figure.figsize"] = (6, 4)
-plt.rcParams["figure.dpi"] = 150
-sns.set_theme(style="whitegrid")
+def configure_plots() -> None:
+    plt.rcParams["figure.figsize"] = (6, 4)
+    plt.rcParams["figure.dpi"] = 150
+    sns.set_theme(style="whitegrid")
 
 
 def parse_args() -> argparse.Namespace:
@@ -32,6 +46,12 @@ def parse_args() -> argparse.Namespace:
         default=DEFAULT_INPUT,
         help="CSV amb totes les execucions (Windows + Linux).",
     )
+    parser.add_argument(
+        "--db",
+        type=Path,
+        default=None,
+        help="Base de dades SQLite (ingest_runs.py --db) en lloc de --input: llegeix la taula paired_runs.",
+    )
     parser.add_argument(
         "--output-dir",
         "-o",
@@ -54,6 +74,75 @@ def parse_args() -> argparse.Namespace:
         action="store_true",
         help="Si s'indica, desa també el detall per parella amb Drss.",
     )
+    parser.add_argument(
+        "--timelines",
+        nargs="+",
+        type=Path,
+        default=[],
+        metavar="DIR",
+        help=(
+            "Carpetes amb linies de temps RSS/CPU (.rsstl) de l'orquestrador; "
+            "afegeix RSS ponderada pel temps, pendent i grafics per execucio."
+        ),
+    )
+    parser.add_argument(
+        "--resamples",
+        type=int,
+        default=resampling.DEFAULT_RESAMPLES,
+        help="Remostres del bootstrap BCa i del test de permutacio per canvi de signe (0 = no es calculen).",
+    )
+    parser.add_argument(
+        "--seed",
+        type=int,
+        default=resampling.DEFAULT_SEED,
+        help="Llavor del bootstrap i de les permutacions.",
+    )
+    parser.add_argument(
+        "--jobs",
+        "-j",
+        type=int,
+        default=1,
+        help="Processos per remostrejar els algorismes en paral·lel (1 = en serie).",
+    )
+    parser.add_argument(
+        "--force",
+        action="store_true",
+        help="Regenera totes les sortides encara que les dades no hagin canviat (ignora manifest.json).",
+    )
+    parser.add_argument(
+        "--exact",
+        action="store_true",
+        help="Dibuixa els boxplots amb totes les dades (seaborn) en lloc dels sketches de quantils.",
+    )
+    parser.add_argument(
+        "--per-n",
+        action="store_true",
+        help=(
+            "Desa tambe la inferencia per cada cel·la (alg, n) (drss_stats_per_n.csv), "
+            "amb els p-valors corregits per comparacions multiples."
+        ),
+    )
+    parser.add_argument(
+        "--correction",
+        choices=stratified.CORRECTIONS,
+        default=stratified.DEFAULT_CORRECTION,
+        help="Correccio dels p-valors entre cel·les amb --per-n: holm (FWER) o bh (Benjamini-Hochberg, FDR).",
+    )
+    parser.add_argument(
+        "--outliers",
+        choices=outliers.OUTLIER_METHODS,
+        default=None,
+        help=(
+            "Exclou els outliers de wall_ms per (os, alg, n) abans de l'analisi: mad "
+            "(|x - mediana| > 3 MAD), iqr (fora de Q1 - 1.5 IQR, Q3 + 1.5 IQR) o both. "
+            "Es treu tota la parella ABBA i es desa outliers_exclosos.csv."
+        ),
+    )
+    parser.add_argument(
+        "--no-cache",
+        action="store_true",
+        help="No llegeix ni escriu la cache columnar (.feather) al costat del CSV.",
+    )
     return parser.parse_args()
 
 
@@ -65,33 +154,6 @@ def has_columns(df: pd.DataFrame, required: Iterable[str]) -> bool:
     return True
 
 
-def load_dataframe(csv_path: Path) -> pd.DataFrame:
-    df = pd.read_csv(csv_path, skipinitialspace=True)
-    df.columns = [col.strip() for col in df.columns]
-
-    for col in df.columns:
-        if df[col].dtype == object:
-            df[col] = df[col].astype(str).str.strip()
-    return df
-
-
-def maybe_add_abba_leg(df: pd.DataFrame, linux_label: str, windows_label: str) -> pd.DataFrame:
-    if "run_order" not in df.columns:
-        return df
-
-    df = df.copy()
-    df["abba_leg"] = None
-    linux_map = {1: "A", 4: "B"}
-    windows_map = {2: "A", 3: "B"}
-
-    is_linux = df["os"] == linux_label
-    is_windows = df["os"] == windows_label
-
-    df.loc[is_linux, "abba_leg"] = df.loc[is_linux, "run_order"].map(linux_map)
-    df.loc[is_windows, "abba_leg"] = df.loc[is_windows, "run_order"].map(windows_map)
-    return df
-
-
 def compute_ic95(series: pd.Series) -> Tuple[float, float] | None:
     n = len(series)
     if n < 2:
@@ -110,7 +172,7 @@ def build_table6_rss(df: pd.DataFrame) -> pd.DataFrame:
         return pd.DataFrame()
 
     return (
-        df.groupby(["os", "alg"])["rss_peak_mib"]
+        df.groupby(["os", "alg"], observed=True)["rss_peak_mib"]
         .agg(["mean", "std", "min", "max"])
         .reset_index()
         .rename(
@@ -124,18 +186,37 @@ def build_table6_rss(df: pd.DataFrame) -> pd.DataFrame:
     )
 
 
-def save_figura10_boxplot_rss_per_os(df: pd.DataFrame, output_dir: Path) -> Path | None:
+def draw_sketched_boxplot(df: pd.DataFrame, by: str, column: str, path: Path) -> None:
+    # Quartils d'un sketch per grup i nomes els outliers reals com a punts; el sketch
+    # es desa al costat de la figura
+    groups = {
+        str(label): values.to_numpy()
+        for label, values in df.groupby(by, observed=True, sort=True)[column]
+    }
+    sketches, stats = sketch.sketch_groups(groups)
+    colors = sns.color_palette(n_colors=len(stats), desat=0.75)
+    sketch.draw_boxplot(plt.gca(), stats, colors)
+    sketch.save_sketches(sketch.sketch_path(path), sketches)
+
+
+def save_figura10_boxplot_rss_per_os(
+    df: pd.DataFrame, output_dir: Path, exact: bool = False
+) -> Path | None:
     required = ("os", "rss_peak_mib")
     if not has_columns(df, required):
         return None
 
+    path = output_dir / "figura10_boxplot_rss_per_os.png"
     plt.figure()
-    sns.boxplot(data=df, x="os", y="rss_peak_mib")
+    if exact:
+        sns.boxplot(data=df, x="os", y="rss_peak_mib")
+        sketch.sketch_path(path).unlink(missing_ok=True)
+    else:
+        draw_sketched_boxplot(df, "os", "rss_peak_mib", path)
     plt.ylabel("Pic de memòria RSS (MiB)")
     plt.xlabel("Sistema operatiu")
     plt.title("Distribució del pic de memòria per sistema operatiu")
     plt.tight_layout()
-    path = output_dir / "figura10_boxplot_rss_per_os.png"
     plt.savefig(path)
     plt.close()
     print(f"[save] {path}")
@@ -143,31 +224,7 @@ def save_figura10_boxplot_rss_per_os(df: pd.DataFrame, output_dir: Path) -> Path
 
 
 def prepare_paired_df(df: pd.DataFrame, linux_label: str, windows_label: str) -> pd.DataFrame:
-    required_cols = ("pair_id", "alg", "n", "seed", "os", "rss_peak_mib")
-    if not has_columns(df, required_cols):
-        return pd.DataFrame()
-
-    df = maybe_add_abba_leg(df, linux_label, windows_label)
-
-    merge_keys = ["pair_id", "alg", "n", "seed"]
-    if "abba_leg" in df.columns:
-        merge_keys.append("abba_leg")
-
-    base_cols = [*merge_keys, "rss_peak_mib"]
-    lin = df[df["os"] == linux_label][base_cols].rename(columns={"rss_peak_mib": "rss_peak_mib_lin"})
-    win = df[df["os"] == windows_label][base_cols].rename(columns={"rss_peak_mib": "rss_peak_mib_win"})
-
-    if "abba_leg" in merge_keys:
-        lin = lin.dropna(subset=["abba_leg"])
-        win = win.dropna(subset=["abba_leg"])
-
-    merged = lin.merge(win, on=merge_keys, suffixes=("_lin", "_win"))
-    if merged.empty:
-        print("[warn] No s'ha trobat cap parell Linux/Windows amb els criteris indicats.")
-        return merged
-
-    merged["Drss"] = merged["rss_peak_mib_lin"] - merged["rss_peak_mib_win"]
-    return merged
+    return pairing.prepare_paired_df(df, linux_label, windows_label, ("rss_peak_mib",))
 
 
 def summarize_drss(paired: pd.DataFrame) -> pd.DataFrame:
@@ -191,12 +248,29 @@ def summarize_drss(paired: pd.DataFrame) -> pd.DataFrame:
         )
 
     add_row("ALL", paired)
-    for alg in paired["alg"].dropna().unique():
-        add_row(str(alg).strip(), paired[paired["alg"] == alg])
+    for alg, subset in paired.groupby("alg", observed=True, sort=False):
+        add_row(str(alg).strip(), subset)
 
     return pd.DataFrame(rows)
 
 
+def summarize_drss_per_n(paired: pd.DataFrame, correction: str = stratified.DEFAULT_CORRECTION) -> pd.DataFrame:
+    summary = stratified.cell_stats(paired, ["Drss"], correction=correction)
+    summary = summary.drop(columns="metric").rename(columns=stratified.summary_columns("drss", "_mib"))
+    summary["alg"] = summary["alg"].astype(str).str.strip()
+    return summary
+
+
+def add_resampling_columns(
+    summary: pd.DataFrame, paired: pd.DataFrame, resamples: int, seed: int, jobs: int = 1
+) -> pd.DataFrame:
+    groups = resampling.groups_by_alg(paired, "Drss")
+    extra = pd.DataFrame.from_dict(
+        resampling.resample_groups(groups, resamples, seed, jobs), orient="index"
+    ).rename(columns={"bca_ci95_low": "bca_ci95_low_mib", "bca_ci95_high": "bca_ci95_high_mib"})
+    return summary.join(extra, on="alg")
+
+
 def save_figura11_boxplot_drss_per_alg(paired: pd.DataFrame, output_dir: Path) -> Path:
     plt.figure()
     sns.boxplot(data=paired, x="alg", y="Drss")
@@ -212,48 +286,203 @@ def save_figura11_boxplot_drss_per_alg(paired: pd.DataFrame, output_dir: Path) -
     return path
 
 
-def maybe_save_paired(paired: pd.DataFrame, output_dir: Path, enabled: bool) -> None:
-    if not enabled:
-        return
-    paired_path = output_dir / "drss_paired.csv"
+def paired_columns(paired: pd.DataFrame) -> List[str]:
     cols = ["pair_id", "alg", "n", "seed"]
     if "abba_leg" in paired.columns:
         cols.append("abba_leg")
     cols += ["rss_peak_mib_lin", "rss_peak_mib_win", "Drss"]
-    paired.to_csv(paired_path, index=False, columns=cols)
-    print(f"[save] {paired_path}")
+    return cols
 
 
-def main() -> None:
-    args = parse_args()
+def maybe_save_paired(paired: pd.DataFrame, output_dir: Path, enabled: bool) -> None:
+    if not enabled:
+        return
+    paired_path = output_dir / "drss_paired.csv"
+    paired.to_csv(paired_path, index=False, columns=paired_columns(paired))
+    print(f"[save] {paired_path}")
 
-    if not args.input.exists():
-        raise FileNotFoundError(f"No s'ha trobat el fitxer d'entrada: {args.input}")
 
-    output_dir = args.output_dir
-    output_dir.mkdir(parents=True, exist_ok=True)
+def summarize_timeline_runs(runs: pd.DataFrame) -> pd.DataFrame:
+    return (
+        runs.groupby(["os", "alg", "n", "threads"], observed=True)
+        .agg(
+            n_runs=("run_id", "size"),
+            mean_twa_rss_mib=("twa_rss_mib", "mean"),
+            sd_twa_rss_mib=("twa_rss_mib", "std"),
+            mean_peak_rss_mib=("peak_rss_mib", "mean"),
+            mean_rss_slope_mib_s=("rss_slope_mib_s", "mean"),
+            mean_cpu_pct=("cpu_pct_mean", "mean"),
+        )
+        .reset_index()
+    )
+
 
-    df = load_dataframe(args.input)
+def save_timeline_figure(
+    alg: str, runs: pd.DataFrame, series: List[np.ndarray], output_dir: Path
+) -> Path:
+    palette = dict(zip(sorted(runs["os"].unique()), sns.color_palette(n_colors=runs["os"].nunique())))
+    plt.figure()
+    for idx, row in runs.iterrows():
+        samples = series[idx]
+        t_ms = (samples["t_us"].astype(np.float64) - samples["t_us"][0]) / 1e3
+        plt.plot(t_ms, samples["rss_kib"] / 1024.0, color=palette[row["os"]], alpha=0.4, lw=0.8)
+    for label, color in palette.items():
+        plt.plot([], [], color=color, label=label)
+    plt.legend(title="Sistema operatiu")
+    plt.xlabel("Temps des de l'inici (ms)")
+    plt.ylabel("RSS (MiB)")
+    plt.title(f"Evolució de la memòria RSS per execució ({alg})")
+    plt.tight_layout()
+    path = output_dir / f"rss_timeline_{alg}.png"
+    plt.savefig(path)
+    plt.close()
+    print(f"[save] {path}")
+    return path
 
-    table6 = build_table6_rss(df)
-    if not table6.empty:
-        out_table6 = output_dir / "taula6_rss_per_os_alg.csv"
-        table6.to_csv(out_table6, index=False)
-        print(f"[save] {out_table6}")
 
-    save_figura10_boxplot_rss_per_os(df, output_dir)
+def report_timelines(
+    timeline_dirs: Iterable[Path], output_dir: Path, manifest: OutputManifest
+) -> None:
+    paths = find_timelines(timeline_dirs)
+    if not paths:
+        print("[omit] No s'han trobat linies de temps (.rsstl) a les carpetes indicades.")
+        return
+    runs, series = load_timelines(paths)
+    if runs.empty:
+        return
 
-    paired = prepare_paired_df(df, args.linux_label, args.windows_label)
+    if manifest.stale("rss_timeline_runs.csv", runs):
+        out_runs = output_dir / "rss_timeline_runs.csv"
+        runs.to_csv(out_runs, index=False)
+        print(f"[save] {out_runs}")
+        manifest.done("rss_timeline_runs.csv")
+
+    if manifest.stale("rss_timeline_stats.csv", runs):
+        out_stats = output_dir / "rss_timeline_stats.csv"
+        summarize_timeline_runs(runs).to_csv(out_stats, index=False)
+        print(f"[save] {out_stats}")
+        manifest.done("rss_timeline_stats.csv")
+
+    # Les figures, com la resta de l'informe, nomes amb les execucions d'un fil (l'index
+    # de `runs` es conserva perque save_timeline_figure hi troba les mostres)
+    for alg, subset in runs[runs["threads"] == 1].groupby("alg"):
+        name = f"rss_timeline_{alg}.png"
+        if manifest.stale(name, subset):
+            save_timeline_figure(str(alg), subset, series, output_dir)
+            manifest.done(name)
+
+
+def run_report(
+    df: pd.DataFrame,
+    output_dir: Path,
+    linux_label: str = "Linux",
+    windows_label: str = "Windows",
+    save_paired: bool = False,
+    paired: pd.DataFrame | None = None,
+    incremental: bool = True,
+    timeline_dirs: Iterable[Path] = (),
+    resamples: int = resampling.DEFAULT_RESAMPLES,
+    seed: int = resampling.DEFAULT_SEED,
+    jobs: int = 1,
+    exact: bool = False,
+    per_n: bool = False,
+    correction: str = stratified.DEFAULT_CORRECTION,
+) -> None:
+    output_dir.mkdir(parents=True, exist_ok=True)
+    manifest = OutputManifest(output_dir, {"tool": source_digest(__file__)}, incremental)
+
+    # Taules i Drss amb les execucions d'un fil; l'escombrat de fils el tracta run_analysis
+    df = pairing.single_thread(df)
+    rss_cols = [col for col in ("os", "alg", "rss_peak_mib") if col in df.columns]
+    if manifest.stale("taula6_rss_per_os_alg.csv", df[rss_cols]):
+        table6 = build_table6_rss(df)
+        if not table6.empty:
+            out_table6 = output_dir / "taula6_rss_per_os_alg.csv"
+            table6.to_csv(out_table6, index=False)
+            print(f"[save] {out_table6}")
+            manifest.done("taula6_rss_per_os_alg.csv")
+
+    rss_inputs = df[[c for c in rss_cols if c != "alg"]]
+    if manifest.stale("figura10_boxplot_rss_per_os.png", rss_inputs, {"exact": exact}):
+        if save_figura10_boxplot_rss_per_os(df, output_dir, exact) is not None:
+            manifest.done("figura10_boxplot_rss_per_os.png")
+
+    if timeline_dirs:
+        report_timelines(timeline_dirs, output_dir, manifest)
+
+    if paired is None or (not paired.empty and "Drss" not in paired.columns):
+        paired = prepare_paired_df(df, linux_label, windows_label)
+    paired = pairing.single_thread(paired)
     if paired.empty:
+        manifest.save()
         return
 
-    drss_stats = summarize_drss(paired)
-    out_drss = output_dir / "drss_stats.csv"
-    drss_stats.to_csv(out_drss, index=False)
-    print(f"[save] {out_drss}")
+    drss = paired[["alg", "Drss"]]
+    if manifest.stale("drss_stats.csv", drss, {"resamples": resamples, "seed": seed}):
+        drss_stats = summarize_drss(paired)
+        if resamples > 0:
+            drss_stats = add_resampling_columns(drss_stats, paired, resamples, seed, jobs)
+        out_drss = output_dir / "drss_stats.csv"
+        drss_stats.to_csv(out_drss, index=False)
+        print(f"[save] {out_drss}")
+        manifest.done("drss_stats.csv")
+
+    if per_n and manifest.stale("drss_stats_per_n.csv", paired[["alg", "n", "Drss"]], {"correction": correction}):
+        per_n_csv = output_dir / "drss_stats_per_n.csv"
+        summarize_drss_per_n(paired, correction).to_csv(per_n_csv, index=False)
+        print(f"[save] {per_n_csv}")
+        manifest.done("drss_stats_per_n.csv")
+
+    if manifest.stale("figura11_boxplot_drss_per_alg.png", drss):
+        save_figura11_boxplot_drss_per_alg(paired, output_dir)
+        manifest.done("figura11_boxplot_drss_per_alg.png")
+
+    if save_paired and manifest.stale("drss_paired.csv", paired[paired_columns(paired)]):
+        maybe_save_paired(paired, output_dir, save_paired)
+        manifest.done("drss_paired.csv")
+    manifest.save()
 
-    save_figura11_boxplot_drss_per_alg(paired, output_dir)
-    maybe_save_paired(paired, output_dir, args.save_paired)
+
+def main() -> None:
+    args = parse_args()
+
+    paired = None
+    if args.db is not None:
+        conn = database.connect_db(args.db)
+        database.ensure_paired(conn, args.linux_label, args.windows_label)
+        if args.outliers:
+            # Les files de runs tambe s'han de filtrar (figura 10): es llegeixen amb les claus de parella
+            columns = list(dict.fromkeys((*DB_PAIRED_COLUMNS, *pairing.PAIR_KEYS)))
+            paired = database.read_paired(conn, columns, single_thread=True)
+            df = database.read_runs(conn, list(dict.fromkeys((*DB_RUN_COLUMNS, *outliers.OUTLIER_COLUMNS))))
+            df, report = outliers.apply_outlier_stage(df, args.outliers, args.output_dir)
+            paired = outliers.drop_pairs(paired, report)[list(DB_PAIRED_COLUMNS)]
+        else:
+            paired = database.read_paired(conn, DB_PAIRED_COLUMNS, single_thread=True)
+            df = database.read_runs(conn, DB_RUN_COLUMNS)
+    else:
+        if not args.input.exists():
+            raise FileNotFoundError(f"No s'ha trobat el fitxer d'entrada: {args.input}")
+        df = load_dataframe(args.input, use_cache=not args.no_cache)
+        df, _ = outliers.apply_outlier_stage(df, args.outliers, args.output_dir)
+
+    configure_plots()
+    run_report(
+        df,
+        args.output_dir,
+        args.linux_label,
+        args.windows_label,
+        args.save_paired,
+        paired=paired,
+        incremental=not args.force,
+        timeline_dirs=args.timelines,
+        resamples=args.resamples,
+        seed=args.seed,
+        jobs=args.jobs,
+        exact=args.exact,
+        per_n=args.per_n,
+        correction=args.correction,
+    )
 
 
 if __name__ == "__main__":
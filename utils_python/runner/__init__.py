@@ -0,0 +1 @@
+"Orquestrador de les campanyes de mesura (substitut en Python de run_linux.sh)."
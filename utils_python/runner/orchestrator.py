@@ -0,0 +1,1081 @@
+from __future__ import annotations
+
+import argparse
+import csv
+import json
+import math
+import os
+import platform
+import queue
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from dataclasses import dataclass
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+
+from scipy import stats
+
+if __package__ in (None, ""):
+    sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
+
+from utils_python.common import cache  # noqa: E402
+from utils_python.common.timeline import Sample, timeline_name, write_timeline  # noqa: E402
+
+ROOT = Path(__file__).resolve().parents[2]
+DEFAULT_CONFIG = ROOT / "config.json"
+
+# Comptadors de perf_event que print_json afegeix a Linux (si el kernel els dona)
+PERF_COUNTERS = (
+    "cycles",
+    "instructions",
+    "llc_misses",
+    "branch_misses",
+    "context_switches",
+    "page_faults",
+)
+
+# Mateix esquema que run_linux.sh / run_windows.ps1
+CSV_COLUMNS = [
+    "pair_id",
+    "alg",
+    "n",
+    "seed",
+    "os",
+    "run_order",
+    "run_id",
+    "wall_ms",
+    "cpu_user_ms",
+    "cpu_sys_ms",
+    "cpu_pct_avg",
+    "threads",
+    "rss_peak_mib",
+    "temp_c",
+    "compiler",
+    "flags",
+    "os_name",
+    "kernel",
+    "timestamp",
+    "cpu_core",
+    "cooldown_s",
+    "iter",
+    *PERF_COUNTERS,
+    "workers",
+]
+FLAGS = "-O3 -march=native -DNDEBUG"
+WARMUP_RUNS = 5
+COOLDOWN_BAND_C = 2.0
+COOLDOWN_POLL_S = 1.0
+IDLE_SAMPLES = 5
+CSV_BUFFER_BYTES = 1 << 16
+PARTNER_REPS_FILE = "partner_reps.json"
+
+
+@dataclass(frozen=True)
+class OsProfile:
+    label: str
+    orders: Tuple[int, int]  # (A, B) dins l'esquema ABBA
+    cooldown_s: float
+    csv_name: str
+    run_dir_prefix: str
+    exe_suffix: str
+
+
+LINUX = OsProfile("Linux", (1, 4), 60.0, "data_linux.csv", "linux", "")
+WINDOWS = OsProfile("Windows", (2, 3), 10.0, "data_windows.csv", "windows", ".exe")
+
+
+def current_profile() -> OsProfile:
+    return WINDOWS if sys.platform.startswith("win") else LINUX
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        description=(
+            "Orquestrador ABBA en Python: llegeix config.json, executa els binaris, "
+            "parseja el JSON de print_json en proces i escriu el CSV amb el mateix esquema "
+            "que run_linux.sh / run_windows.ps1."
+        )
+    )
+    parser.add_argument(
+        "--config",
+        "-c",
+        type=Path,
+        default=DEFAULT_CONFIG,
+        help="Fitxer de configuracio (algorismes, ns, reps, seed_master).",
+    )
+    parser.add_argument(
+        "--build-dir",
+        type=Path,
+        default=ROOT / "build",
+        help="Carpeta amb els binaris compilats.",
+    )
+    parser.add_argument(
+        "--runs-dir",
+        type=Path,
+        default=ROOT / "runs",
+        help="Carpeta on es crea runs/<os>_YYYYMMDD_HHMMSS/.",
+    )
+    parser.add_argument(
+        "--cooldown",
+        type=float,
+        default=None,
+        help=(
+            "Espera maxima en segons abans de cada execucio (per defecte `cooldown.max_wait_s` "
+            "de config.json, o 60 a Linux i 10 a Windows)."
+        ),
+    )
+    parser.add_argument(
+        "--warmup-runs",
+        type=int,
+        default=WARMUP_RUNS,
+        help="Execucions de warm-up (no registrades) abans de cada mesura.",
+    )
+    parser.add_argument(
+        "--concurrency",
+        type=int,
+        default=None,
+        help="Mesures simultanies, cadascuna fixada al seu nucli (per defecte, `concurrency` de config.json o 1).",
+    )
+    parser.add_argument(
+        "--inner-reps",
+        type=int,
+        default=None,
+        help=(
+            "Iteracions cronometrades dins d'un sol proces per mesura (per defecte `inner_reps` "
+            "de config.json o 0 = un proces per mesura). Els warm-ups es fan dins el mateix proces."
+        ),
+    )
+    parser.add_argument(
+        "--timeline-ms",
+        type=float,
+        default=None,
+        help=(
+            "Mostreja RSS i CPU del proces mesurat cada N ms i desa una linia de temps binaria "
+            "per execucio a <sortida>/timelines (per defecte `timeline` de config.json, desactivat)."
+        ),
+    )
+    parser.add_argument(
+        "--fixed-reps",
+        action="store_true",
+        help="Ignora `adaptive_reps` de config.json i fa sempre `reps` repeticions.",
+    )
+    parser.add_argument(
+        "--partner",
+        type=Path,
+        default=None,
+        help=(
+            "CSV de la campanya de l'altre OS (mateix config.json). Cada (alg, n) fa com a minim les "
+            "repeticions que hi te l'altre OS, perque cap bloc ABBA quedi sense parella, i la regla "
+            "adaptativa mira l'IC de la diferencia aparellada entre els dos OS; si en demana mes, es "
+            "desa <sortida>/partner_reps.json amb les que li falten."
+        ),
+    )
+    parser.add_argument(
+        "--only-reps",
+        type=Path,
+        default=None,
+        help=(
+            "partner_reps.json d'una campanya amb --partner: executa nomes aquestes repeticions "
+            "(sense regla adaptativa) per completar els blocs de l'altre OS."
+        ),
+    )
+    parser.add_argument(
+        "--cache-sweep",
+        action="store_true",
+        help=(
+            "Substitueix les ns dels algorismes de `cache_sweep.algos` (per defecte linear_scan i "
+            "mergesort) per una graella log-espaiada al voltant de cada nivell de cache L1/L2/L3 "
+            "(mides de /sys/devices/system/cpu/cpu0/cache o `cache_sweep.sizes_kib`)."
+        ),
+    )
+    parser.add_argument(
+        "--no-governor",
+        action="store_true",
+        help="No intenta posar el governor de CPU a 'performance' amb cpupower.",
+    )
+    return parser.parse_args()
+
+
+def load_config(path: Path) -> dict:
+    with path.open(encoding="utf-8") as fh:
+        return json.load(fh)
+
+
+def iter_experiments(cfg: dict) -> Iterator[Tuple[str, str, List[int], List[int]]]:
+    default_ns = cfg.get("ns") or []
+    default_threads = cfg.get("threads") or [1]
+    for entry in cfg.get("algos", []):
+        ns = entry.get("ns") or default_ns
+        if not ns:
+            print(f"Warning: no ns configured for {entry['name']}, skipping", file=sys.stderr)
+            continue
+        # L'escombrat global nomes s'aplica als binaris amb variant paral·lela ("parallel": true);
+        # els altres rebutgen el sise argument (codi 2) i aturarien la campanya
+        parallel = bool(entry.get("parallel"))
+        threads = [int(t) for t in entry.get("threads") or (default_threads if parallel else [1])]
+        if not parallel and any(t != 1 for t in threads):
+            print(
+                f"Warning: {entry['name']} ({entry['bin']}) has no parallel variant, "
+                f"skipping threads {[t for t in threads if t != 1]}",
+                file=sys.stderr,
+            )
+            threads = [t for t in threads if t == 1]
+            if not threads:
+                continue
+        yield entry["name"], entry["bin"], [int(n) for n in ns], threads
+
+
+def pair_id(alg: str, n: int, threads: int = 1) -> str:
+    # Cada nombre de fils es un bloc ABBA diferent; amb 1 fil, el pair_id de sempre
+    return f"{alg}_{n}" if threads == 1 else f"{alg}_{n}_t{threads}"
+
+
+def _os_release_name() -> str:
+    fields: Dict[str, str] = {}
+    try:
+        for line in Path("/etc/os-release").read_text(encoding="utf-8").splitlines():
+            key, sep, value = line.partition("=")
+            if sep:
+                fields[key] = value.strip().strip('"')
+    except OSError:
+        return platform.platform()
+    return f"{fields.get('NAME', '')} {fields.get('VERSION', '')}".strip()
+
+
+def _compiler_version() -> str:
+    try:
+        out = subprocess.run(["g++", "--version"], capture_output=True, text=True, check=True)
+    except (OSError, subprocess.CalledProcessError):
+        return "N/A"
+    parts = out.stdout.splitlines()[0].split()
+    # Igual que `awk '{print $1" "$3}'` a run_linux.sh
+    return f"{parts[0]} {parts[2]}" if len(parts) >= 3 else " ".join(parts)
+
+
+def collect_metadata(profile: OsProfile) -> Dict[str, str]:
+    if profile is LINUX:
+        os_name, kernel = _os_release_name(), platform.release()
+    else:
+        os_name, kernel = f"{platform.system()} {platform.release()} Build {platform.version()}", "N/A"
+    return {"compiler": _compiler_version(), "flags": FLAGS, "os_name": os_name, "kernel": kernel}
+
+
+def _package_temp_file() -> Optional[Path]:
+    # Equivalent a `sensors | awk '/Package id 0:/'` sense llançar cap proces
+    for label in sorted(Path("/sys/class/hwmon").glob("hwmon*/temp*_label")):
+        try:
+            if label.read_text().strip() == "Package id 0":
+                return label.with_name(label.name.replace("_label", "_input"))
+        except OSError:
+            continue
+    for zone_type in sorted(Path("/sys/class/thermal").glob("thermal_zone*/type")):
+        try:
+            if zone_type.read_text().strip() == "x86_pkg_temp":
+                return zone_type.with_name("temp")
+        except OSError:
+            continue
+    return None
+
+
+def _core_temp_file(core: int) -> Optional[Path]:
+    # coretemp exposa "Core <core_id>" dins el hwmon de cada paquet ("Package id <p>")
+    topology = Path(f"/sys/devices/system/cpu/cpu{core}/topology")
+    try:
+        package = int((topology / "physical_package_id").read_text())
+        core_id = int((topology / "core_id").read_text())
+    except (OSError, ValueError):
+        return None
+    for hwmon in sorted(Path("/sys/class/hwmon").glob("hwmon*")):
+        labels = {}
+        for label in hwmon.glob("temp*_label"):
+            try:
+                labels[label.read_text().strip()] = label
+            except OSError:
+                continue
+        if f"Package id {package}" in labels and f"Core {core_id}" in labels:
+            label = labels[f"Core {core_id}"]
+            return label.with_name(label.name.replace("_label", "_input"))
+    return None
+
+
+class TemperatureReader:
+    """Temperatura del paquet o, amb `core`, la del nucli fisic d'aquest CPU (si n'hi ha sensor)."""
+
+    def __init__(self, core: Optional[int] = None) -> None:
+        linux = sys.platform.startswith("linux")
+        core_sensor = _core_temp_file(core) if linux and core is not None else None
+        self.per_core = core_sensor is not None
+        self.sensor = core_sensor or (_package_temp_file() if linux else None)
+        self.has_sensors_cmd = shutil.which("sensors") is not None
+
+    def read(self) -> Optional[float]:
+        if self.sensor is not None:
+            try:
+                return int(self.sensor.read_text()) / 1000.0
+            except (OSError, ValueError):
+                return None
+        if self.has_sensors_cmd:
+            out = subprocess.run(["sensors"], capture_output=True, text=True).stdout
+            for line in out.splitlines():
+                if line.startswith("Package id 0:"):
+                    try:
+                        return float(line.split()[3].strip("+°C"))
+                    except (IndexError, ValueError):
+                        return None
+        return None
+
+
+@dataclass(frozen=True)
+class CooldownPolicy:
+    max_wait_s: float
+    band_c: float = COOLDOWN_BAND_C
+    poll_s: float = COOLDOWN_POLL_S
+    adaptive: bool = True
+
+
+def cooldown_policy(cfg: dict, profile: OsProfile, max_wait_s: Optional[float] = None) -> CooldownPolicy:
+    section = cfg.get("cooldown") or {}
+    if max_wait_s is None:
+        max_wait_s = float(section.get("max_wait_s", profile.cooldown_s))
+    return CooldownPolicy(
+        max_wait_s=max_wait_s,
+        band_c=float(section.get("band_c", COOLDOWN_BAND_C)),
+        poll_s=float(section.get("poll_s", COOLDOWN_POLL_S)),
+        adaptive=bool(section.get("adaptive", True)),
+    )
+
+
+class ThermalGate:
+    """Espera fins que la temperatura torna a la banda de repos o fins a `max_wait_s`.
+
+    La temperatura de repos es la mitjana d'unes quantes lectures a l'inici de la
+    campanya. Sense sensor (o amb `adaptive: false`) es dorm `max_wait_s`, com el
+    `cooldown()` fix de run_linux.sh.
+    """
+
+    def __init__(self, temps: TemperatureReader, policy: CooldownPolicy) -> None:
+        self.temps = temps
+        self.policy = policy
+        self.idle_c = self._idle_temperature() if policy.adaptive else None
+
+    def _idle_temperature(self) -> Optional[float]:
+        samples = []
+        for _ in range(IDLE_SAMPLES):
+            temp = self.temps.read()
+            if temp is None:
+                return None
+            samples.append(temp)
+            time.sleep(0.2)
+        return sum(samples) / len(samples)
+
+    def wait(self) -> float:
+        start = time.monotonic()
+        if self.idle_c is None:
+            time.sleep(self.policy.max_wait_s)
+            return time.monotonic() - start
+
+        limit_c = self.idle_c + self.policy.band_c
+        deadline = start + self.policy.max_wait_s
+        while True:
+            temp = self.temps.read()
+            now = time.monotonic()
+            # Una lectura fallida no compta com a refredat: es segueix esperant
+            if (temp is not None and temp <= limit_c) or now >= deadline:
+                break
+            time.sleep(min(self.policy.poll_s, deadline - now))
+        return time.monotonic() - start
+
+
+class _ProcProbe:
+    """Llegeix VmRSS de /proc/<pid>/status i utime/stime de /proc/<pid>/stat."""
+
+    def __init__(self, pid: int, exe: Path) -> None:
+        self.status_fd = os.open(f"/proc/{pid}/status", os.O_RDONLY)
+        self.stat_fd = os.open(f"/proc/{pid}/stat", os.O_RDONLY)
+        self.us_per_tick = 1e6 / os.sysconf("SC_CLK_TCK")
+        # Entre el fork i l'exec el fill encara es una copia de Python: es descarta
+        self.comm = exe.name[:15]
+
+    def read(self) -> Optional[Tuple[int, int, int]]:
+        try:
+            stat = os.pread(self.stat_fd, 4096, 0).decode()
+            status = os.pread(self.status_fd, 8192, 0).decode()
+        except OSError:
+            return None
+        head, _, tail = stat.rpartition(")")
+        if head[head.find("(") + 1 :] != self.comm:
+            return (-1, 0, 0)
+        fields = tail.split()
+        for line in status.splitlines():
+            if line.startswith("VmRSS:"):
+                rss_kib = int(line.split()[1])
+                break
+        else:
+            return None  # zombie: ja no te memoria
+        # Despres de ")" el camp 0 es l'estat (3); utime i stime son els camps 14 i 15
+        user_us = int(int(fields[11]) * self.us_per_tick)
+        sys_us = int(int(fields[12]) * self.us_per_tick)
+        return rss_kib, user_us, sys_us
+
+    def close(self) -> None:
+        os.close(self.status_fd)
+        os.close(self.stat_fd)
+
+
+class _WindowsProbe:
+    """WorkingSetSize (GetProcessMemoryInfo) i temps de CPU (GetProcessTimes) via ctypes."""
+
+    def __init__(self, pid: int, exe: Path) -> None:
+        import ctypes
+        from ctypes import wintypes
+
+        class ProcessMemoryCounters(ctypes.Structure):
+            _fields_ = [
+                ("cb", wintypes.DWORD),
+                ("PageFaultCount", wintypes.DWORD),
+                ("PeakWorkingSetSize", ctypes.c_size_t),
+                ("WorkingSetSize", ctypes.c_size_t),
+                ("QuotaPeakPagedPoolUsage", ctypes.c_size_t),
+                ("QuotaPagedPoolUsage", ctypes.c_size_t),
+                ("QuotaPeakNonPagedPoolUsage", ctypes.c_size_t),
+                ("QuotaNonPagedPoolUsage", ctypes.c_size_t),
+                ("PagefileUsage", ctypes.c_size_t),
+                ("PeakPagefileUsage", ctypes.c_size_t),
+            ]
+
+        self.ctypes = ctypes
+        self.kernel32 = ctypes.WinDLL("kernel32", use_last_error=True)
+        self.psapi = ctypes.WinDLL("psapi", use_last_error=True)
+        self.counters = ProcessMemoryCounters()
+        self.counters.cb = ctypes.sizeof(ProcessMemoryCounters)
+        self.times = [wintypes.FILETIME() for _ in range(4)]
+        process_query_limited_information = 0x1000
+        self.handle = self.kernel32.OpenProcess(process_query_limited_information, False, pid)
+        if not self.handle:
+            raise OSError(ctypes.get_last_error(), "OpenProcess")
+
+    @staticmethod
+    def _filetime_us(ft) -> int:
+        return ((ft.dwHighDateTime << 32) | ft.dwLowDateTime) // 10
+
+    def read(self) -> Optional[Tuple[int, int, int]]:
+        byref = self.ctypes.byref
+        if not self.psapi.GetProcessMemoryInfo(self.handle, byref(self.counters), self.counters.cb):
+            return None
+        if not self.kernel32.GetProcessTimes(self.handle, *(byref(ft) for ft in self.times)):
+            return None
+        kernel, user = self.times[2], self.times[3]
+        return self.counters.WorkingSetSize // 1024, self._filetime_us(user), self._filetime_us(kernel)
+
+    def close(self) -> None:
+        self.kernel32.CloseHandle(self.handle)
+
+
+def open_probe(pid: int, exe: Path):
+    return _WindowsProbe(pid, exe) if sys.platform.startswith("win") else _ProcProbe(pid, exe)
+
+
+@dataclass(frozen=True)
+class TimelineSampler:
+    interval_s: float
+    core: Optional[int] = None
+    spare_cores: Tuple[int, ...] = ()
+
+    def _release_core(self) -> None:
+        # El fil que mostreja no ha de competir amb el benchmark pel seu nucli
+        if self.core is not None and self.spare_cores:
+            os.sched_setaffinity(0, set(self.spare_cores))
+
+    def run(self, cmd: List[str], exe: Path) -> Tuple[str, List[Sample]]:
+        samples: List[Sample] = []
+        with tempfile.TemporaryFile() as out:
+            # Sortida a fitxer i no a pipe: un array JSON gran no bloqueja el fill
+            proc = subprocess.Popen(cmd, stdout=out)
+            start = time.monotonic_ns()
+            self._release_core()
+            try:
+                probe = open_probe(proc.pid, exe)
+            except OSError:
+                probe = None
+            try:
+                while probe is not None and proc.poll() is None:
+                    reading = probe.read()
+                    if reading is None:
+                        break
+                    if reading[0] >= 0:
+                        samples.append(((time.monotonic_ns() - start) // 1000, *reading))
+                    time.sleep(self.interval_s)
+            finally:
+                if probe is not None:
+                    probe.close()
+                pin_current_thread(self.core)
+            proc.wait()
+            if proc.returncode:
+                raise subprocess.CalledProcessError(proc.returncode, cmd)
+            out.seek(0)
+            return out.read().decode(), samples
+
+
+def run_binary(
+    exe: Path, alg: str, n: int, seed: int, *extra: int, sampler: Optional[TimelineSampler] = None
+) -> Tuple[List[dict], Optional[List[Sample]]]:
+    cmd = [str(exe), alg, str(n), str(seed), *map(str, extra)]
+    samples = None
+    if sampler is None:
+        stdout = subprocess.run(cmd, capture_output=True, text=True, check=True).stdout
+    else:
+        stdout, samples = sampler.run(cmd, exe)
+    parsed = json.loads(stdout)
+    # Mode de repeticions internes: un array amb un objecte per iteracio
+    return (parsed if isinstance(parsed, list) else [parsed]), samples
+
+
+def cpu_pct_avg(wall_ms: float, cpu_ms: float, threads: int) -> float:
+    if wall_ms <= 0 or threads <= 0:
+        return 0.0
+    return round((cpu_ms / (wall_ms * threads)) * 100, 2)
+
+
+def measure(
+    exe: Path,
+    alg: str,
+    n: int,
+    seed: int,
+    warmup_runs: int,
+    inner_reps: int = 0,
+    sampler: Optional[TimelineSampler] = None,
+    threads: int = 1,
+) -> Tuple[List[dict], str, Optional[List[Sample]]]:
+    timestamp = datetime.now().astimezone().isoformat(timespec="seconds")
+    # Els binaris reben els fils com a sise argument: alg n seed reps warmups threads
+    workers = (threads,) if threads != 1 else ()
+    if inner_reps > 0:
+        # Un sol proces: mateix input, warm-ups i `inner_reps` iteracions cronometrades
+        results, samples = run_binary(
+            exe, alg, n, seed, inner_reps, warmup_runs, *workers, sampler=sampler
+        )
+        return results, timestamp, samples
+    extra = (0, 0, *workers) if workers else ()
+    for w in range(warmup_runs):
+        subprocess.run(
+            [str(exe), alg, str(n), str(seed + w), *map(str, extra)], stdout=subprocess.DEVNULL
+        )
+    results, samples = run_binary(exe, alg, n, seed, *extra, sampler=sampler)
+    return results, timestamp, samples
+
+
+def build_row(
+    result: dict,
+    *,
+    alg: str,
+    n: int,
+    seed: int,
+    profile: OsProfile,
+    order: int,
+    run_id: str,
+    temp: Optional[float],
+    timestamp: str,
+    metadata: Dict[str, str],
+    core: Optional[int] = None,
+    cooldown_s: Optional[float] = None,
+    workers: int = 1,
+) -> List[str]:
+    wall = float(result["wall_ms"])
+    cpu_user = float(result["cpu_user_ms"])
+    cpu_sys = float(result["cpu_sys_ms"])
+    threads = int(result.get("threads") or 0) or (os.cpu_count() or 1)
+    return [
+        pair_id(alg, n, workers),
+        alg,
+        str(n),
+        str(seed),
+        profile.label,
+        str(order),
+        run_id,
+        f"{wall:.3f}",
+        f"{cpu_user:.3f}",
+        f"{cpu_sys:.3f}",
+        f"{cpu_pct_avg(wall, cpu_user + cpu_sys, threads):.2f}",
+        str(threads),
+        f"{float(result['rss_peak_mib']):.3f}",
+        "" if temp is None else f"{temp:.3f}",
+        metadata["compiler"],
+        metadata["flags"],
+        metadata["os_name"],
+        metadata["kernel"],
+        timestamp,
+        "" if core is None else str(core),
+        "" if cooldown_s is None else f"{cooldown_s:.3f}",
+        str(result.get("iter", "")),
+        *(str(result.get(name, "")) for name in PERF_COUNTERS),
+        str(workers),
+    ]
+
+
+def abba_run_ids(profile: OsProfile, rep: int, counter: int) -> Sequence[str]:
+    if profile is LINUX:
+        return (f"L{rep}A", f"L{rep}B")
+    # Windows numera les execucions amb un comptador global
+    return (str(counter), str(counter + 1))
+
+
+def maybe_set_governor() -> None:
+    if shutil.which("cpupower"):
+        subprocess.run(["sudo", "cpupower", "frequency-set", "-g", "performance"], check=False)
+
+
+@dataclass(frozen=True)
+class SequentialRule:
+    """Criteri d'aturada del mode de repeticions adaptatiu."""
+
+    target_rel_hw: float
+    min_reps: int
+    max_reps: int
+    metric: str = "wall_ms"
+
+
+def sequential_rule(cfg: dict) -> Optional[SequentialRule]:
+    section = cfg.get("adaptive_reps")
+    if not section or not section.get("enabled", True):
+        return None
+    return SequentialRule(
+        target_rel_hw=float(section.get("target_rel_hw", 0.02)),
+        min_reps=max(2, int(section.get("min_reps", 3))),
+        max_reps=int(section.get("max_reps", cfg["reps"])),
+        metric=section.get("metric", "wall_ms"),
+    )
+
+
+def ci_half_width(values: Sequence[float]) -> float:
+    # Mateix IC95% t de Student que compute_dlog_stats (infer_dlog_stats.py)
+    n = len(values)
+    if n < 2:
+        return math.inf
+    mean = sum(values) / n
+    sd = math.sqrt(sum((v - mean) ** 2 for v in values) / (n - 1))
+    return float(stats.t.ppf(0.975, df=n - 1)) * sd / math.sqrt(n)
+
+
+def pair_log_mean(results: Sequence[dict], metric: str) -> float:
+    # Una observacio per repeticio ABBA: mitjana dels logs de les dues potes.
+    # La semiamplada en escala log es directament una precisio relativa.
+    values = [float(r[metric]) for r in results]
+    if min(values) <= 0:
+        return math.nan
+    return sum(math.log(v) for v in values) / len(values)
+
+
+@dataclass(frozen=True)
+class Job:
+    """Repeticions ABBA d'un (alg, n) que s'executen en serie al mateix nucli.
+
+    Amb repeticions fixes cada repeticio es una feina; en mode adaptatiu la feina es
+    la serie sencera, perque cal decidir despres de cada parella si se'n fa una altra.
+    """
+
+    alg: str
+    exe: Path
+    n: int
+    reps: Tuple[int, ...]
+    rule: Optional[SequentialRule] = None
+    threads: int = 1
+    # Repeticions que ja te l'altre OS (--partner): la serie adaptativa no s'atura abans
+    partner_reps: int = 0
+
+
+def build_jobs(
+    cfg: dict,
+    profile: OsProfile,
+    build_dir: Path,
+    rule: Optional[SequentialRule] = None,
+    partner: Optional[Dict[str, List[int]]] = None,
+    only_reps: Optional[Dict[str, List[int]]] = None,
+) -> List[Job]:
+    """Feines de la campanya.
+
+    `partner` son les repeticions per pair_id de l'altre OS: amb repeticions fixes
+    s'hi afegeixen les que falten i, en mode adaptatiu, la serie no s'atura abans de
+    cobrir-les. `only_reps` (partner_reps.json) limita la campanya a aquestes.
+    """
+    reps = int(cfg["reps"])
+    jobs: List[Job] = []
+    for alg, bin_name, ns, threads in iter_experiments(cfg):
+        exe = build_dir / f"{bin_name}{profile.exe_suffix}"
+        for n in ns:
+            for workers in threads:
+                key = pair_id(alg, n, workers)
+                if only_reps is not None:
+                    jobs.extend(Job(alg, exe, n, (rep,), threads=workers) for rep in only_reps.get(key, []))
+                    continue
+                theirs = (partner or {}).get(key, [])
+                if rule is not None:
+                    last = max([rule.max_reps, *theirs])
+                    jobs.append(Job(alg, exe, n, tuple(range(1, last + 1)), rule, workers, max(theirs, default=0)))
+                else:
+                    planned = sorted(set(range(1, reps + 1)) | set(theirs))
+                    jobs.extend(Job(alg, exe, n, (rep,), threads=workers) for rep in planned)
+    return jobs
+
+
+def read_partner_reps(path: Path, seed_master: int) -> Dict[str, List[int]]:
+    """Repeticions (seed - seed_master) de cada pair_id al CSV de l'altre OS."""
+    found: Dict[str, set] = {}
+    with path.open(newline="", encoding="utf-8") as fh:
+        for row in csv.DictReader(fh, skipinitialspace=True):
+            row = {key.strip(): value.strip() for key, value in row.items() if key}
+            found.setdefault(row["pair_id"], set()).add(int(row["seed"]) - seed_master)
+    return {key: sorted(reps) for key, reps in found.items()}
+
+
+def read_partner_logs(path: Path, seed_master: int, metric: str = "wall_ms") -> Dict[str, Dict[int, float]]:
+    """Mitjana de log(metric) de cada repeticio ABBA al CSV de l'altre OS, per pair_id."""
+    found: Dict[str, Dict[int, List[dict]]] = {}
+    with path.open(newline="", encoding="utf-8") as fh:
+        for row in csv.DictReader(fh, skipinitialspace=True):
+            row = {key.strip(): value.strip() for key, value in row.items() if key}
+            if not row.get(metric):
+                continue
+            rep = int(row["seed"]) - seed_master
+            found.setdefault(row["pair_id"], {}).setdefault(rep, []).append(row)
+    return {
+        key: {rep: pair_log_mean(rows, metric) for rep, rows in reps.items()}
+        for key, reps in found.items()
+    }
+
+
+def missing_partner_reps(done: Dict[str, List[int]], partner: Dict[str, List[int]]) -> Dict[str, List[int]]:
+    """Repeticions d'aquesta campanya que l'altre OS encara no te (blocs sense parella)."""
+    missing = {key: sorted(set(reps) - set(partner.get(key, []))) for key, reps in done.items()}
+    return {key: reps for key, reps in sorted(missing.items()) if reps}
+
+
+def series_half_width(pair_values: Dict[int, float], partner_logs: Optional[Dict[int, float]] = None) -> float:
+    """Semiamplada de l'IC95% que fa servir la regla d'aturada.
+
+    Amb les dades de l'altre OS (--partner) es la de la diferencia aparellada
+    Linux - Windows per repeticio, com compute_dlog_stats; el signe no hi influeix.
+    Les repeticions que l'altre OS encara no te les completara amb --only-reps, aixi
+    que la desviacio es la de les diferencies ja aparellades pero compten totes.
+    Sense parella (primera campanya) es la de la mitjana de log(metric) en aquest OS.
+    """
+    own = {rep: value for rep, value in pair_values.items() if math.isfinite(value)}
+    if partner_logs is None:
+        return ci_half_width(list(own.values()))
+    diffs = [
+        value - partner_logs[rep]
+        for rep, value in own.items()
+        if math.isfinite(partner_logs.get(rep, math.nan))
+    ]
+    if len(diffs) < 2:
+        return math.inf
+    return ci_half_width(diffs) * math.sqrt(len(diffs) / len(own))
+
+
+def should_stop(
+    rule: Optional[SequentialRule],
+    pair_values: Dict[int, float],
+    partner_logs: Optional[Dict[int, float]] = None,
+) -> bool:
+    if rule is None or len(pair_values) < rule.min_reps:
+        return False
+    finite = [v for v in pair_values.values() if math.isfinite(v)]
+    return len(finite) >= rule.min_reps and series_half_width(pair_values, partner_logs) <= rule.target_rel_hw
+
+
+def can_pin() -> bool:
+    return hasattr(os, "sched_setaffinity")
+
+
+def select_cores(concurrency: int, configured: Optional[Sequence[int]] = None) -> List[Optional[int]]:
+    """Tria un nucli per cada treballador.
+
+    Si config.json porta `cores`, es fan servir aquests (p. ex. els aillats amb
+    `isolcpus`). Si no, es prenen els nuclis permesos al proces, deixant lliure el
+    nucli 0 (interrupcions i el mateix orquestrador) sempre que n'hi hagi prou.
+    """
+    if not can_pin():
+        return [None] * concurrency
+    allowed = sorted(os.sched_getaffinity(0))
+    if configured:
+        candidates = [c for c in configured if c in allowed]
+        missing = sorted(set(configured) - set(allowed))
+        if missing:
+            print(f"Warning: cores {missing} not available to this process, ignoring", file=sys.stderr)
+    else:
+        candidates = allowed[1:] if len(allowed) > concurrency else allowed
+    if len(candidates) < concurrency:
+        raise ValueError(
+            f"concurrency={concurrency} needs as many cores, only {len(candidates)} available: {candidates}"
+        )
+    return candidates[:concurrency]
+
+
+def pin_current_thread(core: Optional[int]) -> None:
+    # A Linux, sched_setaffinity(0) afecta nomes el fil que la crida i els processos
+    # que llanci l'hereten: cada treballador queda lligat al seu nucli.
+    if core is not None:
+        os.sched_setaffinity(0, {core})
+
+
+def thermal_gates(
+    cores: Sequence[Optional[int]], policy: CooldownPolicy, package: TemperatureReader
+) -> Dict[Optional[int], ThermalGate]:
+    """Un ThermalGate per treballador.
+
+    En concurrencia, la temperatura del paquet no baixa mentre els altres nuclis
+    mesuren i gairebe totes les esperes arribarien a `max_wait_s`: cada treballador
+    espera el seu nucli. Sense sensor per nucli (AMD, VMs, Windows) es torna al del
+    paquet i s'avisa.
+    """
+    if len(cores) <= 1:
+        gate = ThermalGate(package, policy)
+        if gate.idle_c is not None:
+            print(f"Idle temperature: {gate.idle_c:.1f} C (band +{policy.band_c} C, max wait {policy.max_wait_s} s)")
+        return {core: gate for core in cores}
+
+    gates: Dict[Optional[int], ThermalGate] = {}
+    for core in dict.fromkeys(cores):
+        reader = TemperatureReader(core)
+        gates[core] = ThermalGate(reader, policy)
+        if gates[core].idle_c is None:
+            continue
+        if reader.per_core:
+            print(f"Idle temperature core {core}: {gates[core].idle_c:.1f} C (band +{policy.band_c} C)")
+        else:
+            print(
+                f"Warning: no per-core temperature sensor for core {core}; the adaptive cooldown "
+                "uses the package temperature, which stays high while the other workers run, "
+                f"so most waits will last max_wait_s ({policy.max_wait_s} s)",
+                file=sys.stderr,
+            )
+    return gates
+
+
+def run_campaign(
+    cfg: dict,
+    profile: OsProfile,
+    build_dir: Path,
+    out_dir: Path,
+    cooldown: CooldownPolicy,
+    warmup_runs: int,
+    concurrency: int = 1,
+    rule: Optional[SequentialRule] = None,
+    inner_reps: int = 0,
+    timeline_ms: Optional[float] = None,
+    partner: Optional[Dict[str, List[int]]] = None,
+    only_reps: Optional[Dict[str, List[int]]] = None,
+    partner_logs: Optional[Dict[str, Dict[int, float]]] = None,
+) -> Path:
+    out_dir.mkdir(parents=True, exist_ok=True)
+    csv_path = out_dir / profile.csv_name
+    metadata = collect_metadata(profile)
+    temps = TemperatureReader()
+    cores = select_cores(concurrency, cfg.get("cores"))
+    gates = thermal_gates(cores, cooldown, temps)
+    timeline_dir = out_dir / "timelines"
+
+    pending: "queue.Queue[Job]" = queue.Queue()
+    for job in build_jobs(cfg, profile, build_dir, rule, partner, only_reps):
+        pending.put(job)
+    done_reps: Dict[str, List[int]] = {}
+    seed_master = int(cfg["seed_master"])
+
+    write_lock = threading.Lock()
+    counter_lock = threading.Lock()
+    next_counter = [1]
+
+    def take_counter() -> int:
+        # Windows numera les execucions per ordre d'arribada (igual que $runCounter)
+        with counter_lock:
+            counter = next_counter[0]
+            next_counter[0] += 2
+            return counter
+
+    errors: List[BaseException] = []
+
+    with csv_path.open("w", newline="", encoding="utf-8", buffering=CSV_BUFFER_BYTES) as fh:
+        writer = csv.writer(fh)
+        writer.writerow(CSV_COLUMNS)
+
+        def make_sampler(core: Optional[int]) -> Optional[TimelineSampler]:
+            if not timeline_ms:
+                return None
+            spare: Tuple[int, ...] = ()
+            if core is not None:
+                allowed = os.sched_getaffinity(0)
+                # Preferentment nuclis sense cap benchmark; si no n'hi ha, qualsevol altre
+                spare = tuple(sorted((allowed - set(cores)) or (allowed - {core})))
+            return TimelineSampler(timeline_ms / 1000.0, core, spare)
+
+        def worker(core: Optional[int], sampler: Optional[TimelineSampler]) -> None:
+            pin_current_thread(core)
+            while not errors:
+                try:
+                    job = pending.get_nowait()
+                except queue.Empty:
+                    return
+                try:
+                    run_series(job, core, sampler)
+                except BaseException as exc:  # es propaga al fil principal
+                    errors.append(exc)
+                    return
+
+        def run_series(job: Job, core: Optional[int], sampler: Optional[TimelineSampler]) -> None:
+            pair_values: Dict[int, float] = {}
+            # Sense dades de l'altre OS per aquest (alg, n) es mira nomes aquest OS
+            theirs = (partner_logs or {}).get(pair_id(job.alg, job.n, job.threads))
+            for rep in job.reps:
+                if errors:
+                    return
+                seed = seed_master + rep
+                rows = []
+                results = []
+                run_ids = abba_run_ids(profile, rep, take_counter())
+                for order, run_id in zip(profile.orders, run_ids):
+                    # L'espera es fa abans de cada mesura i queda a la seva fila
+                    waited = gates[core].wait()
+                    leg_results, timestamp, timeline = measure(
+                        job.exe, job.alg, job.n, seed, warmup_runs, inner_reps, sampler, job.threads
+                    )
+                    results.extend(leg_results)
+                    temp = temps.read()
+                    if timeline is not None:
+                        write_timeline(
+                            timeline_dir
+                            / timeline_name(profile.label, job.alg, job.n, seed, run_id, job.threads),
+                            timeline,
+                            os_label=profile.label,
+                            alg=job.alg,
+                            n=job.n,
+                            seed=seed,
+                            run_order=order,
+                            run_id=run_id,
+                            interval_us=int(timeline_ms * 1000),
+                            threads=job.threads,
+                        )
+                    rows.extend(
+                        build_row(
+                            result,
+                            alg=job.alg,
+                            n=job.n,
+                            seed=seed,
+                            profile=profile,
+                            order=order,
+                            run_id=run_id,
+                            temp=temp,
+                            timestamp=timestamp,
+                            metadata=metadata,
+                            core=core,
+                            cooldown_s=waited,
+                            workers=job.threads,
+                        )
+                        for result in leg_results
+                    )
+                # Cada repeticio ABBA s'escriu sencera: si s'atura, no queden parelles a mitges
+                with write_lock:
+                    writer.writerows(rows)
+                    fh.flush()
+
+                with write_lock:
+                    done_reps.setdefault(pair_id(job.alg, job.n, job.threads), []).append(rep)
+                if job.rule is not None:
+                    pair_values[rep] = pair_log_mean(results, job.rule.metric)
+                    # Amb --partner es cobreixen primer tots els blocs de l'altre OS
+                    if len(pair_values) >= job.partner_reps and should_stop(job.rule, pair_values, theirs):
+                        break
+            if job.rule is not None:
+                label = f"{job.alg} n={job.n}" + (f" threads={job.threads}" if job.threads != 1 else "")
+                kind = "paired difference " if theirs is not None else ""
+                print(
+                    f"{label}: {len(pair_values)} reps, {kind}CI95 half-width "
+                    f"{series_half_width(pair_values, theirs):.4f} (target {job.rule.target_rel_hw})"
+                )
+
+        # Els samplers es creen abans de fixar cap fil, amb l'afinitat completa del proces
+        threads = [
+            threading.Thread(target=worker, args=(core, make_sampler(core)), daemon=True)
+            for core in cores
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+    if errors:
+        raise errors[0]
+    if partner is not None:
+        missing = missing_partner_reps(done_reps, partner)
+        if missing:
+            # L'altre OS les ha d'executar amb --only-reps perque els blocs quedin aparellats
+            path = out_dir / PARTNER_REPS_FILE
+            path.write_text(json.dumps(missing, indent=2), encoding="utf-8")
+            for key, reps in missing.items():
+                print(f"Unpaired: {key} reps {reps} (partner has none)")
+            print(f"Run the other OS with --only-reps {path} to complete these blocks")
+    return csv_path
+
+
+def main() -> None:
+    args = parse_args()
+    profile = current_profile()
+    cfg = load_config(args.config)
+
+    if profile is LINUX and not args.no_governor:
+        maybe_set_governor()
+
+    levels = None
+    if args.cache_sweep or (cfg.get("cache_sweep") or {}).get("enabled"):
+        levels = cache.cache_levels(cfg.get("cache_sweep"))
+        if not levels:
+            raise ValueError(
+                f"cannot read cache sizes from {cache.CACHE_SYSFS}; "
+                "set `cache_sweep.sizes_kib` in config.json"
+            )
+        cfg = cache.apply_cache_sweep(cfg, levels)
+        sizes = ", ".join(f"{level} {cache.format_size(size)}" for level, size in levels.items())
+        print(f"Cache sweep: {sizes}")
+
+    stamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    out_dir = args.runs_dir / f"{profile.run_dir_prefix}_{stamp}"
+    if levels:
+        # Les fronteres acompanyen les dades: plot_throughput les llegeix amb --cache-json
+        cache.write_cache_file(out_dir / cache.CACHE_FILE, levels)
+    cooldown = cooldown_policy(cfg, profile, args.cooldown)
+    rule = None if args.fixed_reps or args.only_reps else sequential_rule(cfg)
+    partner = read_partner_reps(args.partner, int(cfg["seed_master"])) if args.partner else None
+    partner_logs = None
+    if args.partner and rule is not None:
+        partner_logs = read_partner_logs(args.partner, int(cfg["seed_master"]), rule.metric)
+    only_reps = None
+    if args.only_reps:
+        only_reps = {key: [int(rep) for rep in reps] for key, reps in load_config(args.only_reps).items()}
+    inner_reps = args.inner_reps if args.inner_reps is not None else int(cfg.get("inner_reps", 0))
+    concurrency = args.concurrency or int(cfg.get("concurrency", 1))
+    timeline_ms = args.timeline_ms
+    if timeline_ms is None and (cfg.get("timeline") or {}).get("enabled"):
+        timeline_ms = float(cfg["timeline"].get("interval_ms", 1.0))
+    csv_path = run_campaign(
+        cfg,
+        profile,
+        args.build_dir,
+        out_dir,
+        cooldown,
+        args.warmup_runs,
+        concurrency,
+        rule,
+        inner_reps,
+        timeline_ms,
+        partner,
+        only_reps,
+        partner_logs,
+    )
+    print(f"Results at: {csv_path}")
+
+
+if __name__ == "__main__":
+    main()
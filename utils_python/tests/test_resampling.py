@@ -0,0 +1,71 @@
+from __future__ import annotations
+
+import numpy as np
+
+from utils_python.common import resampling
+
+SEED = resampling.DEFAULT_SEED
+RESAMPLES = 4000
+
+
+def _index_means(values: np.ndarray, rng: np.random.Generator) -> np.ndarray:
+    # Referencia: remostreig d'indexos sobre tots els valors (cost remostres x n)
+    return values[rng.integers(0, len(values), size=(RESAMPLES, len(values)))].mean(axis=1)
+
+
+def _index_pvalue(values: np.ndarray, rng: np.random.Generator) -> float:
+    signs = rng.integers(0, 2, size=(RESAMPLES, len(values)), dtype=np.int8) * 2 - 1
+    exceed = np.count_nonzero(np.abs(signs @ np.abs(values)) >= abs(values.sum()) * (1 - 1e-12))
+    return (exceed + 1) / (RESAMPLES + 1)
+
+
+def _heavy_tailed(n: int, decimals: int | None = None) -> np.ndarray:
+    # t de Student amb 2 graus de llibertat: cues pesades, com les Dlog amb outliers
+    values = np.random.default_rng(SEED).standard_t(2, n) * 0.05 + 0.004
+    return np.sort(values if decimals is None else np.round(values, decimals))
+
+
+def _assert_same_se(fast: np.ndarray, exact: np.ndarray) -> None:
+    # Error de Monte Carlo relatiu de l'SE ~ 1/sqrt(2B)
+    assert abs(fast.std() / exact.std() - 1) < 4 / np.sqrt(2 * RESAMPLES)
+
+
+def _assert_same_pvalue(fast: float, exact: float) -> None:
+    tolerance = 4 * np.sqrt(max(exact * (1 - exact), 1.0 / RESAMPLES) / RESAMPLES)
+    assert abs(fast - exact) < tolerance
+
+
+def test_counts_path_matches_index_resampling():
+    values = _heavy_tailed(2000, decimals=2)
+    assert len(values) > resampling.MAX_SUPPORT >= len(np.unique(values))
+
+    fast = resampling.bootstrap_means(values, RESAMPLES, resampling.group_rng(SEED, "fast"))
+    p_value = resampling.signflip_pvalue(values, RESAMPLES, resampling.group_rng(SEED, "fast"))
+    rng = resampling.group_rng(SEED, "exact")
+    _assert_same_se(fast, _index_means(values, rng))
+    _assert_same_pvalue(p_value, _index_pvalue(values, rng))
+
+
+def test_large_group_path_matches_index_resampling():
+    values = _heavy_tailed(3 * resampling.LARGE_GROUP)
+    assert len(np.unique(values)) > resampling.MAX_SUPPORT
+
+    fast = resampling.bootstrap_means(values, RESAMPLES, resampling.group_rng(SEED, "fast"))
+    exact = _index_means(values, resampling.group_rng(SEED, "exact"))
+    _assert_same_se(fast, exact)
+    low, high = resampling.bca_interval(values, fast)
+    exact_low, exact_high = resampling.bca_interval(values, exact)
+    assert abs(low - exact_low) < 0.1 * (exact_high - exact_low)
+    assert abs(high - exact_high) < 0.1 * (exact_high - exact_low)
+
+    p_value = resampling.signflip_pvalue(values, RESAMPLES, resampling.group_rng(SEED, "fast"))
+    _assert_same_pvalue(p_value, _index_pvalue(values, resampling.group_rng(SEED, "exact")))
+
+
+def test_large_group_path_keeps_input_order_irrelevant():
+    # fit_complexity passa els valors sense ordenar
+    values = _heavy_tailed(2 * resampling.LARGE_GROUP)
+    shuffled = np.random.default_rng(0).permutation(values)
+    sorted_boot = resampling.bootstrap_means(values, 200, resampling.group_rng(SEED, "x"))
+    shuffled_boot = resampling.bootstrap_means(shuffled, 200, resampling.group_rng(SEED, "x"))
+    np.testing.assert_allclose(sorted_boot, shuffled_boot)
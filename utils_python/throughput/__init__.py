@@ -0,0 +1 @@
+"Throughput normalitzat en funcio de la mida (escombrat de n al voltant de les caches)."
@@ -0,0 +1,318 @@
+from __future__ import annotations
+
+import argparse
+import json
+import sys
+from pathlib import Path
+from typing import Dict, Optional
+
+import matplotlib.pyplot as plt
+import numpy as np
+import pandas as pd
+
+if __package__ in (None, ""):
+    sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
+
+from utils_python.common import cache, database, outliers, pairing  # noqa: E402
+from utils_python.common.loader import load_dataframe  # noqa: E402
+from utils_python.common.manifest import OutputManifest, source_digest  # noqa: E402
+from utils_python.complexity.fit_complexity import (  # noqa: E402
+    DEFAULT_CONFIG,
+    MIN_DISTINCT_N,
+    MODELS,
+    load_declared,
+    sanitize_for_filename,
+)
+
+DEFAULT_INPUT = Path(__file__).resolve().parents[2] / "resultats_tots.csv"
+DEFAULT_OUTPUT_DIR = Path(__file__).resolve().parents[1] / "sortides" / "throughput"
+
+# Temps normalitzat = wall_ms / f(n) en ns, amb f el model declarat a config.json
+DEFAULT_MODEL = "O(n)"
+UNIT_LABELS = {
+    "O(1)": "ns / execucio",
+    "O(log n)": "ns / log2 n",
+    "O(n)": "ns / element",
+    "O(n log n)": "ns / (n log2 n)",
+    "O(n^2)": "ns / n^2",
+    "O(n^3)": "ns / n^3",
+}
+CELL_KEYS = ["os", "alg", "n"]
+DB_RUN_COLUMNS = ("os", *pairing.PAIR_KEYS, "workers", "run_order", "run_id", "iter", "wall_ms")
+
+
+def configure_plots() -> None:
+    plt.rcParams["figure.figsize"] = (7, 4)
+    plt.rcParams["figure.dpi"] = 150
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        description=(
+            "Temps normalitzat (ns per element, ns per n log n, ...) per (os, alg) en funcio "
+            "de la mida de les dades, amb les fronteres de cache L1/L2/L3 marcades."
+        )
+    )
+    parser.add_argument(
+        "--input",
+        "-i",
+        type=Path,
+        default=DEFAULT_INPUT,
+        help="CSV amb totes les execucions (Windows + Linux).",
+    )
+    parser.add_argument(
+        "--db",
+        type=Path,
+        default=None,
+        help="Base de dades SQLite (ingest_runs.py --db) en lloc de --input: llegeix la taula runs.",
+    )
+    parser.add_argument(
+        "--config",
+        "-c",
+        type=Path,
+        default=DEFAULT_CONFIG,
+        help="config.json amb la complexitat declarada (normalitzacio) i `cache_sweep.sizes_kib`.",
+    )
+    parser.add_argument(
+        "--cache-json",
+        type=Path,
+        default=None,
+        help=(
+            "cache.json que l'orquestrador desa a la carpeta de la campanya amb --cache-sweep. "
+            "Per defecte, `cache_sweep.sizes_kib` de config.json o les caches d'aquesta maquina."
+        ),
+    )
+    parser.add_argument(
+        "--output-dir",
+        "-o",
+        type=Path,
+        default=DEFAULT_OUTPUT_DIR,
+        help="Carpeta on es desaran les taules i les figures.",
+    )
+    parser.add_argument(
+        "--force",
+        action="store_true",
+        help="Regenera totes les sortides encara que les dades no hagin canviat (ignora manifest.json).",
+    )
+    parser.add_argument(
+        "--outliers",
+        choices=outliers.OUTLIER_METHODS,
+        default=None,
+        help=(
+            "Exclou els outliers de wall_ms per (os, alg, n) abans de l'analisi: mad "
+            "(|x - mediana| > 3 MAD), iqr (fora de Q1 - 1.5 IQR, Q3 + 1.5 IQR) o both. "
+            "Es treu tota la parella ABBA i es desa outliers_exclosos.csv."
+        ),
+    )
+    parser.add_argument(
+        "--no-cache",
+        action="store_true",
+        help="No llegeix ni escriu la cache columnar (.feather) al costat del CSV.",
+    )
+    return parser.parse_args()
+
+
+def load_levels(cache_json: Optional[Path], config_path: Optional[Path]) -> Dict[str, int]:
+    if cache_json is not None:
+        return cache.read_cache_file(cache_json)
+    if config_path is not None and config_path.exists():
+        section = json.loads(config_path.read_text(encoding="utf-8")).get("cache_sweep")
+        if section and section.get("sizes_kib"):
+            return cache.cache_levels(section)
+    return cache.read_cache_levels()
+
+
+def cache_level(working_set: np.ndarray, levels: Dict[str, int]) -> np.ndarray:
+    # Primer nivell on hi caben les dades; per sobre de l'ultim, memoria principal
+    names = np.array([*levels, "RAM"], dtype=object)
+    sizes = np.array(list(levels.values()), dtype=np.float64)
+    return names[np.searchsorted(sizes, working_set, side="left")]
+
+
+def throughput_table(
+    data: pd.DataFrame, declared: Dict[str, str], levels: Dict[str, int], element_bytes: int
+) -> pd.DataFrame:
+    """Mediana i quartils del temps normalitzat per (os, alg, n); una fila per cel·la."""
+    model = data["alg"].map(lambda alg: declared.get(alg, DEFAULT_MODEL))
+    n = data["n"].to_numpy(dtype=np.float64)
+    wall = data["wall_ms"].to_numpy(dtype=np.float64)
+    normalized = np.full(len(data), np.nan)
+    for name in model.unique():
+        mask = (model == name).to_numpy()
+        with np.errstate(divide="ignore", invalid="ignore"):
+            normalized[mask] = wall[mask] * 1e6 / MODELS[name](n[mask])
+    data = data.assign(model=model, ns_per_unit=normalized)
+    data = data[np.isfinite(data["ns_per_unit"])]
+
+    grouped = data.groupby(CELL_KEYS, observed=True, sort=True)
+    table = grouped.agg(
+        model=("model", "first"),
+        runs=("wall_ms", "size"),
+        wall_ms_median=("wall_ms", "median"),
+        ns_per_unit_median=("ns_per_unit", "median"),
+    )
+    quartiles = grouped["ns_per_unit"].quantile([0.25, 0.75]).unstack()
+    table["ns_per_unit_q25"] = quartiles[0.25]
+    table["ns_per_unit_q75"] = quartiles[0.75]
+    # Milions d'unitats (elements, n log n, ...) per segon
+    table["munits_per_s"] = 1e3 / table["ns_per_unit_median"]
+    table = table.reset_index()
+    table["working_set_bytes"] = table["n"].astype("int64") * element_bytes
+    table["cache_level"] = cache_level(table["working_set_bytes"].to_numpy(np.float64), levels)
+    return table
+
+
+def cache_cliffs(table: pd.DataFrame, levels: Dict[str, int], span: float = cache.DEFAULT_SPAN) -> pd.DataFrame:
+    """Salt del temps normalitzat a cada frontera: mediana de les cel·les just per sobre
+    (fins a frontera * span) respecte de les de just per sota (des de frontera / span)."""
+    rows = []
+    for (os_name, alg), sub in table.groupby(["os", "alg"], observed=True, sort=True):
+        size = sub["working_set_bytes"].to_numpy(np.float64)
+        value = sub["ns_per_unit_median"].to_numpy()
+        for level, boundary in levels.items():
+            below = value[(size >= boundary / span) & (size <= boundary)]
+            above = value[(size > boundary) & (size <= boundary * span)]
+            if not len(below) or not len(above):
+                continue
+            rows.append(
+                {
+                    "os": os_name,
+                    "alg": alg,
+                    "level": level,
+                    "boundary_bytes": boundary,
+                    "ns_per_unit_below": float(np.median(below)),
+                    "ns_per_unit_above": float(np.median(above)),
+                    "ratio": float(np.median(above) / np.median(below)),
+                }
+            )
+    return pd.DataFrame(rows)
+
+
+def save_throughput_figure(
+    table: pd.DataFrame, alg: str, levels: Dict[str, int], element_bytes: int, output_dir: Path
+) -> Path:
+    sub = table[table["alg"] == alg]
+    model = sub["model"].iloc[0]
+
+    fig, ax = plt.subplots()
+    for os_name, os_cells in sub.groupby("os", observed=True):
+        points = ax.plot(
+            os_cells["working_set_bytes"], os_cells["ns_per_unit_median"], marker="o", label=os_name
+        )
+        ax.fill_between(
+            os_cells["working_set_bytes"],
+            os_cells["ns_per_unit_q25"],
+            os_cells["ns_per_unit_q75"],
+            color=points[0].get_color(),
+            alpha=0.2,
+            linewidth=0,
+        )
+    ax.set_xscale("log", base=2)
+    # Fronteres de cache (nomes les que cauen dins del rang mesurat)
+    low, high = sub["working_set_bytes"].min(), sub["working_set_bytes"].max()
+    for level, size in levels.items():
+        if low / cache.DEFAULT_SPAN <= size <= high * cache.DEFAULT_SPAN:
+            ax.axvline(size, color="0.4", linestyle="--", linewidth=0.8)
+            ax.annotate(
+                f"{level}\n{cache.format_size(size)}",
+                xy=(size, 1.0),
+                xycoords=("data", "axes fraction"),
+                xytext=(3, -3),
+                textcoords="offset points",
+                va="top",
+                fontsize=7,
+                color="0.3",
+            )
+    ax.set_xlabel(f"Mida de les dades (bytes = n x {element_bytes})")
+    ax.set_ylabel(f"Temps normalitzat ({UNIT_LABELS[model]})")
+    ax.set_title(f"{alg}: throughput per mida ({model})")
+    ax.legend(title="Sistema operatiu")
+    fig.tight_layout()
+    path = output_dir / f"throughput_{sanitize_for_filename(alg)}.png"
+    fig.savefig(path)
+    plt.close(fig)
+    print(f"[save] {path}")
+    return path
+
+
+def run_report(
+    df: pd.DataFrame,
+    output_dir: Path,
+    declared: Dict[str, str],
+    levels: Dict[str, int],
+    incremental: bool = True,
+) -> None:
+    required = ("os", "alg", "n", "wall_ms")
+    missing = [col for col in required if col not in df.columns]
+    if missing:
+        print(f"[error] Falten columnes al CSV: {missing}")
+        return
+    if not levels:
+        print("[warn] No hi ha mides de cache (--cache-json, cache_sweep.sizes_kib o sysfs): no es marquen les fronteres.")
+
+    output_dir.mkdir(parents=True, exist_ok=True)
+    manifest = OutputManifest(output_dir, {"tool": source_digest(__file__)}, incremental)
+
+    element_bytes = cache.ELEMENT_BYTES[cache.DEFAULT_ELEMENT]
+    # Throughput d'un fil: barrejar nombres de fils dins d'una n faria la mediana sense sentit
+    data = pairing.collapse_iterations(pairing.single_thread(df), ("wall_ms",))
+    data = data[(data["n"] > 0) & (data["wall_ms"] > 0)].dropna(subset=list(required))
+    data = data.assign(alg=data["alg"].astype(str).str.strip(), os=data["os"].astype(str))
+    inputs = data[list(required)]
+    params = {"declared": declared, "levels": levels, "element_bytes": element_bytes}
+
+    table = throughput_table(data, declared, levels, element_bytes)
+    if manifest.stale("throughput.csv", inputs, params):
+        out_table = output_dir / "throughput.csv"
+        table.to_csv(out_table, index=False)
+        print(f"[save] {out_table}")
+        manifest.done("throughput.csv")
+
+    if levels and manifest.stale("throughput_cliffs.csv", inputs, params):
+        cliffs = cache_cliffs(table, levels)
+        if not cliffs.empty:
+            out_cliffs = output_dir / "throughput_cliffs.csv"
+            cliffs.to_csv(out_cliffs, index=False)
+            print(f"[save] {out_cliffs}")
+        manifest.done("throughput_cliffs.csv")
+
+    distinct = table.groupby("alg")["n"].nunique()
+    for alg in distinct[distinct >= MIN_DISTINCT_N].index:
+        name = f"throughput_{sanitize_for_filename(alg)}.png"
+        if manifest.stale(name, inputs[inputs["alg"] == alg], params):
+            save_throughput_figure(table, alg, levels, element_bytes, output_dir)
+            manifest.done(name)
+    manifest.save()
+
+    skipped = distinct[distinct < MIN_DISTINCT_N].index
+    if len(skipped):
+        print(
+            f"[omit] Sense figura de throughput (menys de {MIN_DISTINCT_N} mides n diferents; "
+            f"vegeu --cache-sweep de l'orquestrador): {', '.join(skipped)}"
+        )
+
+
+def main() -> None:
+    args = parse_args()
+
+    if args.db is not None:
+        conn = database.connect_db(args.db)
+        df = database.read_runs(conn, DB_RUN_COLUMNS)
+    else:
+        if not args.input.exists():
+            raise FileNotFoundError(f"No s'ha trobat el fitxer d'entrada: {args.input}")
+        df = load_dataframe(args.input, use_cache=not args.no_cache)
+    df, _ = outliers.apply_outlier_stage(df, args.outliers, args.output_dir)
+
+    configure_plots()
+    run_report(
+        df,
+        args.output_dir,
+        load_declared(args.config),
+        load_levels(args.cache_json, args.config),
+        incremental=not args.force,
+    )
+
+
+if __name__ == "__main__":
+    main()